@@ -1,8 +1,20 @@
 import os
 import json
+import re
+import time
+import datetime
+import itertools
+import inspect
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import openai
 import snowflake.connector
 from dotenv import load_dotenv
@@ -13,6 +25,14 @@ from rasa_sdk.events import FollowupAction, SlotSet
 from langchain.chat_models import ChatOpenAI
 from langchain.agents import create_pandas_dataframe_agent
 from .utils import chunk_buttons
+from .snowflake_pool import DEFAULT_MAX_IDLE, PoolTimeout, SnowflakeConnectionPool
+from .frame_snapshots import load_snapshot, save_snapshot
+from .circuit_breaker import CircuitBreaker
+from .single_flight import SingleFlight, SingleFlightTimeout
+from .shared_frames import SharedFrameStore
+from .result_cache import LRUCache, frame_nbytes
+from .frame_index import FrameIndex
+from .aggregate_cube import AggregateCube, JoinedCubes, ROLLUP_COLUMNS, ROLLUP_SUM, merge_rollups, monthly_rollup
 
 # ---------------------------------------------------------------------------
 # CONFIGURACIÓN GLOBAL
@@ -20,6 +40,12 @@ from .utils import chunk_buttons
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Copy-on-write de pandas: los frames en caché se comparten entre peticiones y las
+# acciones reciben vistas; cualquier escritura sobre una vista copia solo lo que toca
+BASIC_DF_COPY_ON_WRITE = os.getenv("BASIC_DF_COPY_ON_WRITE", "1") != "0"
+if BASIC_DF_COPY_ON_WRITE:
+    pd.set_option("mode.copy_on_write", True)
+
 # Mapeos de meses y traducciones de países y ciudades centralizados
 MONTH_NUM_TO_ES = {
     1: "enero", 2: "febrero", 3: "marzo", 4: "abril", 5: "mayo", 6: "junio",
@@ -88,6 +114,21 @@ def get_month_name_after_days(start_month_name: str, days: int, year: int = 2024
 
     return MONTH_NUM_TO_ES[result_date.month]
 
+def with_calendar_labels(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia de `df` para mostrar: las claves de calendario (enteros en los frames) pasan a
+    etiquetas legibles: el mes en castellano, el día como fecha y el periodo como "AAAA-MM".
+    """
+    labels = {}
+    if "MONTH_KEY" in df.columns:
+        labels["MONTH_KEY"] = df["MONTH_KEY"].map(MONTH_NUM_TO_ES).fillna(df["MONTH_KEY"])
+    if "SEARCH_DAY_KEY" in df.columns:
+        labels["SEARCH_DAY_KEY"] = pd.to_datetime(df["SEARCH_DAY_KEY"].astype(str), format="%Y%m%d")
+    if "SEARCH_PERIOD" in df.columns:
+        periods = df["SEARCH_PERIOD"]
+        labels["SEARCH_PERIOD"] = (periods // 100).astype(str) + "-" + (periods % 100).astype(str).str.zfill(2)
+    return df.assign(**labels)
+
 def format_number(num):
     return f"{int(num):,}".replace(",", "\u00A0")
 
@@ -126,159 +167,1448 @@ def _load_private_key_bytes(path: str = "lucentia.p8.txt") -> bytes:
 # CONEXIÓN Y EXTRACCIÓN DE SNOWFLAKE
 # ---------------------------------------------------------------------------
 
-def fetch_snowflake_data(query: str) -> pd.DataFrame:
-    cfg = {
-        "user": "LUCENTIA",
-        "account": "osp-b2b",
-        "warehouse": "PRE_TRANSFORM_WH",
-        "database": "PRE_TOURISM_DB",
-        "role": "PRE_DV_FR",
-        "schema": "SIT",
-    }
+SNOWFLAKE_CFG = {
+    "user": "LUCENTIA",
+    "account": "osp-b2b",
+    "warehouse": "PRE_TRANSFORM_WH",
+    "database": "PRE_TOURISM_DB",
+    "role": "PRE_DV_FR",
+    "schema": "SIT",
+}
+
+def _connect_snowflake():
+    return snowflake.connector.connect(
+        private_key=_load_private_key_bytes(),
+        ocsp_fail_open=False,
+        client_session_keep_alive=True,
+        **SNOWFLAKE_CFG,
+    )
 
+# Pool de sesiones compartido por todo el action server (configurable vía .env)
+_snowflake_pool = SnowflakeConnectionPool(
+    _connect_snowflake,
+    size=int(os.getenv("SNOWFLAKE_POOL_SIZE", "4")),
+    max_idle=float(os.getenv("SNOWFLAKE_POOL_MAX_IDLE", DEFAULT_MAX_IDLE)),
+    health_check_interval=float(os.getenv("SNOWFLAKE_POOL_HEALTH_CHECK", "60")),
+    acquire_timeout=float(os.getenv("SNOWFLAKE_POOL_TIMEOUT", "30")),
+)
+atexit.register(_snowflake_pool.close_all)
+
+# "arrow": resultados vía fetch_arrow_all (por defecto) | "pandas": ruta antigua con pd.read_sql
+SNOWFLAKE_FETCH_MODE = os.getenv("SNOWFLAKE_FETCH_MODE", "arrow").lower()
+
+def arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Convierte una tabla Arrow a DataFrame con los dtypes que usamos en los actions."""
+    # NUMBER(p, s) puede llegar como decimal128: enteros a int64 y el resto a float64
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            target = pa.int64() if field.type.scale == 0 else pa.float64()
+            table = table.set_column(i, field.name, table.column(i).cast(target))
+
+    # split_blocks + self_destruct liberan los buffers Arrow a medida que se convierten
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+def _fetch_arrow(conn, query: str, params: Optional[dict] = None) -> pd.DataFrame:
+    cur = conn.cursor()
     try:
-        with snowflake.connector.connect(private_key=_load_private_key_bytes(), ocsp_fail_open=False, **cfg) as conn:
-            return pd.read_sql(query, conn)
+        cur.execute(query, params)
+        table = cur.fetch_arrow_all()
+        if table is None:  # Sin filas: el conector no devuelve tabla
+            return pd.DataFrame(columns=[col[0] for col in cur.description])
+        return arrow_to_pandas(table)
+    finally:
+        cur.close()
+
+# "snowflake" (por defecto) | "duckdb": base local embebida con datos sintéticos, sin conexión
+DATA_BACKEND = os.getenv("DATA_BACKEND", "snowflake").lower()
+
+_local_backend = None
+_local_backend_lock = threading.Lock()
+
+def get_local_backend():
+    """Crea (la primera vez) y devuelve el backend DuckDB local."""
+    global _local_backend
+    with _local_backend_lock:
+        if _local_backend is None:
+            from .local_backend import LocalDuckDBBackend
+
+            years = os.getenv("LOCAL_BACKEND_YEARS", "2024,2025")
+            _local_backend = LocalDuckDBBackend(
+                database=os.getenv("LOCAL_BACKEND_DB", ":memory:"),
+                latency_ms=float(os.getenv("LOCAL_BACKEND_LATENCY_MS", "0")),
+                years=tuple(int(y) for y in years.split(",")),
+                day_step=int(os.getenv("LOCAL_BACKEND_DAY_STEP", "7")),
+            )
+        return _local_backend
+
+# Circuit breaker de la capa de datos: tras varios fallos seguidos deja de intentarlo durante un tiempo
+_data_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("SNOWFLAKE_BREAKER_THRESHOLD", "3")),
+    reset_timeout=float(os.getenv("SNOWFLAKE_BREAKER_RESET", "10")),
+    max_reset_timeout=float(os.getenv("SNOWFLAKE_BREAKER_MAX_RESET", "300")),
+)
+
+DATA_UNAVAILABLE_MESSAGE = (
+    "Ahora mismo no puedo acceder a la base de datos. Inténtalo de nuevo en unos minutos."
+)
+
+def data_source_available() -> bool:
+    """False mientras el circuit breaker está abierto (la consulta se rechazaría sin intentarla)."""
+    return not _data_breaker.is_open()
+
+def no_data_message(text: str) -> str:
+    """Mensaje para una consulta sin datos: `text`, o el aviso de servicio caído si el circuito está abierto."""
+    return text if data_source_available() else DATA_UNAVAILABLE_MESSAGE
+
+# Caché de resultados de la capa de datos: clave = SQL normalizado + bind variables
+SNOWFLAKE_RESULT_CACHE_MB = float(os.getenv("SNOWFLAKE_RESULT_CACHE_MB", "256"))
+SNOWFLAKE_RESULT_CACHE_TTL = float(os.getenv("SNOWFLAKE_RESULT_CACHE_TTL", "600"))
+_result_cache = LRUCache(max_bytes=int(SNOWFLAKE_RESULT_CACHE_MB * 2**20), ttl=SNOWFLAKE_RESULT_CACHE_TTL)
+
+def result_cache_key(query: str, params: Optional[dict] = None) -> tuple:
+    """Clave de caché: el SQL con los espacios colapsados y las bind variables ordenadas."""
+    if isinstance(params, dict):
+        params_key = tuple(sorted(params.items()))
+    else:
+        params_key = tuple(params or ())
+    return " ".join(query.split()), params_key
+
+def fetch_snowflake_data(query: str, params: Optional[dict] = None, cache: bool = True) -> pd.DataFrame:
+    """
+    Ejecuta `query` (con bind variables `%(nombre)s` en `params`) y devuelve un DataFrame.
+    Con `cache` los resultados correctos se guardan en la caché LRU de resultados y los
+    aciertos devuelven una copia, para que quien la modifique no altere la guardada
+    (superficial con copy-on-write: los datos solo se copian si alguien escribe).
+    """
+    if not cache or SNOWFLAKE_RESULT_CACHE_MB <= 0:
+        return _fetch_uncached(query, params)
+
+    key = result_cache_key(query, params)
+    df = _result_cache.get(key)
+    if df is not None:
+        return df.copy(deep=not BASIC_DF_COPY_ON_WRITE)
+
+    return _fetch_uncached(
+        query, params, on_success=lambda result: _result_cache.put(key, result.copy(deep=not BASIC_DF_COPY_ON_WRITE))
+    )
+
+def _fetch_uncached(query: str, params: Optional[dict] = None, on_success=None) -> pd.DataFrame:
+    if not _data_breaker.allow_request():
+        print(f"Circuito de datos abierto, consulta descartada: {_data_breaker.stats()}")
+        return pd.DataFrame()
+
+    if DATA_BACKEND == "duckdb":
+        try:
+            df = arrow_to_pandas(get_local_backend().fetch_arrow(query, params))
+        except Exception as exc:
+            print(f"Error en el backend local: {exc}")
+            _data_breaker.record_failure()
+            return pd.DataFrame()
+        _data_breaker.record_success()
+        if on_success is not None:
+            on_success(df)
+        return df
+
+    try:
+        with _snowflake_pool.connection() as conn:
+            if SNOWFLAKE_FETCH_MODE == "pandas":
+                df = pd.read_sql(query, conn, params=params)
+            else:
+                df = _fetch_arrow(conn, query, params)
+    except PoolTimeout as exc:
+        # Pool saturado por nuestras propias consultas: Snowflake no ha fallado, no cuenta como caída
+        print(f"Sin conexión libre en el pool de Snowflake: {exc}")
+        _data_breaker.release_probe()
+        return pd.DataFrame()
+    except snowflake.connector.errors.ProgrammingError as exc:
+        # Error en la propia consulta: Snowflake responde, no cuenta como caída
+        print(f"Error en la consulta a Snowflake: {exc}")
+        _data_breaker.record_success()
+        return pd.DataFrame()
     except Exception as exc:
         print(f"Error de conexión con Snowflake: {exc}")
+        _data_breaker.record_failure()
         return pd.DataFrame()
+    _data_breaker.record_success()
+    if on_success is not None:
+        on_success(df)
+    return df
+
+# Filas por lote en la ingesta por streaming (el conector de Snowflake decide el tamaño de sus lotes Arrow)
+SNOWFLAKE_BATCH_ROWS = int(os.getenv("SNOWFLAKE_BATCH_ROWS", "100000"))
+
+def _iter_arrow_batches(conn, query: str, params: Optional[dict] = None) -> Iterator[pd.DataFrame]:
+    cur = conn.cursor()
+    try:
+        cur.execute(query, params)
+        for table in cur.fetch_arrow_batches():
+            yield arrow_to_pandas(table)
+    finally:
+        cur.close()
+
+def fetch_snowflake_batches(query: str, params: Optional[dict] = None) -> Iterator[pd.DataFrame]:
+    """
+    Como `fetch_snowflake_data`, pero entrega el resultado lote a lote mientras llega.
+    A diferencia de aquella, los errores se propagan: un resultado a medias no debe pasar por completo.
+    """
+    if not _data_breaker.allow_request():
+        raise ConnectionError(f"Circuito de datos abierto: {_data_breaker.stats()}")
+
+    try:
+        if DATA_BACKEND == "duckdb":
+            for table in get_local_backend().iter_arrow_batches(query, params, SNOWFLAKE_BATCH_ROWS):
+                yield arrow_to_pandas(table)
+        else:
+            with _snowflake_pool.connection() as conn:
+                if SNOWFLAKE_FETCH_MODE == "pandas":
+                    yield from pd.read_sql(query, conn, params=params, chunksize=SNOWFLAKE_BATCH_ROWS)
+                else:
+                    yield from _iter_arrow_batches(conn, query, params)
+    except PoolTimeout:
+        _data_breaker.release_probe()
+        raise
+    except snowflake.connector.errors.ProgrammingError:
+        _data_breaker.record_success()
+        raise
+    except Exception:
+        _data_breaker.record_failure()
+        raise
+    except BaseException:
+        # GeneratorExit: quien consume ha dejado de leer; sin ello la prueba del semiabierto no acabaría nunca
+        _data_breaker.release_probe()
+        raise
+    _data_breaker.record_success()
+
+# -------------------------------
+# CONSULTAS BASE DE LOS DATAFRAMES
+# -------------------------------
+BASIC_DF_QUERIES = {
+    "ventana": """
+        SELECT {columns}
+        FROM
+            FC_LUC_OPPORTUNITY_WINDOW F
+        LEFT JOIN
+            DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
+        LEFT JOIN
+            DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
+        WHERE
+            D.CITYCODE IN ('CDT', 'ALC', 'VLC')
+        """,
+    "busquedas": """
+        SELECT {columns}
+        FROM 
+            FC_LUC_SEARCHS_PREDICTION F
+        LEFT 
+            JOIN DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
+        LEFT 
+            JOIN DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
+        WHERE D.CITYCODE IN ('CDT', 'ALC', 'VLC')
+        """,
+    "cluster": """
+        SELECT {columns}
+        FROM
+            FC_LUC_CLUSTER_SEGMENTATION F
+        LEFT JOIN
+            DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
+        LEFT JOIN
+            DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
+        WHERE
+            D.CITYCODE IN ('CDT', 'ALC', 'VLC')
+        """,
+    "clima": """
+        SELECT {columns}
+        FROM FC_LUC_TEMPERATURE_SEARCHES_PRE A
+        INNER JOIN DM_REF_CITY_MLG B ON A.SEARCH_DESTINATION_CITY_KEY = B.ID AND B.LANGUAGE_KEY = 1
+        INNER JOIN DM_REF_CITY_MLG C ON A.SEARCH_ORIGIN_CITY_KEY = C.ID AND C.LANGUAGE_KEY = 1
+        """,
+}
+
+# Alias de la tabla de hechos en cada consulta base
+FACT_ALIASES = {"ventana": "F", "busquedas": "F", "cluster": "F", "clima": "A"}
+
+# Orden de carga de cada tabla de hechos, que es el que trae la consulta base completa: la
+# consulta pushdown lo pide explícitamente para que `unique()`/`head()` den lo mismo que
+# filtrando `basic_df`, ya que con filtros el motor puede devolver las filas en otro orden
+FACT_ORDER = {
+    "ventana": "F.YEAR_KEY, O.CITYCODE, D.CITYCODE, F.MONTH_KEY",
+    "busquedas": "O.CITYCODE, D.CITYCODE, F.SEARCH_DAY_KEY",
+    "cluster": "F.YEAR_KEY, O.CITYCODE, D.CITYCODE, F.MONTH_KEY",
+    "clima": "C.CITYCODE, B.CITYCODE, A.SEARCH_DAY_KEY",
+}
+
+# Columnas de la tabla de hechos de cada consulta base
+FACT_COLUMNS = {
+    "ventana": ["SEARCH_ORIGIN_CITY_KEY", "SEARCH_DESTINATION_CITY_KEY", "YEAR_KEY", "MONTH_KEY", "WINDOW_DAYS_NUM"],
+    "busquedas": ["SEARCH_ORIGIN_CITY_KEY", "SEARCH_DESTINATION_CITY_KEY", "SEARCH_DAY_KEY", "MONTH_KEY", "SEARCHS_MEAN_WINDOW_NUM"],
+    "cluster": [
+        "SEARCH_ORIGIN_CITY_KEY", "SEARCH_DESTINATION_CITY_KEY", "YEAR_KEY", "MONTH_KEY", "PAX_PROFILE_KEY", "WINDOW_DAYS_NUM",
+    ],
+    "clima": [
+        "SEARCH_ORIGIN_CITY_KEY", "SEARCH_DESTINATION_CITY_KEY", "SEARCH_DAY_KEY",
+        "SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM",
+        "TEMPERATURE_MIN_NUM", "TEMPERATURE_MEAN_NUM", "TEMPERATURE_MAX_NUM",
+    ],
+}
+
+# Columnas que añaden las tablas de dimensión (nombre -> expresión)
+JOINED_COLUMNS = {
+    "ventana": {
+        "ORIGIN_CITY_CODE": "O.CITYCODE", "ORIGIN_COUNTRY_NAME": "O.COUNTRYNAME", "DESTINATION_CITY_CODE": "D.CITYCODE",
+        "ORIGIN_CITY_NAME": "O.CITYNAME", "DESTINATION_CITY_NAME": "D.CITYNAME",
+    },
+    "busquedas": {
+        "ORIGIN_CITY_CODE": "O.CITYCODE", "ORIGIN_COUNTRY_NAME": "O.COUNTRYNAME", "DESTINATION_CITY_CODE": "D.CITYCODE",
+        "ORIGIN_CITY_NAME": "O.CITYNAME", "DESTINATION_CITY_NAME": "D.CITYNAME",
+    },
+    "cluster": {"ORIGIN_COUNTRY_NAME": "O.COUNTRYNAME", "ORIGIN_CITY_NAME": "O.CITYNAME", "DESTINATION_CITY_NAME": "D.CITYNAME"},
+    "clima": {"DESTINATION_CITY_NAME": "B.CITYNAME", "ORIGIN_CITY_NAME": "C.CITYNAME", "ORIGIN_COUNTRY_NAME": "C.COUNTRYNAME"},
+}
+
+# Columnas que calcula `normalize_frame` y la columna de la que salen
+DERIVED_COLUMNS = {
+    "busquedas": {"SEARCH_PERIOD": "SEARCH_DAY_KEY", "SEARCH_YEAR_KEY": "SEARCH_DAY_KEY"},
+    "clima": {"SEARCH_PERIOD": "SEARCH_DAY_KEY", "YEAR_KEY": "SEARCH_DAY_KEY", "MONTH_KEY": "SEARCH_DAY_KEY"},
+}
+
+# Con BASIC_DF_PROJECTION=1 solo se piden y se guardan las columnas que usa algún manejador
+# de consulta (más las de los filtros, la marca de agua y la ciudad de origen); con 0, `F.*`
+BASIC_DF_PROJECTION = os.getenv("BASIC_DF_PROJECTION", "1") == "1"
+
+def basic_df_columns(query_type: str) -> list:
+    """Columnas del frame normalizado de `query_type` que usan los filtros, la capa de datos o algún manejador."""
+    needed = {"SEARCH_ORIGIN_CITY_KEY", watermark_column(query_type), *FILTER_COLUMNS[query_type].values()}
+    for handlers in QUERY_HANDLERS.values():
+        for handler in handlers.values():
+            needed.update(handler.columns.get(query_type, ()))
+    schema = [*FACT_COLUMNS[query_type], *JOINED_COLUMNS[query_type], *DERIVED_COLUMNS.get(query_type, {})]
+    return [column for column in dict.fromkeys(schema) if column in needed]
+
+def basic_df_query(query_type: str) -> str:
+    """Consulta base de `query_type` con las columnas de `basic_df_columns` (todas con BASIC_DF_PROJECTION=0)."""
+    alias, joined = FACT_ALIASES[query_type], JOINED_COLUMNS[query_type]
+    if BASIC_DF_PROJECTION:
+        columns = basic_df_columns(query_type)
+        sources = {DERIVED_COLUMNS.get(query_type, {}).get(column, column) for column in columns}
+        select = [f"{alias}.{column}" for column in FACT_COLUMNS[query_type] if column in sources]
+        select += [f"{expression} AS {name}" for name, expression in joined.items() if name in columns]
+    else:
+        select = [f"{alias}.*", *(f"{expression} AS {name}" for name, expression in joined.items())]
+    return BASIC_DF_QUERIES[query_type].format(columns=",\n            ".join(select))
+
+def with_conditions(query: str, conditions: list[str]) -> str:
+    """Añade condiciones (unidas con AND) al WHERE de una consulta base, o lo crea si no existe."""
+    if not conditions:
+        return query
+    keyword = "AND" if re.search(r"\bWHERE\b", query, re.IGNORECASE) else "WHERE"
+    return f"{query.rstrip()}\n        {keyword} " + "\n            AND ".join(conditions)
 
 # -------------------------------
 # CACHÉ GLOBAL DE DATAFRAMES
 # -------------------------------
-_basic_df_cache: dict[str, pd.DataFrame] = {}
+
+@dataclass(frozen=True)
+class CachedFrame:
+    """Entrada inmutable de la caché: se sustituye entera, nunca se modifica."""
+    df: pd.DataFrame
+    loaded_at: float
+    version: int
+    watermark: Any = None
+    index: Optional[FrameIndex] = None
+
+_basic_df_cache: dict[str, CachedFrame] = {}
+_basic_df_cache_lock = threading.Lock()
+_basic_df_versions = itertools.count(1)
+
+# Cargas en frío en curso: una por tipo, el resto de peticiones espera su resultado
+_basic_df_loads = SingleFlight()
+BASIC_DF_LOAD_TIMEOUT = float(os.getenv("BASIC_DF_LOAD_TIMEOUT", "120"))
+
+# Segundos de vida de cada tipo (0 = no caduca). BASIC_DF_TTL_<TIPO> tiene prioridad sobre BASIC_DF_TTL.
+BASIC_DF_TTL = float(os.getenv("BASIC_DF_TTL", "43200"))
+
+def basic_df_ttl(query_type: str) -> float:
+    return float(os.getenv(f"BASIC_DF_TTL_{query_type.upper()}", BASIC_DF_TTL))
+
+# Refresco incremental: al caducar solo se piden las filas con marca de agua >= la última cargada
+BASIC_DF_INCREMENTAL = os.getenv("BASIC_DF_INCREMENTAL", "0") == "1"
+
+# Columna de la tabla de hechos que crece con cada carga (BASIC_DF_WATERMARK_<TIPO> para cambiarla)
+WATERMARK_COLUMNS = {"busquedas": "SEARCH_DAY_KEY", "clima": "SEARCH_DAY_KEY"}
+
+def watermark_column(query_type: str) -> Optional[str]:
+    return os.getenv(f"BASIC_DF_WATERMARK_{query_type.upper()}", WATERMARK_COLUMNS.get(query_type))
+
+# Snapshots en disco (Arrow IPC) de los frames normalizados; vacío para desactivarlos
+BASIC_DF_SNAPSHOT_DIR = os.getenv("BASIC_DF_SNAPSHOT_DIR", os.path.join(".cache", "basic_df", DATA_BACKEND))
+# Versión del formato de los frames normalizados; los snapshots de otra versión se ignoran
+# (2: claves de calendario enteras en lugar de fechas y nombres de mes)
+BASIC_DF_SCHEMA = 2
+
+# Segundos durante los que una carga fallida (vacía) de `basic_df` no se reintenta
+BASIC_DF_NEGATIVE_TTL = float(os.getenv("BASIC_DF_NEGATIVE_TTL", "30"))
+_basic_df_failures: dict[str, float] = {}
+
+# Frames compartidos entre workers (p. ej. /dev/shm/rasa-basic-df); vacío = cada proceso con su copia
+BASIC_DF_SHARED_DIR = os.getenv("BASIC_DF_SHARED_DIR", "")
+BASIC_DF_SHARED_POLL = float(os.getenv("BASIC_DF_SHARED_POLL", "5"))
+_shared_frames = SharedFrameStore(BASIC_DF_SHARED_DIR) if BASIC_DF_SHARED_DIR else None
+_shared_checked_at: dict[str, float] = {}
+
+# Ingesta por streaming: normalizar cada lote según llega en vez del resultado completo
+BASIC_DF_STREAMING = os.getenv("BASIC_DF_STREAMING", "0") == "1"
+
+# Resumen mensual: de estos tipos la caché guarda una fila por claves y mes (`monthly_rollup`)
+# en lugar de una por día; las filas diarias solo se piden, filtradas, si un manejador las lee
+BASIC_DF_ROLLUP = os.getenv("BASIC_DF_ROLLUP", "1") == "1"
+ROLLUP_KEYS = {
+    "busquedas": ["DESTINATION_CITY_NAME", "ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME", "SEARCH_ORIGIN_CITY_KEY", "MONTH_KEY"],
+}
+ROLLUP_PERIOD_COLUMN = "SEARCH_PERIOD"
+
+def rolled_up(query_type: str) -> bool:
+    return BASIC_DF_ROLLUP and query_type in ROLLUP_KEYS
+
+def basic_df_cache_stats() -> dict:
+    """Filas, bytes y versión de cada frame en caché, más las cachés LRU de resultados, pushdown, subconjuntos y respuestas."""
+    frames = {
+        query_type: {
+            "rows": len(entry.df),
+            "bytes": frame_nbytes(entry.df),
+            "index_bytes": entry.index.nbytes if entry.index is not None else 0,
+            "cube_bytes": _basic_df_cubes[query_type][1].nbytes if query_type in _basic_df_cubes else 0,
+            "version": entry.version,
+        }
+        for query_type, entry in list(_basic_df_cache.items())
+    }
+    return {
+        "frames": frames,
+        "joined_bytes": sum(joined.nbytes for joined in list(_basic_df_joined.values())),
+        "results": _result_cache.stats(),
+        "pushdown": _pushdown_cache.stats(),
+        "subsets": _subset_cache.stats(),
+        "answers": _answer_cache.stats(),
+    }
+
+def basic_df_version(query_type: str) -> int:
+    """Versión de los datos en caché de `query_type` (0 si no están cargados)."""
+    entry = _basic_df_cache.get(query_type)
+    return entry.version if entry else 0
 
 # -------------------------------
 # FUNCIÓN PARA LIMPIAR EL CACHÉ
 # -------------------------------
 def clear_basic_df_cache():
-    _basic_df_cache.clear()
+    with _basic_df_cache_lock:
+        _basic_df_cache.clear()
+        _basic_df_failures.clear()
+    _pushdown_cache.clear()
+    _subset_cache.clear()
+    _answer_cache.clear()
+    _basic_df_cubes.clear()
+    _basic_df_joined.clear()
+    _result_cache.clear()
+    _common_keys_memo.clear()
 
 # -------------------------------
-# CREACIÓN DE LOS DATAFRAMES
+# LIMPIEZA Y FORMATO DE LOS DATOS
 # -------------------------------
-def basic_df(query_type: str) -> pd.DataFrame:
-    """Extrae, limpia y formatea los datos provenientes de Snowflake."""
+# Mercados de origen que no se muestran (ya traducidos y en minúsculas)
+EXCLUDED_COUNTRIES = ["estados unidos", "china", "kenia"]
 
-    # Para testeo: limpiar caché
-    # clear_basic_df_cache()
+# Columnas de dimensión que se guardan como categóricas (los filtros comparan códigos enteros)
+CATEGORICAL_COLUMNS = {
+    query_type: ["DESTINATION_CITY_NAME", "ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME"]
+    for query_type in BASIC_DF_QUERIES
+}
+CATEGORICAL_COLUMNS["cluster"].append("PAX_PROFILE_KEY")
 
-    # Verificar si el dataframe ya está en caché
-    if query_type in _basic_df_cache:
-        return _basic_df_cache[query_type]
-
-
-    if query_type == "ventana":
-        query = """
-            SELECT F.*,
-                O.CITYCODE AS ORIGIN_CITY_CODE,
-                O.COUNTRYNAME AS ORIGIN_COUNTRY_NAME,
-                D.CITYCODE AS DESTINATION_CITY_CODE,
-                O.CITYNAME AS ORIGIN_CITY_NAME,
-                D.CITYNAME AS DESTINATION_CITY_NAME
-            FROM
-                FC_LUC_OPPORTUNITY_WINDOW F
-            LEFT JOIN
-                DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
-            LEFT JOIN
-                DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
-            WHERE
-                D.CITYCODE IN ('CDT', 'ALC', 'VLC')
-            """
-    elif query_type == "busquedas":
-        query = """
-            SELECT F.*, 
-                O.CITYCODE AS ORIGIN_CITY_CODE, 
-                O.COUNTRYNAME AS ORIGIN_COUNTRY_NAME,
-                D.CITYCODE AS DESTINATION_CITY_CODE, 
-                O.CITYNAME AS ORIGIN_CITY_NAME,
-                D.CITYNAME AS DESTINATION_CITY_NAME
-            FROM 
-                FC_LUC_SEARCHS_PREDICTION F
-            LEFT 
-                JOIN DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
-            LEFT 
-                JOIN DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
-            WHERE D.CITYCODE IN ('CDT', 'ALC', 'VLC')
-         """
-         
-    elif query_type == "cluster":
-        query = """
-            SELECT F.*,
-                O.COUNTRYNAME AS ORIGIN_COUNTRY_NAME,
-                O.CITYNAME AS ORIGIN_CITY_NAME,
-                D.CITYNAME AS DESTINATION_CITY_NAME
-            FROM
-                FC_LUC_CLUSTER_SEGMENTATION F
-            LEFT JOIN
-                DM_REF_CITY O ON F.SEARCH_ORIGIN_CITY_KEY = O.ID
-            LEFT JOIN
-                DM_REF_CITY D ON F.SEARCH_DESTINATION_CITY_KEY = D.ID
-            WHERE
-                D.CITYCODE IN ('CDT', 'ALC', 'VLC')
-         """
-    elif query_type == "clima":
-        query = """
-        SELECT 
-            A.*, 
-            B.CITYNAME AS DESTINATION_CITY_NAME,
-            C.CITYNAME AS ORIGIN_CITY_NAME,
-            C.COUNTRYNAME AS ORIGIN_COUNTRY_NAME
-        FROM FC_LUC_TEMPERATURE_SEARCHES_PRE A
-        INNER JOIN DM_REF_CITY_MLG B ON A.SEARCH_DESTINATION_CITY_KEY = B.ID AND B.LANGUAGE_KEY = 1
-        INNER JOIN DM_REF_CITY_MLG C ON A.SEARCH_ORIGIN_CITY_KEY = C.ID AND C.LANGUAGE_KEY = 1
-        """
-    
-    df = fetch_snowflake_data(query)
+# BASIC_DF_CATEGORICAL=0 deja las columnas como texto (para comparar memoria y latencia)
+BASIC_DF_CATEGORICAL = os.getenv("BASIC_DF_CATEGORICAL", "1") == "1"
 
-    if df.empty:
+def encode_categoricals(query_type: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte las columnas de dimensión a categóricas. Se aplica al frame ya completo:
+    `pd.concat` de categóricas con categorías distintas vuelve a `object`.
+    """
+    if not BASIC_DF_CATEGORICAL:
         return df
+    columns = {
+        col: "category"
+        for col in CATEGORICAL_COLUMNS.get(query_type, [])
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    # copy=False: el resto de columnas se comparten con `df`, no se duplican
+    return df.astype(columns, copy=False) if columns else df
+
+# Tipo numérico de cada columna de Snowflake; se elige el ancho más pequeño que conserva los valores
+NUMERIC_SCHEMA = {
+    "SEARCH_ORIGIN_CITY_KEY": "integer",
+    "SEARCH_DESTINATION_CITY_KEY": "integer",
+    "YEAR_KEY": "integer",
+    "SEARCH_YEAR_KEY": "integer",
+    "MONTH_KEY": "integer",
+    "SEARCH_DAY_KEY": "integer",
+    "SEARCH_PERIOD": "integer",
+    "PAX_PROFILE_KEY": "integer",
+    "WINDOW_DAYS_NUM": "float",
+    "SEARCHS_MEAN_WINDOW_NUM": "float",
+    "SEARCH_MIN_TEMPERATURE_NUM": "integer",
+    "SEARCH_MEAN_TEMPERATURE_NUM": "integer",
+    "SEARCH_MAX_TEMPERATURE_NUM": "integer",
+    "TEMPERATURE_MIN_NUM": "float",
+    "TEMPERATURE_MEAN_NUM": "float",
+    "TEMPERATURE_MAX_NUM": "float",
+    # Resumen mensual (`monthly_rollup`)
+    "ROLLUP_SUM": "float",
+    "ROLLUP_COUNT": "integer",
+    "ROLLUP_MIN": "float",
+    "ROLLUP_MAX": "float",
+    "ROLLUP_ROWS": "integer",
+    "ROLLUP_DAY_MASK": "integer",
+}
 
-    if query_type != "clima":
-        df["MONTH_KEY"] = df["MONTH_KEY"].replace(MONTH_NUM_TO_ES)
-        
+BASIC_DF_DOWNCAST = os.getenv("BASIC_DF_DOWNCAST", "1") == "1"
+
+def downcast_numeric(series: pd.Series, kind: str) -> pd.Series:
+    """
+    Reduce `series` al menor ancho seguro: enteros por rango (int8/16/32) y reales a
+    float32 solo si todos los valores se representan exactamente (si no, los
+    resultados redondeados de las respuestas podrían cambiar).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if series.dtype == object:
+        try:
+            series = pd.to_numeric(series)
+        except (ValueError, TypeError):
+            return series
+        if series.dtype == object:
+            return series
+
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast="integer")
+
+    if kind == "integer" and pd.api.types.is_float_dtype(series.dtype) and not series.isna().any():
+        as_int = series.astype("int64")
+        if (as_int == series).all():
+            return pd.to_numeric(as_int, downcast="integer")
+
+    if series.dtype == "float64":
+        narrow = series.astype("float32")
+        if np.array_equal(narrow.to_numpy("float64"), series.to_numpy(), equal_nan=True):
+            return narrow
+    return series
+
+# Informe de memoria por tipo y columna, antes y después de compactar (ver `basic_df_memory_report`)
+_memory_reports: dict[str, dict] = {}
+
+def column_sizes(df: pd.DataFrame) -> dict[str, tuple[str, int]]:
+    """Dtype y bytes (con el contenido de las cadenas) de cada columna de `df`."""
+    return {col: (str(df[col].dtype), int(df[col].memory_usage(deep=True, index=False))) for col in df.columns}
+
+def compact_frame(query_type: str, df: pd.DataFrame, before: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Categóricas para las dimensiones y ancho mínimo para los números; anota el ahorro por
+    columna. `before` (de `column_sizes`) sustituye a lo medido en `df` como punto de partida.
+    """
+    before = {**column_sizes(df), **(before or {})}
+
+    df = encode_categoricals(query_type, df)
+    if BASIC_DF_DOWNCAST:
+        dtypes = {}
+        for col, kind in NUMERIC_SCHEMA.items():
+            if col in df.columns:
+                narrow = downcast_numeric(df[col], kind).dtype
+                if narrow != df[col].dtype:
+                    dtypes[col] = narrow
+        if dtypes:
+            df = df.astype(dtypes, copy=False)
+
+    _memory_reports[query_type] = {
+        col: {
+            "dtype_before": before[col][0],
+            "bytes_before": before[col][1],
+            "dtype": str(df[col].dtype),
+            "bytes": int(df[col].memory_usage(deep=True, index=False)),
+        }
+        for col in df.columns
+    }
+    return df
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """
+    Concatena frames compactos sin perder las categóricas: cada columna categórica pasa
+    antes a la unión (ordenada, como al codificar) de las categorías de todos.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    first = frames[0]
+    for col in first.columns:
+        if not isinstance(first[col].dtype, pd.CategoricalDtype):
+            continue
+        categories = first[col].cat.categories
+        for df in frames[1:]:
+            categories = categories.union(df[col].cat.categories)
+        dtype = pd.CategoricalDtype(categories)
+        frames = [df.astype({col: dtype}, copy=False) for df in frames]
+    return pd.concat(frames)
+
+def basic_df_memory_report() -> dict:
+    """
+    Para cada frame en caché: filas, bytes antes/después de compactar y el detalle por
+    columna (dtype y bytes). Los bytes incluyen el contenido de las cadenas (deep=True).
+    """
+    report = {}
+    for query_type, entry in list(_basic_df_cache.items()):
+        columns = _memory_reports.get(query_type, {})
+        report[query_type] = {
+            "rows": len(entry.df),
+            "bytes_before": sum(c["bytes_before"] for c in columns.values()),
+            "bytes": frame_nbytes(entry.df),
+            "columns": columns,
+        }
+    return report
+
+# Días de cada mes en un año no bisiesto
+_MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def day_keys(values: pd.Series) -> pd.Series:
+    """
+    Claves de día como enteros yyyymmdd. Las que no son una fecha válida pasan a
+    20000101, como hacía la conversión a fecha con `errors="coerce"`.
+    """
+    keys = pd.to_numeric(values, errors="coerce")
+    year, month, day = keys // 10000, keys // 100 % 100, keys % 100
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = pd.Series(_MONTH_DAYS[month.clip(1, 12).fillna(1).astype(int).to_numpy() - 1], index=keys.index)
+    month_days += ((month == 2) & leap).astype(int)
+    # Rango de fechas de pandas (1677-09-21 a 2262-04-11) en años completos
+    valid = (keys % 1 == 0) & year.between(1678, 2261) & month.between(1, 12) & (day >= 1) & (day <= month_days)
+    return keys.where(valid, 20000101).astype(np.int64)
+
+def normalize_frame(query_type: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica la limpieza común a un resultado crudo de `basic_df_query(query_type)`.
+    Las claves de calendario quedan como enteros (día yyyymmdd, periodo yyyymm, año y
+    mes 1-12); las etiquetas en castellano solo se ponen al mostrarlas.
+    """
     df["ORIGIN_COUNTRY_NAME"] = (
         df["ORIGIN_COUNTRY_NAME"].map(COUNTRY_TRANSLATION).fillna(df["ORIGIN_COUNTRY_NAME"])
     )
 
     if query_type == "busquedas" or query_type == "clima":
-        df["SEARCH_DAY_KEY"] = pd.to_datetime(df["SEARCH_DAY_KEY"], format="%Y%m%d", errors="coerce").fillna(pd.Timestamp("2000-01-01"))
-        df["SEARCH_PERIOD"] = df["SEARCH_DAY_KEY"].dt.to_period("M").astype(str)
+        df["SEARCH_DAY_KEY"] = day_keys(df["SEARCH_DAY_KEY"])
+        df["SEARCH_PERIOD"] = df["SEARCH_DAY_KEY"] // 100
+
+    # Año (y mes en clima) derivados de SEARCH_DAY_KEY para poder filtrar igual en todas las tablas
+    if query_type == "busquedas":
+        df["SEARCH_YEAR_KEY"] = df["SEARCH_DAY_KEY"] // 10000
+    elif query_type == "clima":
+        df["YEAR_KEY"] = df["SEARCH_DAY_KEY"] // 10000
+        df["MONTH_KEY"] = df["SEARCH_PERIOD"] % 100
 
     # Normalizamos campos de texto y filtramos países indeseados
     for col in ("DESTINATION_CITY_NAME", "ORIGIN_CITY_NAME", "ORIGIN_COUNTRY_NAME"):
         df[col] = df[col].str.strip().str.lower()
 
-    df = df[~df["ORIGIN_COUNTRY_NAME"].isin(["estados unidos", "china", "kenia"])]
+    df = df[~df["ORIGIN_COUNTRY_NAME"].isin(EXCLUDED_COUNTRIES)]
+    if BASIC_DF_PROJECTION:
+        # Las columnas que no usa nadie no se guardan (p. ej. si el origen devuelve la tabla entera)
+        keep = set(basic_df_columns(query_type))
+        df = df[[column for column in df.columns if column in keep]]
+    return df
+
+def rollup_frame(query_type: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Resumen mensual de un frame diario ya normalizado, con las columnas de los filtros."""
+    measure, day_column = CUBE_MEASURES[query_type]
+    rollup = monthly_rollup(df, ROLLUP_KEYS[query_type], measure, day_column, ROLLUP_PERIOD_COLUMN)
+    rollup[FILTER_COLUMNS[query_type]["anno"]] = rollup[ROLLUP_PERIOD_COLUMN] // 100
+    return rollup
+
+def merge_rollup_frames(query_type: str, rollups: list) -> pd.DataFrame:
+    """Une los resúmenes mensuales (de `rollup_frame`) de varios lotes de un mismo resultado."""
+    rollup = merge_rollups(concat_frames(rollups).reset_index(drop=True), ROLLUP_KEYS[query_type], ROLLUP_PERIOD_COLUMN)
+    rollup[FILTER_COLUMNS[query_type]["anno"]] = rollup[ROLLUP_PERIOD_COLUMN] // 100
+    return rollup
+
+def cached_columns(query_type: str) -> list:
+    """Columnas del frame que guarda la caché: las de `basic_df_columns` o las del resumen mensual."""
+    if rolled_up(query_type):
+        return [*ROLLUP_KEYS[query_type], ROLLUP_PERIOD_COLUMN, FILTER_COLUMNS[query_type]["anno"], *ROLLUP_COLUMNS]
+    return basic_df_columns(query_type)
+
+def cached_frame(query_type: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Frame normalizado tal y como se guarda en la caché: resumido por mes si toca y compacto."""
+    if rolled_up(query_type):
+        df = rollup_frame(query_type, df)
+    return compact_frame(query_type, df)
+
+# -------------------------------
+# CREACIÓN DE LOS DATAFRAMES
+# -------------------------------
+def basic_df(query_type: str) -> pd.DataFrame:
+    """Extrae, limpia y formatea los datos provenientes de Snowflake."""
+
+    # Para testeo: limpiar caché
+    # clear_basic_df_cache()
+
+    # Verificar si el dataframe ya está en caché (si ha caducado se sirve igual y se refresca en segundo plano)
+    entry = _basic_df_cache.get(query_type)
+    if entry is not None and _shared_frames is not None:
+        entry = _sync_shared_frame(query_type, entry)
+    if entry is not None:
+        ttl = basic_df_ttl(query_type)
+        if ttl and time.monotonic() - entry.loaded_at > ttl and data_source_available():
+            _schedule_refresh(query_type)
+        return entry.df
+
+    # Si otra petición ya está cargando este tipo, se espera a su resultado en vez de repetir la consulta
+    try:
+        return _basic_df_loads.do(query_type, lambda: _load_basic_df_once(query_type), timeout=BASIC_DF_LOAD_TIMEOUT)
+    except SingleFlightTimeout as exc:
+        print(f"Tiempo de espera agotado: {exc}")
+        return pd.DataFrame()
+
+def _load_basic_df_once(query_type: str) -> pd.DataFrame:
+    # Puede haberse guardado mientras esta petición esperaba su turno
+    entry = _basic_df_cache.get(query_type)
+    if entry is not None:
+        return entry.df
+
+    if _shared_frames is None:
+        return _load_basic_df_cold(query_type)
+
+    # Con frames compartidos: si otro worker ya lo publicó se mapea; si no, se carga con el cerrojo tomado
+    manifest = _shared_frames.manifest(query_type)
+    if manifest is None:
+        with _shared_frames.lock(query_type, timeout=BASIC_DF_LOAD_TIMEOUT) as acquired:
+            if not acquired:
+                print(f"Sin cerrojo compartido para '{query_type}' tras {BASIC_DF_LOAD_TIMEOUT}s; se carga localmente.")
+            manifest = _shared_frames.manifest(query_type)
+            if manifest is None:
+                return _load_basic_df_cold(query_type)
+    return _attach_shared_frame(query_type, manifest).df
+
+def _load_basic_df_cold(query_type: str) -> pd.DataFrame:
+    # Arranque en frío: se sirve el último snapshot en disco y se refresca en segundo plano
+    snapshot = _load_basic_df_snapshot(query_type)
+    if snapshot is not None:
+        return snapshot.df
+
+    # Caché negativa: si la última carga falló hace poco no se vuelve a intentar todavía
+    failed_at = _basic_df_failures.get(query_type)
+    if failed_at is not None and time.monotonic() - failed_at < BASIC_DF_NEGATIVE_TTL:
+        return pd.DataFrame()
+
+    df, watermark = _load_basic_df(query_type)
+
+    if df.empty:
+        with _basic_df_cache_lock:
+            _basic_df_failures[query_type] = time.monotonic()
+        return df
 
     # Guardar del dataframe en caché
-    _basic_df_cache[query_type] = df
+    with _basic_df_cache_lock:
+        _basic_df_failures.pop(query_type, None)
+    return _store_basic_df(query_type, df, watermark).df
+
+def _fetch_normalized(query_type: str, query: str, params: Optional[dict] = None) -> tuple[pd.DataFrame, Any]:
+    """Descarga y normaliza; devuelve también el máximo de la marca de agua (sobre los datos crudos)."""
+    if BASIC_DF_STREAMING:
+        return _fetch_normalized_batches(query_type, query, params)
+
+    df = fetch_snowflake_data(query, params, cache=False)  # el frame normalizado ya se cachea aparte
+    if df.empty:
+        return df, None
+
+    watermark = _max_watermark(query_type, df)  # antes de normalizar: SEARCH_DAY_KEY pasa a fecha
+    return cached_frame(query_type, normalize_frame(query_type, df)), watermark
+
+def _fetch_normalized_batches(query_type: str, query: str, params: Optional[dict] = None) -> tuple[pd.DataFrame, Any]:
+    """
+    Ingesta por streaming: cada lote se normaliza, filtra y compacta (o se resume por
+    mes) según llega, y solo se guardan los lotes ya compactos; al final se concatenan
+    con las categorías unidas o se unen sus resúmenes. El índice conserva la posición
+    de cada fila en el resultado completo, igual que sin streaming.
+    """
+    parts, watermark, offset = [], None, 0
+    before: dict[str, tuple[str, int]] = {}  # columna -> (dtype, bytes) de los lotes normalizados, sumados
+    try:
+        for batch in fetch_snowflake_batches(query, params):
+            if batch.empty:
+                continue
+            batch.index = pd.RangeIndex(offset, offset + len(batch))
+            offset += len(batch)
+
+            batch_watermark = _max_watermark(query_type, batch)
+            if batch_watermark is not None and (watermark is None or batch_watermark > watermark):
+                watermark = batch_watermark
+            batch = normalize_frame(query_type, batch)
+            for col, (dtype, nbytes) in column_sizes(batch).items():
+                dtype, total = before.get(col, (dtype, 0))
+                before[col] = (dtype, total + nbytes)
+            parts.append(cached_frame(query_type, batch))
+            del batch
+    except Exception as exc:
+        print(f"Error en la ingesta por lotes de '{query_type}': {exc}")
+        return pd.DataFrame(), None
+
+    if not parts:
+        return pd.DataFrame(), None
+    df = merge_rollup_frames(query_type, parts) if rolled_up(query_type) else concat_frames(parts)
+    # El informe de memoria compara con los lotes sin resumir ni compactar, no con su unión ya compacta
+    return compact_frame(query_type, df, before), watermark
+
+def _max_watermark(query_type: str, df: pd.DataFrame) -> Any:
+    column = watermark_column(query_type)
+    watermark = df[column].max() if column in df.columns else None
+    if hasattr(watermark, "item"):  # escalar numpy -> Python, para usarlo como bind variable
+        watermark = watermark.item()
+    return watermark
+
+def _load_basic_df(query_type: str) -> tuple[pd.DataFrame, Any]:
+    return _fetch_normalized(query_type, basic_df_query(query_type))
+
+def month_start(watermark: Any) -> Any:
+    """
+    Primer día del mes de una marca de agua de día, en el tipo de la columna cruda
+    (entero o texto yyyymmdd, fecha) para que la consulta la compare igual.
+    """
+    if isinstance(watermark, datetime.datetime):
+        return watermark.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if isinstance(watermark, datetime.date):
+        return watermark.replace(day=1)
+    start = int(day_keys(pd.Series([watermark])).iloc[0]) // 100 * 100 + 1
+    return str(start) if isinstance(watermark, str) else start
+
+def _load_basic_df_delta(query_type: str, entry: CachedFrame) -> tuple[pd.DataFrame, Any]:
+    """
+    Trae solo las filas con marca de agua >= la última cargada, las normaliza y las
+    combina con el frame en caché. Las filas del último corte se vuelven a pedir y
+    sustituyen a las que había (upsert por partición), por si aquella carga estaba a medias.
+    Con resumen mensual la partición es el mes: se pide el mes entero de la marca de agua.
+    """
+    column = partition = watermark_column(query_type)
+    since = entry.watermark
+    if rolled_up(query_type):
+        partition, since = ROLLUP_PERIOD_COLUMN, month_start(since)
+    query = with_conditions(basic_df_query(query_type), [f"{FACT_ALIASES[query_type]}.{column} >= %(watermark)s"])
+    delta, watermark = _fetch_normalized(query_type, query, {"watermark": since})
+
+    if delta.empty:
+        return entry.df, watermark if watermark is not None else entry.watermark
+
+    boundary = delta[partition].min()
+    kept = entry.df[entry.df[partition] < boundary]
+    return compact_frame(query_type, pd.concat([kept, delta], ignore_index=True)), watermark
+
+def _store_basic_df(
+    query_type: str, df: pd.DataFrame, watermark: Any = None, version: Optional[int] = None, persist: bool = True
+) -> CachedFrame:
+    entry = None
+    if _shared_frames is not None:
+        entry = _publish_shared_frame(query_type, df, watermark, version)
+
+    if entry is None:
+        # Sustitución atómica: los lectores ven el frame anterior o el nuevo, nunca uno a medias
+        entry = CachedFrame(
+            df=df,
+            loaded_at=time.monotonic(),
+            version=version if version is not None else _next_local_version(),
+            watermark=watermark,
+            index=_frame_index(query_type, df),
+        )
+        with _basic_df_cache_lock:
+            _basic_df_cache[query_type] = entry
+        _discard_subsets(query_type, entry.version)
+        _discard_answers(query_type, entry.version)
+        _schedule_cube(query_type, entry)
+
+    # Los datos nuevos se vuelcan a disco sin bloquear al que los ha pedido
+    if persist and version is None and BASIC_DF_SNAPSHOT_DIR:
+        threading.Thread(
+            target=_save_basic_df_snapshot, args=(query_type, entry), name=f"snapshot-{query_type}", daemon=True
+        ).start()
+    return entry
+
+def _frame_index(query_type: str, df: pd.DataFrame) -> FrameIndex:
+    # Un refresco sin cambios guarda el mismo frame: se reutiliza su índice
+    entry = _basic_df_cache.get(query_type)
+    if entry is not None and entry.df is df and entry.index is not None:
+        return entry.index
+    return FrameIndex(df, INDEXED_FILTERS[query_type])
+
+def _next_local_version() -> int:
+    # Con frames compartidos las versiones las da el manifiesto (1, 2, ...); las locales van en negativo para no coincidir
+    version = next(_basic_df_versions)
+    return -version if _shared_frames is not None else version
+
+# -------------------------------
+# FRAMES COMPARTIDOS ENTRE WORKERS
+# -------------------------------
+def _attach_shared_frame(query_type: str, manifest: dict, df: Optional[pd.DataFrame] = None) -> CachedFrame:
+    """Guarda en la caché local la versión publicada en `manifest` (mapeándola salvo que se pase `df`)."""
+    if df is None:
+        df = _shared_frames.attach(manifest)
+    # La antigüedad cuenta desde la publicación, así todos los workers caducan a la vez
+    age = max(0.0, time.time() - manifest["published_at"])
+    entry = CachedFrame(
+        df=df,
+        loaded_at=time.monotonic() - age,
+        version=manifest["version"],
+        watermark=manifest["watermark"],
+        index=_frame_index(query_type, df),
+    )
+    with _basic_df_cache_lock:
+        _basic_df_cache[query_type] = entry
+    _discard_subsets(query_type, entry.version)
+    _discard_answers(query_type, entry.version)
+    _schedule_cube(query_type, entry)
+    _shared_checked_at[query_type] = time.monotonic()
+    return entry
+
+def _publish_shared_frame(query_type: str, df: pd.DataFrame, watermark: Any, version: Optional[int]) -> Optional[CachedFrame]:
+    try:
+        with _shared_frames.lock(query_type, timeout=BASIC_DF_LOAD_TIMEOUT) as acquired:
+            if not acquired:
+                print(f"Sin cerrojo compartido para publicar '{query_type}'; se queda solo en este proceso.")
+                return None
+            if version is not None:
+                # Mismos datos: solo se renueva el instante de publicación
+                manifest = _shared_frames.touch(query_type, watermark)
+                return _attach_shared_frame(query_type, manifest, df) if manifest else None
+            manifest = _shared_frames.publish(query_type, df, watermark)
+        # El propio proceso también usa la copia mapeada y suelta la suya
+        return _attach_shared_frame(query_type, manifest)
+    except Exception as exc:
+        print(f"Error publicando '{query_type}' en memoria compartida: {exc}")
+        return None
+
+def _sync_shared_frame(query_type: str, entry: CachedFrame) -> CachedFrame:
+    """Cada BASIC_DF_SHARED_POLL segundos mira si otro worker ha publicado una versión nueva."""
+    now = time.monotonic()
+    if now - _shared_checked_at.get(query_type, 0.0) < BASIC_DF_SHARED_POLL:
+        return entry
+    _shared_checked_at[query_type] = now
+
+    manifest = _shared_frames.manifest(query_type)
+    if manifest is None:
+        return entry
+    try:
+        if manifest["version"] != entry.version:
+            return _attach_shared_frame(query_type, manifest)
+        loaded_at = now - max(0.0, time.time() - manifest["published_at"])
+        if loaded_at > entry.loaded_at:
+            # Otro worker lo ha refrescado sin cambios: se adopta su instante para no volver a refrescar
+            entry = replace(entry, loaded_at=loaded_at, watermark=manifest["watermark"])
+            with _basic_df_cache_lock:
+                _basic_df_cache[query_type] = entry
+    except Exception as exc:
+        print(f"Error leyendo la versión compartida de '{query_type}': {exc}")
+    return entry
+
+# -------------------------------
+# SNAPSHOTS EN DISCO
+# -------------------------------
+def _load_basic_df_snapshot(query_type: str) -> Optional[CachedFrame]:
+    if not BASIC_DF_SNAPSHOT_DIR:
+        return None
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(BASIC_DF_SNAPSHOT_DIR, query_type, schema=BASIC_DF_SCHEMA)
+    if snapshot is None:
+        return None
+
+    df, watermark, stamp = snapshot
+    missing = [column for column in cached_columns(query_type) if column not in df.columns]
+    if missing:
+        # Guardado con menos columnas de las que piden ahora los manejadores (o sin resumir por mes)
+        print(f"Snapshot de '{query_type}' ignorado: faltan {', '.join(missing)}")
+        return None
+    entry = _store_basic_df(query_type, df, watermark, persist=False)
+    age = time.time() - stamp / 1000
+    print(f"Snapshot de '{query_type}': {len(df)} filas en {time.perf_counter() - start:.2f}s (antigüedad {age:.0f}s)")
+
+    # Puede estar desfasado respecto a Snowflake: se refresca siempre tras cargarlo
+    _schedule_refresh(query_type)
+    return entry
+
+def _save_basic_df_snapshot(query_type: str, entry: CachedFrame):
+    try:
+        save_snapshot(BASIC_DF_SNAPSHOT_DIR, query_type, entry.df, entry.watermark, schema=BASIC_DF_SCHEMA)
+    except Exception as exc:
+        print(f"Error guardando snapshot de '{query_type}': {exc}")
+
+# -------------------------------
+# REFRESCO EN SEGUNDO PLANO
+# -------------------------------
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+
+def _schedule_refresh(query_type: str):
+    with _refreshing_lock:
+        if query_type in _refreshing:
+            return
+        _refreshing.add(query_type)
+    threading.Thread(target=_refresh_basic_df, args=(query_type,), name=f"refresh-{query_type}", daemon=True).start()
+
+def _refresh_basic_df(query_type: str):
+    if _shared_frames is None:
+        return _refresh_basic_df_locally(query_type)
+
+    # Solo refresca un worker; el resto recoge la nueva versión a través del manifiesto
+    try:
+        with _shared_frames.lock(query_type, timeout=0) as acquired:
+            manifest = _shared_frames.manifest(query_type) if acquired else None
+            ttl = basic_df_ttl(query_type)
+            if acquired and (manifest is None or not ttl or time.time() - manifest["published_at"] > ttl):
+                _refresh_basic_df_locally(query_type)
+                return
+    except Exception as exc:
+        print(f"Error refrescando '{query_type}': {exc}")
+    with _refreshing_lock:
+        _refreshing.discard(query_type)
+    _shared_checked_at.pop(query_type, None)
+
+def _refresh_basic_df_locally(query_type: str):
+    try:
+        start = time.perf_counter()
+        entry = _basic_df_cache.get(query_type)
+
+        if BASIC_DF_INCREMENTAL and entry is not None and entry.watermark is not None:
+            df, watermark = _load_basic_df_delta(query_type, entry)
+            if df is entry.df:
+                # Sin filas nuevas: se renueva el TTL sin cambiar de versión
+                _store_basic_df(query_type, df, watermark, version=entry.version)
+                print(f"Refresco incremental de '{query_type}': sin cambios ({time.perf_counter() - start:.2f}s)")
+                return
+        else:
+            df, watermark = _load_basic_df(query_type)
+
+        if df.empty:
+            # Se conserva el frame anterior; se reintentará en la próxima consulta
+            print(f"Refresco de '{query_type}' sin datos, se mantiene la versión en caché.")
+            return
+        _store_basic_df(query_type, df, watermark)
+        print(f"Refresco de '{query_type}': {len(df)} filas en {time.perf_counter() - start:.2f}s")
+    except Exception as exc:
+        print(f"Error refrescando '{query_type}': {exc}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(query_type)
+
+# ---------------------------------------------------------------------------
+# FILTRADO POR SLOTS (Y PUSHDOWN A SNOWFLAKE)
+# ---------------------------------------------------------------------------
+
+# Con SNOWFLAKE_PUSHDOWN=1 los filtros de los formularios viajan como WHERE a Snowflake
+# y solo se descargan las filas de la consulta, en lugar de las tablas completas.
+SNOWFLAKE_PUSHDOWN = os.getenv("SNOWFLAKE_PUSHDOWN", "0") == "1"
+SNOWFLAKE_PUSHDOWN_CACHE_SIZE = int(os.getenv("SNOWFLAKE_PUSHDOWN_CACHE_SIZE", "256"))
+SNOWFLAKE_PUSHDOWN_CACHE_MB = float(os.getenv("SNOWFLAKE_PUSHDOWN_CACHE_MB", "512"))
+
+MONTH_ES_TO_NUM = {v: k for k, v in MONTH_NUM_TO_ES.items()}
+COUNTRY_ES_TO_EN = {v.lower(): k.lower() for k, v in COUNTRY_TRANSLATION.items()}
+
+# Valores de slot que equivalen a "sin filtro"
+WILDCARD_VALUES = {"", "todos", "todas", "todos los meses", "todos los perfiles"}
+
+# Columna del DataFrame (ya normalizado) sobre la que actúa cada filtro
+_DIMENSION_COLUMNS = {
+    "destino": "DESTINATION_CITY_NAME",
+    "origen_pais": "ORIGIN_COUNTRY_NAME",
+    "origen_ciudad": "ORIGIN_CITY_NAME",
+    "anno": "YEAR_KEY",
+    "mes": "MONTH_KEY",
+    "perfil": "PAX_PROFILE_KEY",
+    "ventana": "WINDOW_DAYS_NUM",
+}
+FILTER_COLUMNS = {query_type: dict(_DIMENSION_COLUMNS) for query_type in BASIC_DF_QUERIES}
+FILTER_COLUMNS["busquedas"]["anno"] = "SEARCH_YEAR_KEY"
+
+# Filtros de igualdad que se resuelven con el índice invertido de cada frame (la ventana es un rango)
+INDEXED_FILTERS = {
+    query_type: {key: column for key, column in columns.items() if key != "ventana"}
+    for query_type, columns in FILTER_COLUMNS.items()
+}
+
+# Expresión SQL equivalente en las consultas base (alias F/O/D y A/B/C)
+PUSHDOWN_COLUMNS = {
+    "ventana": {
+        "destino": "D.CITYNAME", "origen_pais": "O.COUNTRYNAME", "origen_ciudad": "O.CITYNAME",
+        "anno": "F.YEAR_KEY", "mes": "F.MONTH_KEY",
+    },
+    "busquedas": {
+        "destino": "D.CITYNAME", "origen_pais": "O.COUNTRYNAME", "origen_ciudad": "O.CITYNAME",
+        "anno": "FLOOR(F.SEARCH_DAY_KEY / 10000)", "mes": "F.MONTH_KEY",
+    },
+    "cluster": {
+        "destino": "D.CITYNAME", "origen_pais": "O.COUNTRYNAME", "origen_ciudad": "O.CITYNAME",
+        "anno": "F.YEAR_KEY", "mes": "F.MONTH_KEY", "perfil": "F.PAX_PROFILE_KEY", "ventana": "F.WINDOW_DAYS_NUM",
+    },
+    "clima": {
+        "destino": "B.CITYNAME", "origen_pais": "C.COUNTRYNAME", "origen_ciudad": "C.CITYNAME",
+        "anno": "FLOOR(A.SEARCH_DAY_KEY / 10000)", "mes": "MOD(FLOOR(A.SEARCH_DAY_KEY / 100), 100)",
+    },
+}
+_TEXT_FILTERS = ("destino", "origen_pais", "origen_ciudad")
+
+# Frames ya normalizados por (tipo, filtros); caducan con el mismo TTL que los de `basic_df`
+_pushdown_cache = LRUCache(
+    max_bytes=int(SNOWFLAKE_PUSHDOWN_CACHE_MB * 2**20), max_entries=SNOWFLAKE_PUSHDOWN_CACHE_SIZE, ttl=BASIC_DF_TTL,
+)
+_pushdown_loads = SingleFlight()
+
+# Subconjuntos ya filtrados de los frames en caché por (tipo, versión, filtros canónicos)
+BASIC_DF_SUBSET_CACHE_MB = float(os.getenv("BASIC_DF_SUBSET_CACHE_MB", "128"))
+BASIC_DF_SUBSET_CACHE_SIZE = int(os.getenv("BASIC_DF_SUBSET_CACHE_SIZE", "512"))
+# Se mide sin `deep`: las cadenas de las columnas de texto son las mismas del frame completo
+_subset_cache = LRUCache(
+    max_bytes=int(BASIC_DF_SUBSET_CACHE_MB * 2**20),
+    max_entries=BASIC_DF_SUBSET_CACHE_SIZE,
+    sizeof=lambda df: int(df.memory_usage(deep=False).sum()),
+)
+
+def slot_filters(destino=None, origen_pais=None, origen_ciudad=None, anno=None, mes=None, perfil=None, ventana=None) -> dict:
+    """
+    Convierte los slots ya normalizados (normalize(), traducción de ciudad y ajuste
+    de castellón) en un diccionario canónico de filtros, omitiendo los comodines.
+    """
+    filters = {}
+    for key, value in (("destino", destino), ("origen_pais", origen_pais), ("origen_ciudad", origen_ciudad), ("mes", mes)):
+        if value is not None and normalize(value) not in WILDCARD_VALUES:
+            filters[key] = normalize(value)
+    if "mes" in filters:
+        # MONTH_KEY es el número de mes; un nombre desconocido se deja tal cual y no casa con ninguna fila
+        filters["mes"] = MONTH_ES_TO_NUM.get(filters["mes"], filters["mes"])
+    if anno:
+        filters["anno"] = int(anno)
+    if perfil is not None:
+        filters["perfil"] = int(perfil)
+    if ventana is not None:
+        filters["ventana"] = (int(ventana[0]), int(ventana[1]))
+    return filters
+
+def filter_key(filters: dict) -> tuple:
+    return tuple(sorted(filters.items()))
+
+def apply_filters(query_type: str, df: pd.DataFrame, filters: dict, index: Optional[FrameIndex] = None) -> pd.DataFrame:
+    """
+    Filtra `df` con los filtros canónicos de `slot_filters`. Con el `index` del frame,
+    las igualdades se resuelven intersecando posiciones y solo el resto se evalúa fila a fila.
+    Sin filtros devuelve una vista de `df` en lugar de copiar la tabla entera.
+    """
+    if not filters:
+        return df.copy(deep=False)
+    columns = FILTER_COLUMNS[query_type]
+    positions = index.lookup(filters) if index is not None else None
+    if positions is not None:
+        df = df.iloc[positions]
+        filters = {key: value for key, value in filters.items() if key not in index.keys}
+        if not filters:
+            return df
+
+    mask = pd.Series(True, index=df.index)
+    for key, value in filters.items():
+        if key == "ventana":
+            mask &= df[columns[key]].between(*value)
+        else:
+            mask &= df[columns[key]] == value
+    return df[mask]
+
+def build_pushdown_query(query_type: str, filters: dict) -> tuple[str, dict]:
+    """
+    Devuelve la consulta base con los filtros como condiciones WHERE, ordenada como
+    `basic_df` (`FACT_ORDER`), y sus bind variables.
+    """
+    columns = PUSHDOWN_COLUMNS[query_type]
+    conditions, params = [], {}
+
+    for key, value in filters.items():
+        if key not in columns:
+            continue
+        if key in _TEXT_FILTERS:
+            if key == "origen_pais":
+                value = COUNTRY_ES_TO_EN.get(value, value)
+            conditions.append(f"LOWER(TRIM({columns[key]})) = %({key})s")
+        elif key == "mes":
+            value = MONTH_ES_TO_NUM.get(value, value)
+            conditions.append(f"{columns[key]} = %({key})s")
+        elif key == "ventana":
+            conditions.append(f"{columns[key]} BETWEEN %(ventana_min)s AND %(ventana_max)s")
+            params["ventana_min"], params["ventana_max"] = value
+            continue
+        else:
+            conditions.append(f"{columns[key]} = %({key})s")
+        params[key] = value
+
+    query = with_conditions(basic_df_query(query_type), conditions)
+    return f"{query}\n        ORDER BY {FACT_ORDER[query_type]}", params
+
+def _pushdown_df(query_type: str, filters: dict) -> Optional[pd.DataFrame]:
+    """Filas de `query_type` filtradas en Snowflake (vacías si no hay), o None si la consulta falla."""
+    key = (query_type, filter_key(filters))
+    df = _pushdown_cache.get(key)
+    if df is not None:
+        return df
+
+    # Peticiones idénticas simultáneas comparten una única consulta
+    try:
+        return _pushdown_loads.do(key, lambda: _load_pushdown_df(key, query_type, filters), timeout=BASIC_DF_LOAD_TIMEOUT)
+    except SingleFlightTimeout as exc:
+        print(f"Tiempo de espera agotado: {exc}")
+        return None
+
+def _load_pushdown_df(key: tuple, query_type: str, filters: dict) -> Optional[pd.DataFrame]:
+    query, params = build_pushdown_query(query_type, filters)
+    df = fetch_snowflake_data(query, params, cache=False)
+    # Un error o el circuito abierto devuelven un frame sin columnas; una consulta sin
+    # filas trae su esquema y se cachea como cualquier otra
+    if not len(df.columns):
+        return None
+
+    df = compact_frame(query_type, normalize_frame(query_type, df))
+    _pushdown_cache.put(key, df)
+    return df
+
+def daily_rows(query_type: str, filters: dict) -> pd.DataFrame:
+    """
+    Filas diarias de `query_type` que cumplen `filters` cuando la caché solo guarda su
+    resumen mensual: se piden filtradas como en modo pushdown y comparten su caché LRU,
+    que las expulsa por tamaño y TTL.
+    """
+    df = _pushdown_df(query_type, filters)
+    return apply_filters(query_type, df, filters) if df is not None else pd.DataFrame()
+
+def filter_frame(query_type: str, filters: dict) -> Optional[pd.DataFrame]:
+    """
+    Devuelve las filas de `query_type` que cumplen `filters` (vacías si no hay ninguna),
+    o None si Snowflake no devuelve datos (error de conexión o circuito abierto).
+    """
+    if SNOWFLAKE_PUSHDOWN:
+        df = _pushdown_df(query_type, filters)
+        return apply_filters(query_type, df, filters) if df is not None else None
+
+    df = basic_df(query_type)
+    if df.empty:
+        return None
+    entry = _basic_df_cache.get(query_type)
+    if entry is None or entry.df is not df or not BASIC_DF_SUBSET_CACHE_MB:
+        return apply_filters(query_type, df, filters, entry.index if entry is not None and entry.df is df else None)
+    return _filtered_subset(query_type, entry, filters)
+
+def _filtered_subset(query_type: str, entry: CachedFrame, filters: dict) -> pd.DataFrame:
+    # Los filtros ya vienen canónicos (normalize, traducción y ajuste de castellón aplicados en la acción)
+    key = (query_type, entry.version, filter_key(filters))
+    subset = _subset_cache.get(key)
+    if subset is None:
+        subset = apply_filters(query_type, entry.df, filters, entry.index)
+        _subset_cache.put(key, subset)
+    # Copia superficial: la acción puede añadir o sustituir columnas sin tocar la entrada cacheada
+    return subset.copy(deep=False)
+
+def _discard_subsets(query_type: str, version: int):
+    """Al cambiar de versión un frame, sus subconjuntos filtrados dejan de servir."""
+    _subset_cache.discard(lambda key: key[0] == query_type and key[1] != version)
+
+def filter_frames(query_types: tuple, filters: dict) -> list:
+    """Como `filter_frame` para varias tablas, cargando en paralelo las que estén frías."""
+    if SNOWFLAKE_PUSHDOWN:
+        return _parallel_map(lambda query_type: filter_frame(query_type, filters), query_types)
+
+    load_basic_dfs(query_types)
+    return [filter_frame(query_type, filters) for query_type in query_types]
+
+# ---------------------------------------------------------------------------
+# CUBO DE AGREGADOS
+# ---------------------------------------------------------------------------
+
+# Métrica (y columna de día, para las medias diarias) de cada tipo con cubo; sobre un
+# resumen mensual la columna de día es la de su mes (`ROLLUP_PERIOD_COLUMN`)
+CUBE_MEASURES = {
+    "ventana": ("WINDOW_DAYS_NUM", None),
+    "busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"),
+}
+CUBE_DIMENSIONS = ("destino", "origen_pais", "origen_ciudad", "anno", "mes")
+
+# Con BASIC_DF_CUBE=1 el cubo se recalcula en segundo plano cada vez que cambia la versión de un frame
+BASIC_DF_CUBE = os.getenv("BASIC_DF_CUBE", "1") == "1"
+_basic_df_cubes: dict[str, tuple[int, AggregateCube]] = {}
+_cubes_building: set[tuple] = set()  # (tipo, versión) de los cubos y tuplas de cubos de las uniones en curso
+_cubes_lock = threading.Lock()
+
+def _cube_dimensions(query_type: str) -> dict[str, str]:
+    return {key: FILTER_COLUMNS[query_type][key] for key in CUBE_DIMENSIONS}
+
+def _cube_measure(query_type: str, df: pd.DataFrame) -> tuple[str, Optional[str]]:
+    measure, day_column = CUBE_MEASURES[query_type]
+    return measure, ROLLUP_PERIOD_COLUMN if ROLLUP_SUM in df.columns else day_column
+
+def _schedule_cube(query_type: str, entry: CachedFrame):
+    if not BASIC_DF_CUBE or query_type not in CUBE_MEASURES:
+        return
+    built = _basic_df_cubes.get(query_type)
+    with _cubes_lock:
+        if (built is not None and built[0] == entry.version) or (query_type, entry.version) in _cubes_building:
+            return
+        _cubes_building.add((query_type, entry.version))
+    threading.Thread(target=_build_cube, args=(query_type, entry), name=f"cube-{query_type}", daemon=True).start()
+
+def _build_cube(query_type: str, entry: CachedFrame):
+    try:
+        start = time.perf_counter()
+        measure, day_column = _cube_measure(query_type, entry.df)
+        cube = AggregateCube(entry.df, _cube_dimensions(query_type), measure, day_column)
+        # Si mientras tanto ha llegado otra versión, este cubo ya no sirve
+        if basic_df_version(query_type) == entry.version:
+            _basic_df_cubes[query_type] = (entry.version, cube)
+        print(f"Cubo de '{query_type}': {cube.nbytes / 2**20:.1f} MB en {time.perf_counter() - start:.2f}s")
+    except Exception as exc:
+        print(f"Error calculando el cubo de '{query_type}': {exc}")
+    finally:
+        with _cubes_lock:
+            _cubes_building.discard((query_type, entry.version))
+    if query_type in JOINED_CUBES:
+        _build_joined_cubes()
+
+def aggregate_cube(query_type: str, filtered: pd.DataFrame) -> AggregateCube:
+    """
+    Cubo para responder sobre `filtered` (resultado de `filter_frame`): el precalculado
+    de la versión en caché si ya está listo y, si no (o con pushdown), uno que agrega
+    las filas de `filtered` bajo demanda con la misma interfaz.
+    """
+    built = _basic_df_cubes.get(query_type)
+    if built is not None and not SNOWFLAKE_PUSHDOWN and built[0] == basic_df_version(query_type):
+        return built[1]
+    measure, day_column = _cube_measure(query_type, filtered)
+    return AggregateCube(filtered, _cube_dimensions(query_type), measure, day_column, eager=False)
+
+# Cubos de búsquedas y ventana unidos por dimensiones, para las respuestas que combinan ambas tablas
+JOINED_CUBES = ("busquedas", "ventana")
+# Clave: los propios cubos (por identidad); solo se guarda la unión del último par calculado
+_basic_df_joined: dict[tuple[AggregateCube, ...], JoinedCubes] = {}
+
+def _build_joined_cubes():
+    """Une los cubos de `JOINED_CUBES` cuando todos están calculados para las versiones en caché."""
+    built = [_basic_df_cubes.get(query_type) for query_type in JOINED_CUBES]
+    if any(item is None or item[0] != basic_df_version(query_type) for query_type, item in zip(JOINED_CUBES, built)):
+        return
+    cubes = tuple(cube for _, cube in built)
+    with _cubes_lock:
+        if cubes in _basic_df_joined or cubes in _cubes_building:
+            return
+        _cubes_building.add(cubes)
+    try:
+        start = time.perf_counter()
+        joined = JoinedCubes(dict(zip(JOINED_CUBES, cubes)))
+        _basic_df_joined.clear()
+        _basic_df_joined[cubes] = joined
+        print(f"Cubos de {' x '.join(JOINED_CUBES)} unidos: {joined.nbytes / 2**20:.1f} MB en {time.perf_counter() - start:.2f}s")
+    except Exception as exc:
+        print(f"Error uniendo los cubos de {' y '.join(JOINED_CUBES)}: {exc}")
+    finally:
+        with _cubes_lock:
+            _cubes_building.discard(cubes)
+
+def joined_cubes(*cubes: AggregateCube) -> JoinedCubes:
+    """
+    Cubos de `JOINED_CUBES` (en ese orden, los que devuelve `aggregate_cube`) unidos:
+    los precalculados si salen de esos mismos cubos y, si no, unidos bajo demanda.
+    """
+    joined = _basic_df_joined.get(cubes)
+    if joined is not None:
+        return joined
+    return JoinedCubes(dict(zip(JOINED_CUBES, cubes)), eager=False)
+
+# ---------------------------------------------------------------------------
+# PRECARGA DE CACHÉ
+# ---------------------------------------------------------------------------
+
+# Con BASIC_DF_WARMUP=1 los cuatro dataframes se cargan en segundo plano al arrancar `rasa run actions`
+BASIC_DF_WARMUP = os.getenv("BASIC_DF_WARMUP", "0") == "1"
+
+_basic_df_warm = threading.Event()
 
+def _parallel_map(fn, items) -> list:
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=len(items), thread_name_prefix="basic-df") as executor:
+        return list(executor.map(fn, items))
+
+def _timed_basic_df(query_type: str) -> pd.DataFrame:
+    start = time.perf_counter()
+    df = basic_df(query_type)
+    print(f"Carga de '{query_type}': {len(df)} filas en {time.perf_counter() - start:.2f}s")
     return df
 
+def load_basic_dfs(query_types) -> dict[str, pd.DataFrame]:
+    """Devuelve los dataframes pedidos, cargando en paralelo los que no están en caché."""
+    cold = [query_type for query_type in query_types if query_type not in _basic_df_cache]
+    _parallel_map(_timed_basic_df, cold)
+    return {query_type: basic_df(query_type) for query_type in query_types}
+
+def warm_up_basic_df():
+    """Precarga todos los tipos de `basic_df` y marca la caché como caliente."""
+    start = time.perf_counter()
+    frames = load_basic_dfs(BASIC_DF_QUERIES)
+    loaded = [query_type for query_type, df in frames.items() if not df.empty]
+
+    if len(loaded) == len(frames):
+        _basic_df_warm.set()
+    print(f"Precarga de caché: {len(loaded)}/{len(frames)} dataframes en {time.perf_counter() - start:.2f}s")
+
+def basic_df_is_warm() -> bool:
+    return _basic_df_warm.is_set()
+
+# Tipos cuyas ciudades de origen se cruzan y memo del resultado: {"keys": (versiones, instante, claves)}
+COMMON_KEY_TYPES = ("busquedas", "ventana", "cluster")
+_common_keys_memo: dict = {}
+
+def _city_keys(df: pd.DataFrame) -> set:
+    # Enteros de Python por los dos caminos: los frames calientes traen escalares numpy (o
+    # float si hubo nulos) y Snowflake enteros, y el resultado debe ser el mismo
+    return {int(key) for key in df["SEARCH_ORIGIN_CITY_KEY"].dropna().unique()}
+
 def get_common_origin_city_keys() -> list:
     """
     Devuelve una lista de SEARCH_ORIGIN_CITY_KEY que aparecen en las 3 tablas:
-    FC_LUC_SEARCHS_PREDICTION, FC_LUC_OPPORTUNITY_WINDOW y FC_LUC_CLUSTER_SEGMENTATION.
+    FC_LUC_SEARCHS_PREDICTION, FC_LUC_OPPORTUNITY_WINDOW y FC_LUC_CLUSTER_SEGMENTATION
+    (con el mismo alcance que `basic_df`: destinos del bot y sin los mercados excluidos).
+
+    Si los tres frames están en caché se calcula sobre ellos; si no, con un único
+    INTERSECT en Snowflake. El resultado se memoiza hasta que cambie la versión de
+    alguno de los frames (o, sin frames, hasta que venza su TTL).
     """
-    tables = [
-        "FC_LUC_SEARCHS_PREDICTION",
-        "FC_LUC_OPPORTUNITY_WINDOW",
-        "FC_LUC_CLUSTER_SEGMENTATION",
-    ]
-
-    city_key_sets = []
-    for table in tables:
-        query = f"SELECT DISTINCT SEARCH_ORIGIN_CITY_KEY FROM {table}"
+    versions = tuple(basic_df_version(qt) for qt in COMMON_KEY_TYPES)
+    memo = _common_keys_memo.get("keys")
+    if memo is not None and memo[0] == versions:
+        ttl = min(basic_df_ttl(qt) for qt in COMMON_KEY_TYPES)
+        if all(versions) or not ttl or time.monotonic() - memo[1] <= ttl:
+            return list(memo[2])
+
+    entries = [_basic_df_cache.get(qt) for qt in COMMON_KEY_TYPES]
+    if all(entries):
+        # Frames calientes: no hace falta ir a Snowflake
+        versions = tuple(entry.version for entry in entries)
+        city_key_sets = [_city_keys(entry.df) for entry in entries]
+        keys = sorted(set.intersection(*city_key_sets))
+    else:
+        query = "\n        INTERSECT\n".join(
+            f"SELECT SEARCH_ORIGIN_CITY_KEY, ORIGIN_COUNTRY_NAME FROM ({basic_df_query(qt).strip()})"
+            for qt in COMMON_KEY_TYPES
+        )
         df = fetch_snowflake_data(query)
-        if "SEARCH_ORIGIN_CITY_KEY" in df.columns:
-            city_key_sets.append(set(df["SEARCH_ORIGIN_CITY_KEY"].dropna().unique()))
+        if "SEARCH_ORIGIN_CITY_KEY" not in df.columns:
+            print("❗ No se pudieron recuperar correctamente las claves de todas las tablas.")
+            return []
 
-    if len(city_key_sets) != 3:
-        print("❗ No se pudieron recuperar correctamente las claves de todas las tablas.")
-        return []
+        countries = df["ORIGIN_COUNTRY_NAME"].map(COUNTRY_TRANSLATION).fillna(df["ORIGIN_COUNTRY_NAME"])
+        df = df[~countries.str.strip().str.lower().isin(EXCLUDED_COUNTRIES)]
+        keys = sorted(_city_keys(df))
 
-    return sorted(set.intersection(*city_key_sets))
+    _common_keys_memo["keys"] = (versions, time.monotonic(), keys)
+    return list(keys)
 
 # ---------------------------------------------------------------------------
 # AGENTE LANGCHAIN
@@ -313,16 +1643,327 @@ def serialize_value(value):
     return value
 
 
+# ---------------------------------------------------------------------------
+# REGISTRO DE MANEJADORES DE CONSULTA
+# ---------------------------------------------------------------------------
+#
+# Cada tipo_consulta de cada acción es una función registrada con `query_handler`, que
+# declara las columnas que lee de cada tipo de frame y cómo agrega: "cube" (sumas del
+# cubo de agregados, sin tocar las filas) o "rows" (filas filtradas). `basic_df_columns`
+# pide y guarda solo la unión de esas columnas y las de los filtros, y la acción
+# despacha con una búsqueda en `QUERY_HANDLERS`. Los manejadores reciben por nombre
+# los valores que usan (dispatcher, filters, frames, cubes, slots ya normalizados...)
+# y el resto en `**_`.
+
+@dataclass(frozen=True)
+class QueryHandler:
+    run: Callable[..., None]
+    columns: dict[str, tuple]  # tipo de frame -> columnas que lee
+    aggregation: str = "rows"  # "cube" | "rows"
+    memoize: bool = True  # False si la respuesta no depende solo de los slots y los datos (p. ej. el agente)
+    inputs: tuple = ()  # valores del contexto que recibe por nombre
+
+# acción -> tipo_consulta -> manejador
+QUERY_HANDLERS: dict[str, dict[str, QueryHandler]] = {}
+
+def query_handler(
+    action: str, tipo_consulta: str, columns: dict[str, tuple], aggregation: str = "rows", memoize: bool = True,
+):
+    """Registra la función decorada como respuesta de `action` a `tipo_consulta`."""
+    def register(run: Callable[..., None]) -> Callable[..., None]:
+        inputs = tuple(
+            name for name, parameter in inspect.signature(run).parameters.items()
+            if parameter.kind is not inspect.Parameter.VAR_KEYWORD
+        )
+        QUERY_HANDLERS.setdefault(action, {})[tipo_consulta] = QueryHandler(run, columns, aggregation, memoize, inputs)
+        return run
+    return register
+
+def dispatch_query(
+    action: str, tipo_consulta: str, frames: dict[str, pd.DataFrame], memo_key: Optional[tuple] = None, **context,
+) -> bool:
+    """
+    Responde a `tipo_consulta` con su manejador (False si no hay ninguno). Los de
+    agregación "cube" reciben los cubos de `frames` en `cubes`; los de "rows", los frames
+    recortados a las columnas de los filtros y las que declaran (las filas diarias de
+    `daily_rows` si `frames` trae un resumen mensual). Con `memo_key` (de `answer_key`)
+    los mensajes enviados se guardan para `replay_answer`.
+    """
+    handler = QUERY_HANDLERS.get(action, {}).get(tipo_consulta)
+    if handler is None:
+        return False
+    if handler.aggregation == "cube":
+        cubes = {query_type: aggregate_cube(query_type, df) for query_type, df in frames.items()}
+        frames = {}
+    else:
+        cubes, rows = {}, {}
+        for query_type, df in frames.items():
+            columns = handler.columns.get(query_type, ())
+            if ROLLUP_SUM in df.columns and columns:
+                df = daily_rows(query_type, context["filters"])
+            rows[query_type] = df[[
+                column for column in df.columns if column in FILTER_COLUMNS[query_type].values() or column in columns
+            ]]
+        frames = rows
+    recorder = None
+    if memo_key is not None:
+        recorder = context["dispatcher"] = _RecordingDispatcher(context["dispatcher"])
+    handler.run(tipo_consulta=tipo_consulta, frames=frames, cubes=cubes, **context)
+    if recorder is not None:
+        _answer_cache.put(memo_key, recorder.messages)
+    return True
+
+# -------------------------------
+# RESPUESTAS MEMOIZADAS
+# -------------------------------
+# Un manejador determinista da los mismos mensajes para los mismos filtros, las mismas
+# entradas y la misma versión de los frames: se guardan con esa clave y una petición
+# repetida los reenvía sin filtrar, agregar ni formatear nada. BASIC_DF_ANSWER_CACHE_MB=0
+# lo desactiva; en modo pushdown no se usa (sus frames no tienen versión).
+BASIC_DF_ANSWER_CACHE_MB = float(os.getenv("BASIC_DF_ANSWER_CACHE_MB", "16"))
+BASIC_DF_ANSWER_CACHE_SIZE = int(os.getenv("BASIC_DF_ANSWER_CACHE_SIZE", "2048"))
+_answer_cache = LRUCache(
+    max_bytes=int(BASIC_DF_ANSWER_CACHE_MB * 2**20),
+    max_entries=BASIC_DF_ANSWER_CACHE_SIZE,
+    sizeof=lambda messages: len(repr(messages)),
+)
+
+class _RecordingDispatcher:
+    """Envía los mensajes al dispatcher de la acción y guarda sus argumentos."""
+
+    def __init__(self, dispatcher: CollectingDispatcher):
+        self.dispatcher = dispatcher
+        self.messages: list[dict] = []
+
+    def utter_message(self, **kwargs):
+        self.messages.append(kwargs)
+        self.dispatcher.utter_message(**kwargs)
+
+def answer_key(action: str, tipo_consulta: str, query_types: tuple, filters: dict, context: dict) -> Optional[tuple]:
+    """
+    Clave (acción, tipo_consulta, tipos, versiones, filtros canónicos, entradas del
+    manejador tomadas de `context`) de la respuesta memoizada, o None si no se memoiza:
+    sin manejador o no determinista, caché desactivada, pushdown o algún frame sin cargar.
+    """
+    handler = QUERY_HANDLERS.get(action, {}).get(tipo_consulta)
+    if handler is None or not handler.memoize or not BASIC_DF_ANSWER_CACHE_MB or SNOWFLAKE_PUSHDOWN:
+        return None
+    versions = []
+    for query_type in query_types:
+        if query_type not in _basic_df_cache:
+            return None
+        # Como cualquier acceso: refresco si ha caducado y sincronización con los frames compartidos
+        basic_df(query_type)
+        versions.append(basic_df_version(query_type))
+    inputs = tuple((name, context[name]) for name in handler.inputs if name in context)
+    return action, tipo_consulta, query_types, tuple(versions), filter_key(filters), inputs
+
+def replay_answer(dispatcher: CollectingDispatcher, key: Optional[tuple]) -> bool:
+    """Reenvía los mensajes guardados con `key`; False si no los hay."""
+    messages = _answer_cache.get(key) if key is not None else None
+    if messages is None:
+        return False
+    for message in messages:
+        dispatcher.utter_message(**message)
+    return True
+
+def _discard_answers(query_type: str, version: int):
+    """Al cambiar de versión un frame, las respuestas calculadas con la anterior dejan de servir."""
+    _answer_cache.discard(
+        lambda key: query_type in key[2] and key[3][key[2].index(query_type)] != version
+    )
+
+
 # ---------------------------------------------------------------------------
 # ACTION QUERY SNOWFLAKE BÚSQUEDAS
 # ---------------------------------------------------------------------------
 
+@query_handler(
+    "action_query_snowflake_busquedas", "Ventana media y búsquedas desde un mercado de origen",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"), "ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ventana_y_busquedas_mercado(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, anno, date_filter_norm, **_):
+    cube_b, cube_v = cubes["busquedas"], cubes["ventana"]
+    n_busquedas = cube_b.total(filters)["sum"]
+    totals_v = cube_v.total(filters)
+    ventana_media = round(totals_v["sum"] / totals_v["count"])
+
+    dispatcher.utter_message(text=f"La ventana media y el número de búsquedas totales desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} de {anno} son: **{ventana_media} días** y **{round(n_busquedas)} búsquedas**.")
+
+    if date_filter_norm != "todos los meses":
+        month_flight = get_month_name_after_days(month_pretty, ventana_media, int(anno))
+
+        dispatcher.utter_message(text=f"_⇨ Se esperan {round(n_busquedas)} búsquedas en {month_pretty} para volar en {month_flight}_")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Ventana media y búsquedas desde una ciudad de origen",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"), "ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ventana_y_busquedas_ciudad(dispatcher, filters, cubes, origen_ciudad_pretty, origen_pais_pretty, destino_pretty, month_pretty, anno, date_filter_norm, **_):
+    cube_b, cube_v = cubes["busquedas"], cubes["ventana"]
+    n_busquedas = cube_b.total(filters)["sum"]
+    totals_v = cube_v.total(filters)
+    ventana_media = round(totals_v["sum"] / totals_v["count"])
+
+    dispatcher.utter_message(text=f"La ventana media y el número de búsquedas totales desde {origen_ciudad_pretty} ({origen_pais_pretty}) a {destino_pretty} en {month_pretty} de {anno} son: **{ventana_media} días** y **{round(n_busquedas)} búsquedas**.")
+
+    if date_filter_norm != "todos los meses":
+        month_flight = get_month_name_after_days(month_pretty, ventana_media, int(anno))
+
+        dispatcher.utter_message(text=f"_⇨ Se esperan {round(n_busquedas)} búsquedas en {month_pretty} para volar en {month_flight}_")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Ranking de mercados de origen por ventana media",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"), "ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ranking_mercados_ventana_media(dispatcher, filters, cubes, destino_pretty, month_pretty, anno, **_):
+    cube_b, cube_v = cubes["busquedas"], cubes["ventana"]
+    cells = joined_cubes(cube_b, cube_v).breakdown(filters, "origen_pais")
+    merged = pd.DataFrame({
+        "ORIGIN_COUNTRY_NAME": cells.index,
+        "WINDOW_DAYS_NUM": (cells["ventana_sum"] / cells["ventana_count"]).round().astype(int).to_numpy(),
+        "SEARCHS_MEAN_WINDOW_NUM": cells["busquedas_sum"].round().astype(int).to_numpy(),
+    })
+    merged = merged.sort_values(by="WINDOW_DAYS_NUM", ascending=False)
+    merged["ORIGIN_COUNTRY_NAME"] = merged["ORIGIN_COUNTRY_NAME"].str.title()
+    merged.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "WINDOW_DAYS_NUM":"Ventana media", "SEARCHS_MEAN_WINDOW_NUM": "Búsq. totales"}, inplace=True)
+
+    html_table = pretty_table(merged)
+    dispatcher.utter_message(text=f"El ranking de mercados de origen según la ventana promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Ranking de ciudades de origen por ventana media",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"), "ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ranking_ciudades_ventana_media(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, anno, **_):
+    cube_b, cube_v = cubes["busquedas"], cubes["ventana"]
+    cells = joined_cubes(cube_b, cube_v).breakdown(filters, "origen_ciudad")
+    merged = pd.DataFrame({
+        "ORIGIN_CITY_NAME": cells.index,
+        "WINDOW_DAYS_NUM": (cells["ventana_sum"] / cells["ventana_count"]).round().astype(int).to_numpy(),
+        "SEARCHS_MEAN_WINDOW_NUM": cells["busquedas_sum"].round().astype(int).to_numpy(),
+    })
+    merged = merged.sort_values(by="WINDOW_DAYS_NUM", ascending=False)
+    merged["ORIGIN_CITY_NAME"] = merged["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()                
+    merged.rename(columns={"ORIGIN_CITY_NAME": "Origen", "WINDOW_DAYS_NUM":"Ventana media", "SEARCHS_MEAN_WINDOW_NUM": "Búsq. totales"}, inplace=True)  
+    html_table = pretty_table(merged.head(15))
+    dispatcher.utter_message(text=f"El ranking ciudades de origen de {origen_pais_pretty} según la ventana promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Búsquedas diarias desde un mercado de origen",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY")}, aggregation="cube",
+)
+def _busquedas_diarias_mercado(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, anno, **_):
+    cube_b = cubes["busquedas"]
+    totals_b = cube_b.total(filters)
+    n_busquedas = totals_b["sum"] / totals_b["days"]
+    dispatcher.utter_message(text=f"El número de búsquedas diarias promedio desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(n_busquedas)}.")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Búsquedas diarias desde una ciudad de origen",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY")}, aggregation="cube",
+)
+def _busquedas_diarias_ciudad(dispatcher, filters, cubes, origen_ciudad_pretty, destino_pretty, month_pretty, anno, **_):
+    cube_b = cubes["busquedas"]
+    totals_b = cube_b.total(filters)
+    n_busquedas = totals_b["sum"] / totals_b["days"]
+    dispatcher.utter_message(text=f"El número de búsquedas diarias promedio desde {origen_ciudad_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(n_busquedas)}.")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Ranking de mercados de origen por ventana media diarias",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY")}, aggregation="cube",
+)
+def _ranking_mercados_busquedas_diarias(dispatcher, filters, cubes, destino_pretty, month_pretty, anno, **_):
+    cube_b = cubes["busquedas"]
+    cells_b = cube_b.breakdown(filters, ("origen_pais",))
+    grouped = ((cells_b["sum"] / cells_b["days"])             # búsquedas por día en cada país
+                            .round().astype(int).rename("SEARCHS_MEAN_WINDOW_NUM")
+                            .sort_values(ascending=False)
+                            .reset_index())
+    grouped["ORIGIN_COUNTRY_NAME"] = grouped["ORIGIN_COUNTRY_NAME"].str.title()
+
+    grouped.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "SEARCHS_MEAN_WINDOW_NUM": "Búsquedas al día"}, inplace=True)
+    html_table = pretty_table(grouped)
+    dispatcher.utter_message(text=f"El ranking de mercados de origen según las búsquedas al día promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Ranking de ciudades de origen por ventana media diarias",
+    columns={"busquedas": ("SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY")}, aggregation="cube",
+)
+def _ranking_ciudades_busquedas_diarias(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, anno, **_):
+    cube_b = cubes["busquedas"]
+    cells_b = cube_b.breakdown(filters, ("origen_ciudad",))
+    grouped = ((cells_b["sum"] / cells_b["days"])
+                            .round().astype(int).rename("SEARCHS_MEAN_WINDOW_NUM")
+                            .sort_values(ascending=False)
+                            .reset_index())
+    grouped["ORIGIN_CITY_NAME"] = grouped["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()
+
+    grouped.rename(columns={"ORIGIN_CITY_NAME": "Origen", "SEARCHS_MEAN_WINDOW_NUM": "Búsquedas al día"}, inplace=True)
+    html_table = pretty_table(grouped.head(15))
+    dispatcher.utter_message(text=f"El ranking ciudades de origen de de {origen_pais_pretty} según las búsquedas al día promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_busquedas", "Consulta abierta",
+    columns={"busquedas": ("SEARCH_DAY_KEY", "SEARCH_PERIOD", "SEARCHS_MEAN_WINDOW_NUM")}, memoize=False,
+)
+def _consulta_abierta_busquedas(dispatcher, frames, tipo_consulta, destino_norm, origen_pais_norm, origen_ciudad_norm, consulta_norm, **_):
+    filtered_df = frames["busquedas"]
+    agent = create_pandas_dataframe_agent(ChatOpenAI(model_name="gpt-4-turbo-preview", temperature=0), with_calendar_labels(filtered_df), verbose=True)
+    print("Agente creado con éxito.")
+    query_description = {
+        "tipo_consulta": tipo_consulta,
+        "destino": destino_norm,
+        "origen_pais": origen_pais_norm,
+        "origen_ciudad": origen_ciudad_norm,
+        # "date_filter": date_filter or "No especificado",
+        "consulta": consulta_norm,
+    }
+    prompt = (
+        """Eres un experto interpretando las solicitudes que los usuarios hacen a información estructurada en un "
+                    "dataframe a través del lenguaje natural y dando el resultado correcto.\n\n" \
+                    "Tus entradas son los posibles parámetros de la consulta (no todos serán necesarios):\n" \
+                    f"- Destino: {query_description['destino']}\n" \
+                    f"- Pais o mercado de origen: {query_description['origen_pais']}\n" \
+                    f"- Ciudad de origen: {query_description['origen_ciudad']}\n" \
+                    f"- Fecha de interés (periodo): {query_description['date_filter']}\n" \
+                    f"- Consulta: {query_description['consulta']}\n\n" \
+                    "1. Interpreta rigurosamente la consulta del usuario teniendo en cuenta los parámetros y su relación con "
+                    "las columnas del dataframe.\n" \
+                    "2. Calcula el resultado correcto según la consulta.\n" \
+                    "3. Responde siempre en español, clara y concisamente."""
+    )
+    response = ask_agent(agent, prompt)
+    dispatcher.utter_message(text=response)
+
+
 class ActionQuerySnowflakeB(Action):
     """Consulta datos en Snowflake y devuelve respuestas formateadas."""
 
     def name(self):
         return "action_query_snowflake_busquedas"
 
+    def _reset_slots(self) -> list:
+        """Vacía los slots del formulario y vuelve a escuchar."""
+        return [
+            SlotSet("tipo_consulta", None),
+            SlotSet("destino_b", None),
+            SlotSet("origen_pais_b", None),
+            SlotSet("origen_ciudad_b", None),
+            SlotSet("anno_b", None),
+            SlotSet("date_filter", None),
+            SlotSet("consulta", None),
+            FollowupAction("action_listen"),
+        ]
+
     # ---------------------------------------------------------------------
     # MÉTODO PRINCIPAL
     # ---------------------------------------------------------------------
@@ -342,26 +1983,6 @@ class ActionQuerySnowflakeB(Action):
             origen_ciudad = translator_es_en.translate(origen_ciudad)
             print("Traducción ciudad origen:", origen_ciudad)
 
-        # Obtención de datos
-        df = basic_df("busquedas")
-        df_v = basic_df("ventana")
-
-        print("df_busquedas:", df.head())
-        print("df_ventana:", df_v.head())
-
-        if df.empty or df_v.empty:
-            dispatcher.utter_message(text="No se encontraron datos en la base de datos, para esta consulta.")
-            return [
-                SlotSet("tipo_consulta", None),
-                SlotSet("destino_b", None),
-                SlotSet("origen_pais_b", None),
-                SlotSet("origen_ciudad_b", None),
-                SlotSet("anno_b", None),
-                SlotSet("date_filter", None),
-                SlotSet("consulta", None),
-                FollowupAction("action_listen"),
-            ]
-
         # Normalización de entradas
         destino_norm = normalize(destino)
         origen_pais_norm = normalize(origen_pais)
@@ -378,41 +1999,12 @@ class ActionQuerySnowflakeB(Action):
             destino_norm = "castellon de la plana"
 
         # ------------------------------------------
-        #  FILTRADO
+        #  OBTENCIÓN Y FILTRADO DE DATOS
         # ------------------------------------------
-        # Máscara para df
-        mask = pd.Series(True, index=df.index)
-        if destino_norm != "todos":
-            mask &= df["DESTINATION_CITY_NAME"] == destino_norm
-        if origen_pais_norm != "todos":
-            mask &= df["ORIGIN_COUNTRY_NAME"] == origen_pais_norm
-        if origen_ciudad_norm != "todas":
-            mask &= df["ORIGIN_CITY_NAME"] == origen_ciudad_norm
-        if anno:
-            mask &= df["SEARCH_DAY_KEY"].dt.year == int(anno)
-        if date_filter_norm and date_filter_norm != "todos los meses":
-            mask &= df["MONTH_KEY"] == date_filter_norm
-
-        filtered_df = df[mask]
-
-        # Máscara para df_v (repite la lógica pero sobre df_v)
-        mask_v = pd.Series(True, index=df_v.index)
-        if destino_norm != "todos":
-            mask_v &= df_v["DESTINATION_CITY_NAME"] == destino_norm
-        if origen_pais_norm != "todos":
-            mask_v &= df_v["ORIGIN_COUNTRY_NAME"] == origen_pais_norm
-        if origen_ciudad_norm != "todas":
-            mask_v &= df_v["ORIGIN_CITY_NAME"] == origen_ciudad_norm
-        if anno:
-            mask_v &= df_v["YEAR_KEY"] == int(anno)
-        if date_filter_norm and date_filter_norm != "todos los meses":
-            mask_v &= df_v["MONTH_KEY"] == date_filter_norm
-
-        filtered_df_v = df_v[mask_v]
-
-        print("Filas después del filtrado:", len(filtered_df))
-        if filtered_df.empty or filtered_df_v.empty:
-            print("No se encontraron resultados después del filtrado.")
+        filters = slot_filters(
+            destino=destino_norm, origen_pais=origen_pais_norm, origen_ciudad=origen_ciudad_norm,
+            anno=anno, mes=date_filter_norm,
+        )
 
         # Nombres bonitos para mensajes
         destino_pretty = destino.capitalize() if destino_norm != "todos" else "Comunitat Valenciana"
@@ -420,106 +2012,129 @@ class ActionQuerySnowflakeB(Action):
         origen_ciudad_pretty = translator_en_es.translate(origen_ciudad).title() if origen_ciudad_norm != "todas" else "todas las ciudades"
         month_pretty = date_filter_slot.lower() if date_filter_slot != "todos" else "todos los meses"
 
+        context = dict(
+            anno=anno, date_filter_norm=date_filter_norm, destino_norm=destino_norm, origen_pais_norm=origen_pais_norm,
+            origen_ciudad_norm=origen_ciudad_norm, consulta_norm=consulta_norm, destino_pretty=destino_pretty,
+            origen_pais_pretty=origen_pais_pretty, origen_ciudad_pretty=origen_ciudad_pretty, month_pretty=month_pretty,
+        )
+        # La misma pregunta sobre los mismos datos: se repite la respuesta sin tocar los frames
+        memo_key = answer_key(self.name(), tipo_consulta, ("busquedas", "ventana"), filters, context)
+        if replay_answer(dispatcher, memo_key):
+            return self._reset_slots()
+
+        filtered_df, filtered_df_v = filter_frames(("busquedas", "ventana"), filters)
+
+        if filtered_df is None or filtered_df_v is None:
+            dispatcher.utter_message(text=no_data_message("No se encontraron datos en la base de datos, para esta consulta."))
+            return self._reset_slots()
+
+        print("Filas después del filtrado:", len(filtered_df))
+        if filtered_df.empty or filtered_df_v.empty:
+            print("No se encontraron resultados después del filtrado.")
+
         # ------------------------------------------------------------------
         #  RESPUESTAS SEGÚN TIPO DE CONSULTA
         # ------------------------------------------------------------------
         try:
             if filtered_df.empty or filtered_df_v.empty:
                 dispatcher.utter_message(text="Lamentablemente, no existen datos para la consulta realizada.")
-            
-            elif tipo_consulta == "Ventana media y búsquedas desde un mercado de origen":
-                n_busquedas = filtered_df["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                ventana_media = round(filtered_df_v["WINDOW_DAYS_NUM"].mean())
-
-                dispatcher.utter_message(text=f"La ventana media y el número de búsquedas totales desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} de {anno} son: **{ventana_media} días** y **{round(n_busquedas)} búsquedas**.")
-                
-                if date_filter_norm != "todos los meses":
-                    month_flight = get_month_name_after_days(month_pretty, ventana_media, int(anno))
-
-                    dispatcher.utter_message(text=f"_⇨ Se esperan {round(n_busquedas)} búsquedas en {month_pretty} para volar en {month_flight}_")
-
-            elif tipo_consulta == "Ventana media y búsquedas desde una ciudad de origen":
-                n_busquedas = filtered_df["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                ventana_media = round(filtered_df_v["WINDOW_DAYS_NUM"].mean())
-
-                dispatcher.utter_message(text=f"La ventana media y el número de búsquedas totales desde {origen_ciudad_pretty} ({origen_pais_pretty}) a {destino_pretty} en {month_pretty} de {anno} son: **{ventana_media} días** y **{round(n_busquedas)} búsquedas**.")
-
-                if date_filter_norm != "todos los meses":
-                    month_flight = get_month_name_after_days(month_pretty, ventana_media, int(anno))
-
-                    dispatcher.utter_message(text=f"_⇨ Se esperan {round(n_busquedas)} búsquedas en {month_pretty} para volar en {month_flight}_")
-
-
-            elif tipo_consulta == "Ranking de mercados de origen por ventana media":
-                ranking_vo = filtered_df_v.groupby(["ORIGIN_COUNTRY_NAME"])["WINDOW_DAYS_NUM"].mean().round().astype(int).reset_index()
-                ranking_b = filtered_df.groupby(["ORIGIN_COUNTRY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].sum().round().astype(int).reset_index()
-                
-                merged = pd.merge(ranking_vo, ranking_b, on="ORIGIN_COUNTRY_NAME", how="inner")
-                merged = merged.sort_values(by="WINDOW_DAYS_NUM", ascending=False)
-                merged["ORIGIN_COUNTRY_NAME"] = merged["ORIGIN_COUNTRY_NAME"].str.title()
-                merged.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "WINDOW_DAYS_NUM":"Ventana media", "SEARCHS_MEAN_WINDOW_NUM": "Búsq. totales"}, inplace=True)
-                
-                html_table = pretty_table(merged)
-                dispatcher.utter_message(text=f"El ranking de mercados de origen según la ventana promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Ranking de ciudades de origen por ventana media":
-                ranking_vo = filtered_df_v.groupby(["ORIGIN_CITY_NAME"])["WINDOW_DAYS_NUM"].mean().round().astype(int).reset_index()
-                ranking_b = filtered_df.groupby(["ORIGIN_CITY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].sum().round().astype(int).reset_index()
-                
-                merged = pd.merge(ranking_vo, ranking_b, on="ORIGIN_CITY_NAME", how="inner")
-                merged = merged.sort_values(by="WINDOW_DAYS_NUM", ascending=False)
-                merged["ORIGIN_CITY_NAME"] = merged["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()                
-                merged.rename(columns={"ORIGIN_CITY_NAME": "Origen", "WINDOW_DAYS_NUM":"Ventana media", "SEARCHS_MEAN_WINDOW_NUM": "Búsq. totales"}, inplace=True)  
-                html_table = pretty_table(merged.head(15))
-                dispatcher.utter_message(text=f"El ranking ciudades de origen de {origen_pais_pretty} según la ventana promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Búsquedas diarias desde un mercado de origen":
-                grouped = filtered_df.groupby("SEARCH_DAY_KEY")["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                n_busquedas = grouped.mean()
-                dispatcher.utter_message(text=f"El número de búsquedas diarias promedio desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(n_busquedas)}.")
-
-            elif tipo_consulta == "Búsquedas diarias desde una ciudad de origen":
-                grouped = filtered_df.groupby("SEARCH_DAY_KEY")["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                n_busquedas = grouped.mean()
-                dispatcher.utter_message(text=f"El número de búsquedas diarias promedio desde {origen_ciudad_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(n_busquedas)}.")
-
-            elif tipo_consulta == "Ranking de mercados de origen por ventana media diarias":
-                grouped = (filtered_df.groupby(["SEARCH_DAY_KEY", "ORIGIN_COUNTRY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                                        .reset_index()                            # búsquedas por día y país
-                                        .groupby("ORIGIN_COUNTRY_NAME")["SEARCHS_MEAN_WINDOW_NUM"].mean()
-                                        .round().astype(int).sort_values(ascending=False)
-                                        .reset_index())
-                grouped["ORIGIN_COUNTRY_NAME"] = grouped["ORIGIN_COUNTRY_NAME"].str.title()
-                
-                grouped.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "SEARCHS_MEAN_WINDOW_NUM": "Búsquedas al día"}, inplace=True)
-                html_table = pretty_table(grouped)
-                dispatcher.utter_message(text=f"El ranking de mercados de origen según las búsquedas al día promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Ranking de ciudades de origen por ventana media diarias":
-                grouped = (filtered_df.groupby(["SEARCH_DAY_KEY", "ORIGIN_CITY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].sum()
-                                        .reset_index()
-                                        .groupby("ORIGIN_CITY_NAME")["SEARCHS_MEAN_WINDOW_NUM"].mean()
-                                        .round().astype(int).sort_values(ascending=False)
-                                        .reset_index())
-                grouped["ORIGIN_CITY_NAME"] = grouped["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()
-
-                grouped.rename(columns={"ORIGIN_CITY_NAME": "Origen", "SEARCHS_MEAN_WINDOW_NUM": "Búsquedas al día"}, inplace=True)
-                html_table = pretty_table(grouped.head(15))
-                dispatcher.utter_message(text=f"El ranking ciudades de origen de de {origen_pais_pretty} según las búsquedas al día promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Consulta abierta":
-                agent = create_pandas_dataframe_agent(ChatOpenAI(model_name="gpt-4-turbo-preview", temperature=0), filtered_df, verbose=True)
-                print("Agente creado con éxito.")
-                query_description = {
-                    "tipo_consulta": tipo_consulta,
-                    "destino": destino_norm,
-                    "origen_pais": origen_pais_norm,
-                    "origen_ciudad": origen_ciudad_norm,
-                    # "date_filter": date_filter or "No especificado",
-                    "consulta": consulta_norm,
-                }
-                prompt = (
-                    """Eres un experto interpretando las solicitudes que los usuarios hacen a información estructurada en un "
+            else:
+                dispatch_query(
+                    self.name(), tipo_consulta, {"busquedas": filtered_df, "ventana": filtered_df_v},
+                    memo_key=memo_key, dispatcher=dispatcher, filters=filters, **context,
+                )
+        except Exception as exc:
+            dispatcher.utter_message(text=f"Error al procesar la consulta. Por favor prueba de nuevo.")
+            print(f"Error al procesar la consulta: {exc}")
+
+        # Reset de slots y vuelta a escuchar
+        return self._reset_slots()
+
+
+# ---------------------------------------------------------------------------
+# ACTION QUERY SNOWFLAKE VENTANA DE OPORTUNIDAD
+# ---------------------------------------------------------------------------
+
+@query_handler(
+    "action_query_snowflake_ventana", "Ventana de oportunidad desde un mercado de origen",
+    columns={"ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ventana_mercado(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, **_):
+    cube = cubes["ventana"]
+    totals = cube.total(filters)
+    ventana = totals["sum"] / totals["count"]
+    dispatcher.utter_message(text=f"La ventana de oportunidad promedio desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} es {round(ventana)}.")
+
+
+@query_handler(
+    "action_query_snowflake_ventana", "Ventana de oportunidad desde una ciudad de origen",
+    columns={"ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ventana_ciudad(dispatcher, filters, cubes, origen_ciudad_pretty, destino_pretty, month_pretty, **_):
+    cube = cubes["ventana"]
+    totals = cube.total(filters)
+    ventana = totals["sum"] / totals["count"]
+    dispatcher.utter_message(text=f"La ventana de oportunidad promedio desde {origen_ciudad_pretty} a {destino_pretty} en {month_pretty} es {round(ventana)}.")
+
+
+@query_handler(
+    "action_query_snowflake_ventana", "Ranking de mercados de origen por ventana de oportunidad",
+    columns={"ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ranking_mercados_ventana(dispatcher, filters, cubes, destino_pretty, month_pretty, **_):
+    cube = cubes["ventana"]
+    cells = cube.breakdown(filters, ("mes", "origen_pais"))
+    grouped = ((cells["sum"] / cells["count"]).rename("Ventana de oportunidad")
+                            .reset_index()                            # ventana media por mes y país
+                            .groupby("ORIGIN_COUNTRY_NAME", observed=True)["Ventana de oportunidad"].mean()
+                            .round().astype(int).sort_values(ascending=False)
+                            .reset_index())
+    grouped["ORIGIN_COUNTRY_NAME"] = grouped["ORIGIN_COUNTRY_NAME"].str.title()
+
+    grouped.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "Ventana de oportunidad": "Ventana"}, inplace=True)
+    html_table = pretty_table(grouped)
+    dispatcher.utter_message(text=f"El ranking de mercados de origen según la ventana de oportunidad promedio a {destino_pretty} en {month_pretty} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_ventana", "Ranking de ciudades de origen por ventana de oportunidad",
+    columns={"ventana": ("WINDOW_DAYS_NUM",)}, aggregation="cube",
+)
+def _ranking_ciudades_ventana(dispatcher, filters, cubes, origen_pais_pretty, destino_pretty, month_pretty, **_):
+    cube = cubes["ventana"]
+    cells = cube.breakdown(filters, ("mes", "origen_ciudad"))
+    grouped = ((cells["sum"] / cells["count"]).rename("Ventana de oportunidad")
+                            .reset_index()
+                            .groupby("ORIGIN_CITY_NAME", observed=True)["Ventana de oportunidad"].mean()
+                            .round().astype(int).sort_values(ascending=False)
+                            .reset_index())
+    grouped["ORIGIN_CITY_NAME"] = grouped["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()
+
+    grouped.rename(columns={"ORIGIN_CITY_NAME": "Origen", "Ventana de oportunidad": "Ventana"}, inplace=True)
+    html_table = pretty_table(grouped.head(15))
+    dispatcher.utter_message(text=f"El ranking ciudades de origen de {origen_pais_pretty} según la ventana de oportunidad promedio a {destino_pretty} en {month_pretty} es:\n\n {html_table}")
+
+
+@query_handler(
+    "action_query_snowflake_ventana", "Consulta abierta",
+    columns={"ventana": ("WINDOW_DAYS_NUM",)}, memoize=False,
+)
+def _consulta_abierta_ventana(dispatcher, frames, tipo_consulta, destino_norm, origen_pais_norm, origen_ciudad_norm, consulta_norm, date_filter_period, **_):
+    filtered_df = frames["ventana"][[
+        "WINDOW_DAYS_NUM", "ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME", "DESTINATION_CITY_NAME", "MONTH_KEY"
+    ]].rename(columns={"WINDOW_DAYS_NUM": "Ventana de oportunidad"})
+    agent = create_pandas_dataframe_agent(ChatOpenAI(model_name="gpt-4-turbo-preview", temperature=0), with_calendar_labels(filtered_df), verbose=True)
+    print("Agente creado con éxito.")
+    query_description = {
+        "tipo_consulta_v": tipo_consulta,
+        "destino": destino_norm,
+        "origen_pais": origen_pais_norm,
+        "origen_ciudad": origen_ciudad_norm,
+        "date_filter_v": date_filter_period or "No especificado",
+        "consulta_v": consulta_norm,
+    }
+    prompt = (
+        """Eres un experto interpretando las solicitudes que los usuarios hacen a información estructurada en un "
                     "dataframe a través del lenguaje natural y dando el resultado correcto.\n\n" \
                     "Tus entradas son los posibles parámetros de la consulta (no todos serán necesarios):\n" \
                     f"- Destino: {query_description['destino']}\n" \
@@ -531,29 +2146,10 @@ class ActionQuerySnowflakeB(Action):
                     "las columnas del dataframe.\n" \
                     "2. Calcula el resultado correcto según la consulta.\n" \
                     "3. Responde siempre en español, clara y concisamente."""
-                )
-                response = ask_agent(agent, prompt)
-                dispatcher.utter_message(text=response)
-        except Exception as exc:
-            dispatcher.utter_message(text=f"Error al procesar la consulta. Por favor prueba de nuevo.")
-            print(f"Error al procesar la consulta: {exc}")
-
-        # Reset de slots y vuelta a escuchar
-        return [
-            SlotSet("tipo_consulta", None),
-            SlotSet("destino_b", None),
-            SlotSet("origen_pais_b", None),
-            SlotSet("origen_ciudad_b", None),
-            SlotSet("anno_b", None),
-            SlotSet("date_filter", None),
-            SlotSet("consulta", None),
-            FollowupAction("action_listen"),
-        ]
-
+    )
+    response = ask_agent(agent, prompt)
+    dispatcher.utter_message(text=response)
 
-# ---------------------------------------------------------------------------
-# ACTION QUERY SNOWFLAKE VENTANA DE OPORTUNIDAD
-# ---------------------------------------------------------------------------
 
 class ActionQuerySnowflakeV(Action):
     """Consulta datos en Snowflake y devuelve respuestas formateadas."""
@@ -561,6 +2157,18 @@ class ActionQuerySnowflakeV(Action):
     def name(self):
         return "action_query_snowflake_ventana"
 
+    def _reset_slots(self) -> list:
+        """Vacía los slots del formulario y vuelve a escuchar."""
+        return [
+            SlotSet("tipo_consulta_v", None),
+            SlotSet("destino_v", None),
+            SlotSet("origen_pais_v", None),
+            SlotSet("origen_ciudad_v", None),
+            SlotSet("date_filter_v", None),
+            SlotSet("consulta_v", None),
+            FollowupAction("action_listen"),
+        ]
+
     # ---------------------------------------------------------------------
     # MÉTODO PRINCIPAL
     # ---------------------------------------------------------------------
@@ -579,23 +2187,7 @@ class ActionQuerySnowflakeV(Action):
             origen_ciudad = translator_es_en.translate(origen_ciudad)
             print("Traducción ciudad origen:", origen_ciudad)
 
-        # Obtención de datos
-        df = basic_df("ventana")
-        if df.empty:
-            dispatcher.utter_message(text="No se encontraron datos en la base de datos, para esta consulta.")
-            return [
-                SlotSet("tipo_consulta_v", None),
-                SlotSet("destino_v", None),
-                SlotSet("origen_pais_v", None),
-                SlotSet("origen_ciudad_v", None),
-                SlotSet("date_filter_v", None),
-                SlotSet("consulta_v", None),
-                FollowupAction("action_listen"),
-            ]
-        
         print("-" * 20)
-        print("DF ventana:", df.head())
-        print("columnas:", df.columns)
         print("Destino:", destino)
         print("Origen país:", origen_pais)
         print("Origen ciudad:", origen_ciudad)
@@ -634,26 +2226,12 @@ class ActionQuerySnowflakeV(Action):
             destino_norm = "castellon de la plana"
 
         # ------------------------------------------
-        #  FILTRADO
+        #  OBTENCIÓN Y FILTRADO DE DATOS
         # ------------------------------------------
-        mask = pd.Series(True, index=df.index)
-        if destino_norm != "todos":
-            mask &= df["DESTINATION_CITY_NAME"] == destino_norm
-        if origen_pais_norm != "todos":
-            mask &= df["ORIGIN_COUNTRY_NAME"] == origen_pais_norm
-        if origen_ciudad_norm != "todas":
-            mask &= df["ORIGIN_CITY_NAME"] == origen_ciudad_norm
-        if date_filter_period:
-            mask &= df["MONTH_KEY"] == month_name_es.lower()
-
-        filtered_df = df[mask]
-        filtered_df = filtered_df[[
-            "WINDOW_DAYS_NUM", "ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME", "DESTINATION_CITY_NAME", "MONTH_KEY"
-        ]].rename(columns={"WINDOW_DAYS_NUM": "Ventana de oportunidad"})
-
-        print("Filas después del filtrado:", len(filtered_df))
-        if filtered_df.empty:
-            print("No se encontraron resultados después del filtrado.")
+        filters = slot_filters(
+            destino=destino_norm, origen_pais=origen_pais_norm, origen_ciudad=origen_ciudad_norm,
+            mes=month_name_es.lower() if date_filter_period else None,
+        )
 
         # Nombres bonitos para mensajes
         destino_pretty = destino.capitalize() if destino_norm != "todos" else "Comunitat Valenciana"
@@ -661,86 +2239,41 @@ class ActionQuerySnowflakeV(Action):
         origen_ciudad_pretty = translator_en_es.translate(origen_ciudad).capitalize() if origen_ciudad_norm != "todas" else "todas las ciudades"
         month_pretty = month_name.lower() if month_name != "todos" else "todos los meses"
 
+        context = dict(
+            date_filter_period=date_filter_period, destino_norm=destino_norm, origen_pais_norm=origen_pais_norm,
+            origen_ciudad_norm=origen_ciudad_norm, consulta_norm=consulta_norm, destino_pretty=destino_pretty,
+            origen_pais_pretty=origen_pais_pretty, origen_ciudad_pretty=origen_ciudad_pretty, month_pretty=month_pretty,
+        )
+        memo_key = answer_key(self.name(), tipo_consulta, ("ventana",), filters, context)
+        if replay_answer(dispatcher, memo_key):
+            return self._reset_slots()
+
+        filtered_df = filter_frame("ventana", filters)
+        if filtered_df is None:
+            dispatcher.utter_message(text=no_data_message("No se encontraron datos en la base de datos, para esta consulta."))
+            return self._reset_slots()
+
+        print("Filas después del filtrado:", len(filtered_df))
+        if filtered_df.empty:
+            print("No se encontraron resultados después del filtrado.")
+
         # ------------------------------------------------------------------
         #  RESPUESTAS SEGÚN TIPO DE CONSULTA
         # ------------------------------------------------------------------
         try: 
             if filtered_df.empty:
                 dispatcher.utter_message(text="Lamentablemente, no existen datos para la consulta realizada.")
-
-            elif tipo_consulta == "Ventana de oportunidad desde un mercado de origen":
-                ventana = filtered_df["Ventana de oportunidad"].mean()
-                dispatcher.utter_message(text=f"La ventana de oportunidad promedio desde {origen_pais_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(ventana)}.")
-
-            elif tipo_consulta == "Ventana de oportunidad desde una ciudad de origen":
-                ventana = filtered_df["Ventana de oportunidad"].mean()
-                dispatcher.utter_message(text=f"La ventana de oportunidad promedio desde {origen_ciudad_pretty} a {destino_pretty} en {month_pretty} de {anno} es {round(ventana)}.")
-
-            elif tipo_consulta == "Ranking de mercados de origen por ventana de oportunidad":
-                grouped = (filtered_df.groupby(["MONTH_KEY", "ORIGIN_COUNTRY_NAME"])["Ventana de oportunidad"].mean()
-                                        .reset_index()                            # búsquedas por día y país
-                                        .groupby("ORIGIN_COUNTRY_NAME")["Ventana de oportunidad"].mean()
-                                        .round().astype(int).sort_values(ascending=False)
-                                        .reset_index())
-                grouped["ORIGIN_COUNTRY_NAME"] = grouped["ORIGIN_COUNTRY_NAME"].str.title()
-                
-                grouped.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "Ventana de oportunidad": "Ventana"}, inplace=True)
-                html_table = pretty_table(grouped)
-                dispatcher.utter_message(text=f"El ranking de mercados de origen según la ventana de oportunidad promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Ranking de ciudades de origen por ventana de oportunidad":
-                grouped = (filtered_df.groupby(["MONTH_KEY", "ORIGIN_CITY_NAME"])["Ventana de oportunidad"].mean()
-                                        .reset_index()
-                                        .groupby("ORIGIN_CITY_NAME")["Ventana de oportunidad"].mean()
-                                        .round().astype(int).sort_values(ascending=False)
-                                        .reset_index())
-                grouped["ORIGIN_CITY_NAME"] = grouped["ORIGIN_CITY_NAME"].apply(translator_en_es.translate).str.title()
-
-                grouped.rename(columns={"ORIGIN_CITY_NAME": "Origen", "Ventana de oportunidad": "Ventana"}, inplace=True)
-                html_table = pretty_table(grouped.head(15))
-                dispatcher.utter_message(text=f"El ranking ciudades de origen de {origen_pais_pretty} según la ventana de oportunidad promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
-
-            elif tipo_consulta == "Consulta abierta":
-                agent = create_pandas_dataframe_agent(ChatOpenAI(model_name="gpt-4-turbo-preview", temperature=0), filtered_df, verbose=True)
-                print("Agente creado con éxito.")
-                query_description = {
-                    "tipo_consulta_v": tipo_consulta,
-                    "destino": destino_norm,
-                    "origen_pais": origen_pais_norm,
-                    "origen_ciudad": origen_ciudad_norm,
-                    "date_filter_v": date_filter_period or "No especificado",
-                    "consulta_v": consulta_norm,
-                }
-                prompt = (
-                    """Eres un experto interpretando las solicitudes que los usuarios hacen a información estructurada en un "
-                    "dataframe a través del lenguaje natural y dando el resultado correcto.\n\n" \
-                    "Tus entradas son los posibles parámetros de la consulta (no todos serán necesarios):\n" \
-                    f"- Destino: {query_description['destino']}\n" \
-                    f"- Pais o mercado de origen: {query_description['origen_pais']}\n" \
-                    f"- Ciudad de origen: {query_description['origen_ciudad']}\n" \
-                    f"- Fecha de interés (periodo): {query_description['date_filter']}\n" \
-                    f"- Consulta: {query_description['consulta']}\n\n" \
-                    "1. Interpreta rigurosamente la consulta del usuario teniendo en cuenta los parámetros y su relación con "
-                    "las columnas del dataframe.\n" \
-                    "2. Calcula el resultado correcto según la consulta.\n" \
-                    "3. Responde siempre en español, clara y concisamente."""
+            else:
+                dispatch_query(
+                    self.name(), tipo_consulta, {"ventana": filtered_df},
+                    memo_key=memo_key, dispatcher=dispatcher, filters=filters, **context,
                 )
-                response = ask_agent(agent, prompt)
-                dispatcher.utter_message(text=response)
         except Exception as exc:
             dispatcher.utter_message(text=f"Error al procesar la consulta. Por favor prueba de nuevo.")
             print(f"Error al procesar la consulta: {exc}")
 
         # Reset de slots y vuelta a escuchar
-        return [
-            SlotSet("tipo_consulta_v", None),
-            SlotSet("destino_v", None),
-            SlotSet("origen_pais_v", None),
-            SlotSet("origen_ciudad_v", None),
-            SlotSet("date_filter_v", None),
-            SlotSet("consulta_v", None),
-            FollowupAction("action_listen"),
-        ]
+        return self._reset_slots()
         
 # ---------------------------------------------------------------------------
 # ACTION QUERY SNOWFLAKE CLUSTERS
@@ -793,11 +2326,115 @@ PAISES_CIUDADES_CLUSTERS = {
     'Irlanda': ["Condado de Kerry", "Cork", "Donegal", "Dublín", "Knock", "Shannon", "Spiddal"]
 }
 
+@query_handler(
+    "action_query_snowflake_cluster", "Número y lista de ciudades",
+    columns={"cluster": ("ORIGIN_CITY_NAME",)},
+)
+def _lista_ciudades_cluster(dispatcher, frames, **_):
+    filtered_df = frames["cluster"]
+    lista_ciudades = filtered_df["ORIGIN_CITY_NAME"].unique()
+    n_ciudades = len(lista_ciudades)
+
+    from collections import defaultdict
+
+    CITY_TO_COUNTRY = {}
+    for country, cities in PAISES_CIUDADES_CLUSTERS.items():
+        for city in cities:
+            CITY_TO_COUNTRY[city] = country.upper()
+
+    ciudades_por_pais = defaultdict(list)
+    for ciudad in lista_ciudades:
+        if ciudad == "mo i rana":
+            ciudad_pretty = "Mo i Rana"
+        else: 
+            ciudad_pretty = CITY_TRANSLATION_CLUSTERS.get(ciudad, ciudad.title())
+        pais = CITY_TO_COUNTRY.get(ciudad_pretty, "OTROS").upper()
+        ciudades_por_pais[pais].append(ciudad_pretty)
+
+    if n_ciudades < 10:
+        ciudades_pretty_str = ""
+        for pais, ciudades in ciudades_por_pais.items():
+            ciudades_pretty_str += f"**{pais.title()}**  \n" + ", ".join(ciudades) + "  \n"
+        dispatcher.utter_message(text=f"Estas son las ciudades de origen con **comportamientos comunes**, agrupadas por país: \n\n {ciudades_pretty_str}")
+    else:
+        def chunk_list(lst, n):
+            for i in range(0, len(lst), n):
+                yield lst[i:i + n]
+
+        elements = []
+        for pais, ciudades in sorted(ciudades_por_pais.items()):
+            chunks = list(chunk_list([f"▫️ {ciudad}" for ciudad in ciudades], 6))
+            for i, chunk in enumerate(chunks):
+                text = f"**{pais}**\n" + "\n".join(chunk) if i == 0 else "\n".join(chunk)
+                elements.append({"text": text})
+
+        message = {
+            "type": "text-carousel-template",
+            "payload": {
+                "template_type": "generic",
+                "elements": elements
+            }
+        }
+
+        dispatcher.utter_message(
+            text=f"☝️💡 Hay **{n_ciudades} ciudades** con un comportamiento similar en las condiciones especificadas. Aquí están agrupadas por país:",
+            attachment=message
+        )
+
+
+@query_handler(
+    "action_query_snowflake_cluster", "Ranking de mercados por nº de ciudades",
+    columns={"cluster": ("ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME")},
+)
+def _ranking_mercados_cluster(dispatcher, frames, **_):
+    filtered_df = frames["cluster"]
+    df_ranking = (
+        filtered_df.assign(ORIGIN_COUNTRY_NAME=filtered_df["ORIGIN_COUNTRY_NAME"].str.title())
+        .groupby("ORIGIN_COUNTRY_NAME", observed=True)["ORIGIN_CITY_NAME"]
+        .nunique()
+        .reset_index(name="Nº CIUDADES")
+        .sort_values(by="Nº CIUDADES", ascending=False)
+        .rename(columns={"ORIGIN_COUNTRY_NAME": "PAÍS"})
+    )
+
+    html_table = pretty_table(df_ranking)
+    styled_html_table = f"""
+                <div style="width: 109%; overflow-x: auto;">
+                    <style>
+                        table {{
+                            width: 95%;
+                            text-align: center;
+                        }}
+                        th, td {{
+                            text-align: center;
+                        }}
+                    </style>
+                    {html_table}
+                </div>
+                """
+
+    dispatcher.utter_message(
+        text=f"{styled_html_table}"
+    )
+
+
 class ActionQuerySnowflakeC(Action):
     """Consulta datos en Snowflake y devuelve respuestas formateadas."""
 
     def name(self):
         return "action_query_snowflake_cluster"
+
+    def _reset_slots(self) -> list:
+        """Vacía los slots del formulario y vuelve a escuchar."""
+        return [
+            SlotSet("tipo_consulta_c", None),
+            SlotSet("destino_c", None),
+            SlotSet("anno_c", None),
+            SlotSet("date_filter_c", None),
+            SlotSet("rango_ventana", None),
+            SlotSet("perfil", None),
+            FollowupAction("action_listen"),
+        ]
     
 
     # ---------------------------------------------------------------------
@@ -819,23 +2456,7 @@ class ActionQuerySnowflakeC(Action):
         
         print("Datos de la consulta:", destino, anno, date_filter_slot, rango_ventana, perfil)
 
-        # Obtención de datos
-        df = basic_df("cluster")
-        if df.empty:
-            dispatcher.utter_message(text="No se encontraron datos en la base de datos para esta consulta.")
-            return [
-                SlotSet("tipo_consulta_c", None),
-                SlotSet("destino_c", None),
-                SlotSet("anno_c", None),
-                SlotSet("date_filter_c", None),
-                SlotSet("rango_ventana", None),
-                SlotSet("perfil", None),
-                FollowupAction("action_listen"),
-            ]
-        
         print("-" * 20)
-        print("DF ventana:", df.head())
-        print("columnas:", df.columns)
         print("Destino:", destino)
         print("Año:", anno)
         print("Mes:", date_filter_slot)
@@ -854,31 +2475,28 @@ class ActionQuerySnowflakeC(Action):
             destino_norm = "castellon de la plana"
 
         # ------------------------------------------
-        #  FILTRADO
+        #  OBTENCIÓN Y FILTRADO DE DATOS
         # ------------------------------------------
-
-        mask = pd.Series(True, index=df.index)
-        if destino_norm != "todos":
-            mask &= df["DESTINATION_CITY_NAME"] == destino_norm
-        if anno:
-            mask &= df["YEAR_KEY"] == int(anno)
-        if date_filter_slot_norm and date_filter_slot_norm != "todos los meses":
-            mask &= df["MONTH_KEY"] == date_filter_slot_norm
+        perfil_num = None
         if perfil and perfil != "Todos los perfiles":
             perfil_num = color_num_map.get(perfil)
-            if perfil_num is not None:
-                mask &= df["PAX_PROFILE_KEY"] == perfil_num         
+        rango = None
         if rango_ventana:
             try:
                 min_rango, max_rango = map(int, rango_ventana.split('-'))
-                mask &= df["WINDOW_DAYS_NUM"].between(min_rango, max_rango)
+                rango = (min_rango, max_rango)
             except Exception as e:
                 print(f"Error al procesar rango_ventana: {rango_ventana} -> {e}")        
 
-        filtered_df = df[mask]
-        filtered_df = filtered_df[[
-            "WINDOW_DAYS_NUM", "ORIGIN_COUNTRY_NAME", "ORIGIN_CITY_NAME", "YEAR_KEY", "PAX_PROFILE_KEY", "DESTINATION_CITY_NAME", "MONTH_KEY"
-        ]].rename(columns={"WINDOW_DAYS_NUM": "Ventana de oportunidad"})
+        filters = slot_filters(destino=destino_norm, anno=anno, mes=date_filter_slot_norm, perfil=perfil_num, ventana=rango)
+        memo_key = answer_key(self.name(), tipo_consulta, ("cluster",), filters, {})
+        if replay_answer(dispatcher, memo_key):
+            return self._reset_slots()
+
+        filtered_df = filter_frame("cluster", filters)
+        if filtered_df is None:
+            dispatcher.utter_message(text=no_data_message("No se encontraron datos en la base de datos para esta consulta."))
+            return self._reset_slots()
 
         print("Perfiles disponibles:", filtered_df["PAX_PROFILE_KEY"].unique())
         
@@ -896,128 +2514,81 @@ class ActionQuerySnowflakeC(Action):
         try:
             if filtered_df.empty or filtered_df.empty:
                 dispatcher.utter_message(text="Lamentablemente, no existe ninguna agrupación de ciudades con un comportamiento similar en las condiciones especificadas.")
-         
-            elif tipo_consulta == "Número y lista de ciudades":
-                lista_ciudades = filtered_df["ORIGIN_CITY_NAME"].unique()
-                n_ciudades = len(lista_ciudades)
-
-                from collections import defaultdict
-
-                CITY_TO_COUNTRY = {}
-                for country, cities in PAISES_CIUDADES_CLUSTERS.items():
-                    for city in cities:
-                        CITY_TO_COUNTRY[city] = country.upper()
-
-                ciudades_por_pais = defaultdict(list)
-                for ciudad in lista_ciudades:
-                    if ciudad == "mo i rana":
-                        ciudad_pretty = "Mo i Rana"
-                    else: 
-                        ciudad_pretty = CITY_TRANSLATION_CLUSTERS.get(ciudad, ciudad.title())
-                    pais = CITY_TO_COUNTRY.get(ciudad_pretty, "OTROS").upper()
-                    ciudades_por_pais[pais].append(ciudad_pretty)
-
-                if n_ciudades < 10:
-                    ciudades_pretty_str = ""
-                    for pais, ciudades in ciudades_por_pais.items():
-                        ciudades_pretty_str += f"**{pais.title()}**  \n" + ", ".join(ciudades) + "  \n"
-                    dispatcher.utter_message(text=f"Estas son las ciudades de origen con **comportamientos comunes**, agrupadas por país: \n\n {ciudades_pretty_str}")
-                else:
-                    def chunk_list(lst, n):
-                        for i in range(0, len(lst), n):
-                            yield lst[i:i + n]
-
-                    elements = []
-                    for pais, ciudades in sorted(ciudades_por_pais.items()):
-                        chunks = list(chunk_list([f"▫️ {ciudad}" for ciudad in ciudades], 6))
-                        for i, chunk in enumerate(chunks):
-                            text = f"**{pais}**\n" + "\n".join(chunk) if i == 0 else "\n".join(chunk)
-                            elements.append({"text": text})
-
-                    message = {
-                        "type": "text-carousel-template",
-                        "payload": {
-                            "template_type": "generic",
-                            "elements": elements
-                        }
-                    }
-
-                    dispatcher.utter_message(
-                        text=f"☝️💡 Hay **{n_ciudades} ciudades** con un comportamiento similar en las condiciones especificadas. Aquí están agrupadas por país:",
-                        attachment=message
-                    )
-         
-         
-            elif tipo_consulta == "Ranking de mercados por nº de ciudades":
-                filtered_df["ORIGIN_COUNTRY_NAME"] = filtered_df["ORIGIN_COUNTRY_NAME"].str.title()
-                df_ranking = (
-                    filtered_df.groupby("ORIGIN_COUNTRY_NAME")["ORIGIN_CITY_NAME"]
-                    .nunique()
-                    .reset_index(name="Nº CIUDADES")
-                    .sort_values(by="Nº CIUDADES", ascending=False)
-                    .rename(columns={"ORIGIN_COUNTRY_NAME": "PAÍS"})
-                )
-                
-                html_table = pretty_table(df_ranking)
-                styled_html_table = f"""
-                <div style="width: 109%; overflow-x: auto;">
-                    <style>
-                        table {{
-                            width: 95%;
-                            text-align: center;
-                        }}
-                        th, td {{
-                            text-align: center;
-                        }}
-                    </style>
-                    {html_table}
-                </div>
-                """
-
-                dispatcher.utter_message(
-                    text=f"{styled_html_table}"
-    )
-
-                    #     if date_filter_norm != "todos los meses":
-            #         month_flight = get_month_name_after_days(month_pretty, ventana_media, int(anno))
-
-            #         dispatcher.utter_message(text=f"_⇨ Se esperan {round(n_busquedas)} búsquedas en {month_pretty} para volar en {month_flight}_")
-
-
-            # elif tipo_consulta == "Ranking de mercados de origen por ventana media":
-            #     ranking_vo = filtered_df_v.groupby(["ORIGIN_COUNTRY_NAME"])["WINDOW_DAYS_NUM"].mean().round().astype(int).reset_index()
-            #     ranking_b = filtered_df.groupby(["ORIGIN_COUNTRY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].sum().round().astype(int).reset_index()
-                
-            #     merged = pd.merge(ranking_vo, ranking_b, on="ORIGIN_COUNTRY_NAME", how="inner")
-            #     merged = merged.sort_values(by="WINDOW_DAYS_NUM", ascending=False)
-            #     merged["ORIGIN_COUNTRY_NAME"] = merged["ORIGIN_COUNTRY_NAME"].str.title()
-            #     merged.rename(columns={"ORIGIN_COUNTRY_NAME": "Origen", "WINDOW_DAYS_NUM":"Ventana media", "SEARCHS_MEAN_WINDOW_NUM": "Búsq. totales"}, inplace=True)
-                
-            #     html_table = pretty_table(merged)
-            #     dispatcher.utter_message(text=f"El ranking de mercados de origen según la ventana promedio a {destino_pretty} en {month_pretty} de {anno} es:\n\n {html_table}")
+            else:
+                dispatch_query(self.name(), tipo_consulta, {"cluster": filtered_df}, memo_key=memo_key, dispatcher=dispatcher)
 
         except Exception as exc:
             dispatcher.utter_message(text=f"Error al procesar la consulta. Por favor prueba de nuevo.")
             print(f"Error al procesar la consulta: {exc}")
 
         # # Reset de slots y vuelta a escuchar
-        return [
-            SlotSet("tipo_consulta_c", None),
-            SlotSet("destino_c", None),
-            SlotSet("anno_c", None),
-            SlotSet("date_filter_c", None),
-            SlotSet("rango_ventana", None),
-            SlotSet("perfil", None),
-            FollowupAction("action_listen"),
-        ]
+        return self._reset_slots()
 
 # ---------------------------------------------------------------------------
 # ACTION QUERY SNOWFLAKE INFLUENCIA CLIMA - PROVISIONAL
 # ---------------------------------------------------------------------------
 
+@query_handler(
+    "action_query_snowflake_clima", "Total de búsquedas según clima por origen",
+    columns={"clima": ("SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM")},
+)
+def _busquedas_por_clima(dispatcher, frames, clima, **_):
+    filtered_df = frames["clima"]
+    if clima and clima != "Todos los climas":
+        col_busquedas = None
+        for col in ["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"]:
+            if col in filtered_df.columns:
+                col_busquedas = col
+                break
+        if col_busquedas:
+            n_busquedas = filtered_df[col_busquedas].sum()
+            n_busquedas_pretty = format_number(n_busquedas)
+            clima = clima.lower()
+            dispatcher.utter_message(text=f"El **total de búsquedas** con {clima} para los parámetros seleccionados es de **{n_busquedas_pretty}.**")
+        else:
+            dispatcher.utter_message(text="No se encontró información al respecto en la base de datos.")
+    else:
+        n_busquedas_tmedia = filtered_df["SEARCH_MEAN_TEMPERATURE_NUM"].sum()
+        n_busquedas_tmin = filtered_df["SEARCH_MIN_TEMPERATURE_NUM"].sum()
+        n_busquedas_tmax = filtered_df["SEARCH_MAX_TEMPERATURE_NUM"].sum()
+        df_clima = pd.DataFrame([{
+            "CLIMA FRÍO": int(n_busquedas_tmin),
+            "CLIMA MEDIO": int(n_busquedas_tmedia),
+            "CLIMA CÁLIDO": int(n_busquedas_tmax)
+        }])
+
+        html_table = pretty_table(df_clima)
+        styled_html_table = f"""
+                    <div style="width: 105%; overflow-x: auto;">
+                        <style>
+                            th, td {{
+                                text-align: center;
+                            }}
+                        </style>
+                        {html_table}
+                    </div>
+                    """
+        dispatcher.utter_message(
+            text=f"**Total de búsquedas** según clima para los parámetros seleccionados: \n\n{styled_html_table}"
+        )
+
+
 class ActionQuerySnowflakeClima(Action):
     def name(self):
         return "action_query_snowflake_clima"
+
+    def _reset_slots(self) -> list:
+        """Vacía los slots del formulario y vuelve a escuchar."""
+        return [
+            SlotSet("tipo_consulta_cl", None),
+            SlotSet("destino_cl", None),
+            SlotSet("origen_pais_cl", None),
+            SlotSet("origen_ciudad_cl", None),
+            SlotSet("date_filter_cl", None),
+            SlotSet("clima_cl", None),
+            SlotSet("tipo_variacion_cl", None),
+            FollowupAction("action_listen"),
+        ]
     
 
     # ---------------------------------------------------------------------
@@ -1034,29 +2605,7 @@ class ActionQuerySnowflakeClima(Action):
         
         print("Datos de la consulta:", destino, origen_pais, origen_ciudad, date_filter_slot, clima)
 
-        df = basic_df("clima")
-        df['YEAR_KEY'] = df['SEARCH_DAY_KEY'].dt.year
-        df['MONTH_KEY'] = df['SEARCH_DAY_KEY'].dt.month        
-        df["MONTH_KEY"] = df["MONTH_KEY"].replace(MONTH_NUM_TO_ES)
-        
-        df = df.drop(columns=["TEMPERATURE_MEAN_NUM", "TEMPERATURE_MIN_NUM", "TEMPERATURE_MAX_NUM"])
-        
-        if df.empty:
-            dispatcher.utter_message(text="No se encontraron datos en la base de datos para esta consulta.")
-            return [
-                SlotSet("tipo_consulta_cl", None),
-                SlotSet("destino_cl", None),
-                SlotSet("origen_pais_cl", None),
-                SlotSet("origen_ciudad_cl", None),
-                SlotSet("date_filter_cl", None),
-                SlotSet("clima_cl", None),
-                SlotSet("tipo_variacion_cl", None),
-                FollowupAction("action_listen"),
-            ]
-        
         print("-" * 20)
-        print("DF clima:", df.head())
-        print("Columnas:", df.columns)
         print("Destino:", destino)
         print("Origen país:", origen_pais)
         print("Origen ciudad:", origen_ciudad)
@@ -1075,25 +2624,29 @@ class ActionQuerySnowflakeClima(Action):
         if destino_norm == "castellón":
             destino_norm = "castellon de la plana"
 
-        mask = pd.Series(True, index=df.index)
-        if destino_norm != "todos":
-            mask &= df["DESTINATION_CITY_NAME"] == destino_norm
-        if origen_pais_norm != "todos":
-            mask &= df["ORIGIN_COUNTRY_NAME"] == origen_pais_norm
-        if origen_ciudad_norm != "todas":
-            mask &= df["ORIGIN_CITY_NAME"] == origen_ciudad_norm
-        if date_filter_slot_norm and date_filter_slot_norm != "todos los meses":
-            mask &= df["MONTH_KEY"] == date_filter_slot_norm
+        # ------------------------------------------
+        #  OBTENCIÓN Y FILTRADO DE DATOS
+        # ------------------------------------------
+        filters = slot_filters(
+            destino=destino_norm, origen_pais=origen_pais_norm, origen_ciudad=origen_ciudad_norm, mes=date_filter_slot_norm,
+        )
+        memo_key = answer_key(self.name(), tipo_consulta, ("clima",), filters, {"clima": clima})
+        if replay_answer(dispatcher, memo_key):
+            return self._reset_slots()
+
+        filtered_df = filter_frame("clima", filters)
+        if filtered_df is None:
+            dispatcher.utter_message(text=no_data_message("No se encontraron datos en la base de datos para esta consulta."))
+            return self._reset_slots()
+
         if clima and clima != "Todos los climas":
             if clima == 'Clima medio':
-                df = df.drop(columns=["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"])
+                filtered_df = filtered_df.drop(columns=["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"])
             elif clima == 'Clima cálido':
-                df = df.drop(columns=["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM"])
+                filtered_df = filtered_df.drop(columns=["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM"])
             elif clima == 'Clima frío':
-                df = df.drop(columns=["SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"])    
-     
+                filtered_df = filtered_df.drop(columns=["SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"])    
 
-        filtered_df = df[mask]
         print("Filas después del filtrado:", len(filtered_df))
         if filtered_df.empty:
             print("No se encontraron resultados después del filtrado.")
@@ -1104,57 +2657,25 @@ class ActionQuerySnowflakeClima(Action):
         try:
             if filtered_df.empty or filtered_df.empty:
                 dispatcher.utter_message(text="Lamentablemente, no existen datos de búsquedas en las condiciones especificadas.")
-            
-            elif tipo_consulta == "Total de búsquedas según clima por origen":
-                if clima and clima != "Todos los climas":
-                    col_busquedas = None
-                    for col in ["SEARCH_MIN_TEMPERATURE_NUM", "SEARCH_MEAN_TEMPERATURE_NUM", "SEARCH_MAX_TEMPERATURE_NUM"]:
-                        if col in filtered_df.columns:
-                            col_busquedas = col
-                            break
-                    if col_busquedas:
-                        n_busquedas = filtered_df[col_busquedas].sum()
-                        n_busquedas_pretty = format_number(n_busquedas)
-                        clima = clima.lower()
-                        dispatcher.utter_message(text=f"El **total de búsquedas** con {clima} para los parámetros seleccionados es de **{n_busquedas_pretty}.**")
-                    else:
-                        dispatcher.utter_message(text="No se encontró información al respecto en la base de datos.")
-                else:
-                    n_busquedas_tmedia = filtered_df["SEARCH_MEAN_TEMPERATURE_NUM"].sum()
-                    n_busquedas_tmin = filtered_df["SEARCH_MIN_TEMPERATURE_NUM"].sum()
-                    n_busquedas_tmax = filtered_df["SEARCH_MAX_TEMPERATURE_NUM"].sum()
-                    df_clima = pd.DataFrame([{
-                        "CLIMA FRÍO": int(n_busquedas_tmin),
-                        "CLIMA MEDIO": int(n_busquedas_tmedia),
-                        "CLIMA CÁLIDO": int(n_busquedas_tmax)
-                    }])
-
-                    html_table = pretty_table(df_clima)
-                    styled_html_table = f"""
-                    <div style="width: 105%; overflow-x: auto;">
-                        <style>
-                            th, td {{
-                                text-align: center;
-                            }}
-                        </style>
-                        {html_table}
-                    </div>
-                    """
-                    dispatcher.utter_message(
-                        text=f"**Total de búsquedas** según clima para los parámetros seleccionados: \n\n{styled_html_table}"
-                    )
+            else:
+                dispatch_query(
+                    self.name(), tipo_consulta, {"clima": filtered_df}, memo_key=memo_key, dispatcher=dispatcher, clima=clima,
+                )
         
         except Exception as exc:
             dispatcher.utter_message(text=f"Error al procesar la consulta. Por favor prueba de nuevo.")
             print(f"Error al procesar la consulta: {exc}")
 
-        return [
-            SlotSet("tipo_consulta_cl", None),
-            SlotSet("destino_cl", None),
-            SlotSet("origen_pais_cl", None),
-            SlotSet("origen_ciudad_cl", None),
-            SlotSet("date_filter_cl", None),
-            SlotSet("clima_cl", None),
-            SlotSet("tipo_variacion_cl", None),
-            FollowupAction("action_listen"),
-        ]
\ No newline at end of file
+        return self._reset_slots()
+
+
+# ---------------------------------------------------------------------------
+# PRECARGA
+# ---------------------------------------------------------------------------
+# Al final del módulo: las columnas de `basic_df` dependen de los manejadores registrados
+
+if BASIC_DF_WARMUP:
+    if SNOWFLAKE_PUSHDOWN:
+        print("BASIC_DF_WARMUP ignorado: con SNOWFLAKE_PUSHDOWN=1 no se cargan las tablas completas.")
+    else:
+        threading.Thread(target=warm_up_basic_df, name="basic-df-warmup", daemon=True).start()
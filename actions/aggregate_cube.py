@@ -0,0 +1,281 @@
+import itertools
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .frame_index import FrameIndex
+
+
+# ---------------------------------------------------------------------------
+# CUBO DE AGREGADOS POR DIMENSIONES
+# ---------------------------------------------------------------------------
+#
+# Para cada subconjunto de dimensiones (destino, país y ciudad de origen, año, mes)
+# se guarda un frame indexado por esas columnas con la suma, el número de valores,
+# el mínimo y el máximo de la métrica, el número de filas y, si hay columna de día,
+# el número de días distintos. Las dimensiones que no aparecen en el subconjunto
+# equivalen al "todos" de los formularios, así que cualquier combinación de filtros
+# (y cualquier desglose por una o varias dimensiones) es una búsqueda en el índice
+# invertido (`FrameIndex`) de las celdas de ese subconjunto.
+#
+# Cada celda se calcula con un groupby sobre las filas originales (no sumando
+# celdas más finas), así sus sumas coinciden con las de un groupby sobre el frame ya
+# filtrado: son las mismas filas en el mismo orden. Sobre un resumen mensual
+# (`monthly_rollup`) se agregan las sumas, conteos y máscaras de días de cada mes.
+
+
+# ---------------------------------------------------------------------------
+# RESUMEN MENSUAL
+# ---------------------------------------------------------------------------
+#
+# Una fila por combinación de claves y mes con la suma, el número de valores, el mínimo
+# y el máximo de la métrica, el número de filas diarias y una máscara con un bit por
+# día del mes con datos. Los días distintos de cualquier agrupación son, mes a mes, los
+# bits del OR de las máscaras de sus filas: dos meses nunca comparten días.
+
+ROLLUP_SUM = "ROLLUP_SUM"
+ROLLUP_COUNT = "ROLLUP_COUNT"
+ROLLUP_MIN = "ROLLUP_MIN"
+ROLLUP_MAX = "ROLLUP_MAX"
+ROLLUP_ROWS = "ROLLUP_ROWS"
+ROLLUP_DAY_MASK = "ROLLUP_DAY_MASK"
+ROLLUP_COLUMNS = (ROLLUP_SUM, ROLLUP_COUNT, ROLLUP_MIN, ROLLUP_MAX, ROLLUP_ROWS, ROLLUP_DAY_MASK)
+
+# Bits a 1 de cada byte, para contar los días de una máscara
+_BYTE_BITS = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    masks = masks.astype(np.uint32)
+    return sum(_BYTE_BITS[(masks >> shift) & 0xFF] for shift in (0, 8, 16, 24))
+
+
+def monthly_rollup(df: pd.DataFrame, keys: list, measure: str, day_column: str, period_column: str) -> pd.DataFrame:
+    """
+    Resumen de `df` (una fila por día) por `keys` y mes (`period_column`, yyyymm), con
+    las columnas ROLLUP_*. Las claves nulas forman su propio grupo, como cualquier otra.
+    """
+    columns = [*keys, period_column]
+    grouped = df[measure].groupby([df[column] for column in columns], observed=True, sort=True, dropna=False)
+    rollup = grouped.agg(["sum", "count", "min", "max", "size"])
+    rollup.columns = [ROLLUP_SUM, ROLLUP_COUNT, ROLLUP_MIN, ROLLUP_MAX, ROLLUP_ROWS]
+
+    masks = np.zeros(len(rollup), dtype=np.uint32)
+    bits = np.left_shift(np.uint32(1), (df[day_column].to_numpy() % 100 - 1).astype(np.uint32))
+    np.bitwise_or.at(masks, grouped.ngroup().to_numpy(), bits)
+    rollup[ROLLUP_DAY_MASK] = masks
+    return rollup.reset_index()
+
+
+def merge_rollups(df: pd.DataFrame, keys: list, period_column: str) -> pd.DataFrame:
+    """
+    Une en una fila por claves y mes los resúmenes de `monthly_rollup` concatenados en
+    `df` (p. ej. los de cada lote de una ingesta): suma sumas, conteos y filas, toma
+    mínimo y máximo y hace el OR de las máscaras de días.
+    """
+    columns = [*keys, period_column]
+    grouped = df.groupby(columns, observed=True, sort=True, dropna=False)
+    merged = grouped.agg({ROLLUP_SUM: "sum", ROLLUP_COUNT: "sum", ROLLUP_MIN: "min", ROLLUP_MAX: "max", ROLLUP_ROWS: "sum"})
+
+    masks = np.zeros(len(merged), dtype=np.uint32)
+    np.bitwise_or.at(masks, grouped.ngroup().to_numpy(), df[ROLLUP_DAY_MASK].to_numpy().astype(np.uint32))
+    merged[ROLLUP_DAY_MASK] = masks
+    return merged.reset_index()
+
+
+class AggregateCube:
+    """
+    Agregados de `measure` para todas las combinaciones de `dims` (filtro -> columna).
+    Con `eager=False` cada combinación se calcula la primera vez que se pide, lo que
+    permite usar la misma interfaz sobre un frame ya filtrado sin precalcular nada.
+    Si `df` es un resumen de `monthly_rollup`, `day_column` es su columna de mes.
+    """
+
+    def __init__(
+        self, df: pd.DataFrame, dims: dict[str, str], measure: str, day_column: Optional[str] = None, eager: bool = True
+    ):
+        self.measure = measure
+        self.dims = {key: column for key, column in dims.items() if column in df.columns}
+        self.rows = len(df)
+        self.rollup = ROLLUP_SUM in df.columns
+        self._df = df
+        self._days = pd.factorize(df[day_column])[0] if day_column else None
+        self._cells: dict[tuple, tuple[pd.DataFrame, FrameIndex, dict]] = {}
+
+        if eager:
+            for size in range(len(self.dims) + 1):
+                for keys in itertools.combinations(self.dims, size):
+                    self._grouping(keys)
+            self._df = self._days = None
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    def covers(self, filters: dict) -> bool:
+        """True si todos los filtros son dimensiones del cubo."""
+        return all(key in self.dims for key in filters)
+
+    def total(self, filters: dict) -> dict:
+        """Agregados de las filas que cumplen `filters` (ceros si no hay ninguna)."""
+        _, index, columns = self._grouping(tuple(key for key in self.dims if key in filters))
+        positions = index.lookup(filters)
+        if positions is not None and not len(positions):
+            return {"sum": 0.0, "count": 0, "min": np.nan, "max": np.nan, "rows": 0, "days": 0}
+        row = positions[0] if positions is not None else 0
+        return {name: values[row] for name, values in columns.items()}
+
+    def breakdown(self, filters: dict, by: tuple) -> pd.DataFrame:
+        """
+        Agregados de las filas que cumplen `filters` desglosados por las dimensiones `by`,
+        indexados por sus columnas en ese orden y en el mismo orden que daría un groupby.
+        """
+        keys = tuple(key for key in self.dims if key in filters or key in by)
+        cells, index, _ = self._grouping(keys)
+        positions = index.lookup(filters)
+        if positions is not None:
+            cells = cells.iloc[positions]
+
+        levels = [self.dims[key] for key in by]
+        drop = [self.dims[key] for key in keys if key not in by]
+        if drop:
+            cells = cells.droplevel(drop)
+        if list(cells.index.names) != levels:
+            # Mismo orden que un groupby por `by`: códigos de cada nivel, el primero manda
+            cells = cells.reorder_levels(levels)
+            cells = cells.iloc[np.lexsort(cells.index.codes[::-1])]
+        if len(levels) == 1:
+            # set_axis y no `cells.index = ...`: sin filtros `cells` es el frame guardado en el cubo
+            cells = cells.set_axis(cells.index.get_level_values(0), axis=0)
+        return cells
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(cells.memory_usage(deep=True).sum()) + index.nbytes for cells, index, _ in self._cells.values())
+
+    # -------------------------------
+    # INTERNOS
+    # -------------------------------
+
+    def _grouping(self, keys: tuple) -> tuple[pd.DataFrame, FrameIndex, dict]:
+        grouping = self._cells.get(keys)
+        if grouping is None:
+            cells = self._aggregate([self.dims[key] for key in keys])
+            index = FrameIndex(cells.index.to_frame(index=False), {key: self.dims[key] for key in keys})
+            grouping = self._cells[keys] = (cells, index, {name: cells[name].to_numpy() for name in cells.columns})
+        return grouping
+
+    def _aggregate(self, columns: list) -> pd.DataFrame:
+        if self.rollup:
+            return self._aggregate_rollup(columns)
+        df, days = self._df, self._days
+        values = df[self.measure]
+        if not columns:
+            return pd.DataFrame({
+                "sum": [values.sum()], "count": [values.count()], "min": [values.min()], "max": [values.max()],
+                "rows": [len(values)], "days": [len(np.unique(days)) if days is not None else 0],
+            })
+
+        grouped = values.groupby([df[column] for column in columns], observed=True, sort=True)
+        cells = grouped.agg(["sum", "count", "min", "max", "size"]).rename(columns={"size": "rows"})
+        if not isinstance(cells.index, pd.MultiIndex):
+            cells.index = pd.MultiIndex.from_arrays([cells.index])
+        cells["days"] = 0
+        if days is not None and len(days):
+            # Días distintos por grupo: pares (grupo, día) únicos contados por grupo
+            groups = grouped.ngroup()
+            keep = groups.notna().to_numpy()
+            span = int(days.max()) + 1
+            pairs = np.unique(groups.to_numpy()[keep].astype(np.int64) * span + days[keep])
+            cells["days"] = np.bincount(pairs // span, minlength=len(cells))
+        return cells
+
+    def _aggregate_rollup(self, columns: list) -> pd.DataFrame:
+        df, months = self._df, self._days
+        stats = df[[ROLLUP_SUM, ROLLUP_COUNT, ROLLUP_MIN, ROLLUP_MAX, ROLLUP_ROWS]]
+        functions = {ROLLUP_SUM: "sum", ROLLUP_COUNT: "sum", ROLLUP_MIN: "min", ROLLUP_MAX: "max", ROLLUP_ROWS: "sum"}
+        names = {ROLLUP_SUM: "sum", ROLLUP_COUNT: "count", ROLLUP_MIN: "min", ROLLUP_MAX: "max", ROLLUP_ROWS: "rows"}
+        if not columns:
+            cells = stats.agg(functions).to_frame().T.rename(columns=names)
+            groups = np.zeros(len(df), dtype=np.int64)
+        else:
+            grouped = stats.groupby([df[column] for column in columns], observed=True, sort=True)
+            cells = grouped.agg(functions).rename(columns=names)
+            if not isinstance(cells.index, pd.MultiIndex):
+                cells.index = pd.MultiIndex.from_arrays([cells.index])
+            groups = grouped.ngroup().to_numpy()
+        cells = cells.astype({"count": np.int64, "rows": np.int64})
+
+        # Días distintos por grupo: bits del OR de las máscaras de cada (grupo, mes), sumados por grupo
+        cells["days"] = 0
+        keep = groups >= 0
+        if keep.any():
+            span = int(months.max()) + 1
+            pairs, inverse = np.unique(groups[keep].astype(np.int64) * span + months[keep], return_inverse=True)
+            masks = np.zeros(len(pairs), dtype=np.uint32)
+            np.bitwise_or.at(masks, inverse, df[ROLLUP_DAY_MASK].to_numpy()[keep].astype(np.uint32))
+            cells["days"] = np.bincount(pairs // span, weights=_popcount(masks), minlength=len(cells)).astype(np.int64)
+        return cells
+
+
+# ---------------------------------------------------------------------------
+# CUBOS DE VARIAS TABLAS UNIDOS POR DIMENSIONES
+# ---------------------------------------------------------------------------
+#
+# Las respuestas que combinan métricas de dos tablas (p. ej. ventana media y búsquedas
+# por mercado) agrupaban cada tabla y unían los dos rankings en cada consulta. Aquí las
+# celdas de los cubos de cada tabla se unen una vez por cada subconjunto de dimensiones
+# (unión interna: solo las combinaciones con filas en todas las tablas), así una
+# respuesta combinada es una búsqueda en el índice invertido de esas celdas unidas.
+# Las sumas son las de los cubos, sin reagrupar, y coinciden con las de antes.
+
+
+class JoinedCubes:
+    """
+    Celdas de varios `AggregateCube` con las mismas dimensiones unidas por cada
+    combinación de dimensiones, con las columnas de cada cubo prefijadas por su nombre
+    (`busquedas_sum`, `ventana_count`...). Con `eager=False` cada combinación se une la
+    primera vez que se pide.
+    """
+
+    def __init__(self, cubes: dict[str, AggregateCube], eager: bool = True):
+        self.cubes = cubes
+        self.dims = list(next(iter(cubes.values())).dims)
+        self._cells: dict[tuple, tuple[pd.DataFrame, FrameIndex]] = {}
+
+        if eager:
+            for size in range(1, len(self.dims) + 1):
+                for keys in itertools.combinations(self.dims, size):
+                    self._grouping(keys)
+
+    def breakdown(self, filters: dict, by: str) -> pd.DataFrame:
+        """
+        Celdas que cumplen `filters` (todos ellos dimensiones) desglosadas por la
+        dimensión `by`, indexadas por ella y en el orden de sus categorías.
+        """
+        keys = tuple(key for key in self.dims if key in filters or key == by)
+        cells, index = self._grouping(keys)
+        positions = index.lookup(filters)
+        if positions is not None:
+            cells = cells.iloc[positions]
+        # El resto de dimensiones las fijan los filtros: queda una celda por valor de `by`
+        cells = cells.iloc[np.argsort(cells[by].cat.codes.to_numpy(), kind="stable")]
+        return cells.set_index(by).drop(columns=[key for key in keys if key != by])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(cells.memory_usage(deep=True).sum()) + index.nbytes for cells, index in self._cells.values())
+
+    def _grouping(self, keys: tuple) -> tuple[pd.DataFrame, FrameIndex]:
+        grouping = self._cells.get(keys)
+        if grouping is None:
+            cells = None
+            for name, cube in self.cubes.items():
+                part = cube._grouping(keys)[0].rename_axis(list(keys))
+                part = part.add_prefix(f"{name}_").reset_index()
+                cells = part if cells is None else cells.merge(part, on=list(keys), how="inner")
+            # Categorías ordenadas comunes a todas las tablas (la unión de categóricas distintas da `object`)
+            cells = cells.astype({key: "category" for key in keys})
+            grouping = self._cells[keys] = (cells, FrameIndex(cells, {key: key for key in keys}))
+        return grouping
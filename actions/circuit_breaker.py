@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+# ---------------------------------------------------------------------------
+# CIRCUIT BREAKER PARA LA CAPA DE DATOS
+# ---------------------------------------------------------------------------
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un servicio que está fallando para no saturarlo con reintentos.
+
+    - Cerrado: las llamadas pasan; tras `failure_threshold` fallos seguidos se abre.
+    - Abierto: `allow_request()` devuelve False sin tocar el servicio hasta que
+      pasan `reset_timeout` segundos.
+    - Semiabierto: se deja pasar una única llamada de prueba. Si va bien se cierra;
+      si falla se vuelve a abrir con el tiempo de espera multiplicado por
+      `backoff_factor`, hasta un máximo de `max_reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        max_reset_timeout: float = 300.0,
+        backoff_factor: float = 2.0,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.backoff_factor = backoff_factor
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._current_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def is_open(self) -> bool:
+        """True si ahora mismo no se dejaría pasar una llamada nueva."""
+        with self._lock:
+            if self._state == OPEN:
+                return time.monotonic() - self._opened_at < self._current_timeout
+            return self._state == HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self._current_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+
+            # Semiabierto: solo una llamada de prueba a la vez
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print("Circuito de datos cerrado: el servicio vuelve a responder.")
+            self._state = CLOSED
+            self._failures = 0
+            self._current_timeout = self.reset_timeout
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                # La prueba ha fallado: se espera más antes de la siguiente
+                self._current_timeout = min(self._current_timeout * self.backoff_factor, self.max_reset_timeout)
+                self._open()
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """La llamada de prueba terminó sin resultado (p. ej. se abandonó a medias): puede pasar otra."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = max(0.0, self._current_timeout - (time.monotonic() - self._opened_at)) if self._state == OPEN else 0.0
+            return {"state": self._state, "failures": self._failures, "retry_in": round(retry_in, 1)}
+
+    # -------------------------------
+    # INTERNOS
+    # -------------------------------
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        print(f"Circuito de datos abierto tras {self._failures} fallos; próximo intento en {self._current_timeout:.0f}s.")
@@ -0,0 +1,93 @@
+from typing import Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------------------------------------------------------------------
+# ÍNDICE INVERTIDO DE LAS COLUMNAS DE DIMENSIÓN
+# ---------------------------------------------------------------------------
+#
+# Por cada columna se guarda la permutación que ordena las filas por valor (argsort
+# estable, así las posiciones de un mismo valor quedan en orden ascendente), el tramo
+# [inicio, fin) de cada valor en esa permutación y el código entero de cada fila.
+# Un filtro con varias columnas parte de la lista de posiciones más corta y la
+# interseca con las demás comprobando el código de esas posiciones, de modo que el
+# coste depende del número de candidatos y no del tamaño de la tabla.
+
+
+def _codes(series: pd.Series) -> tuple[np.ndarray, list]:
+    """Códigos enteros (-1 = nulo) y valores de `series`, reutilizando los de las categóricas."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories.tolist()
+    codes, uniques = pd.factorize(series, sort=False)
+    return codes.astype(np.min_scalar_type(-max(len(uniques), 1)), copy=False), uniques.tolist()
+
+
+class FrameIndex:
+    """Posiciones de cada valor de las columnas de dimensión de un DataFrame inmutable."""
+
+    def __init__(self, df: pd.DataFrame, columns: dict[str, str]):
+        """`columns`: filtro -> columna de `df` (las que falten en `df` se ignoran)."""
+        self.rows = len(df)
+        position_dtype = np.int32 if self.rows < 2**31 else np.int64
+        self._orders: dict[str, np.ndarray] = {}
+        self._codes: dict[str, np.ndarray] = {}
+        self._bounds: dict[str, dict[Hashable, tuple[int, int, int]]] = {}  # valor -> (código, inicio, fin)
+
+        for key, column in columns.items():
+            if column not in df.columns:
+                continue
+            codes, values = _codes(df[column])
+            order = np.argsort(codes, kind="stable").astype(position_dtype, copy=False)
+            counts = np.bincount(codes[codes >= 0], minlength=len(values))
+            starts = int((codes < 0).sum()) + np.concatenate(([0], np.cumsum(counts)[:-1]))
+            self._orders[key] = order
+            self._codes[key] = codes
+            self._bounds[key] = {
+                value: (code, int(start), int(start + count))
+                for code, (value, start, count) in enumerate(zip(values, starts, counts))
+                if count
+            }
+
+    @property
+    def keys(self) -> set:
+        return set(self._orders)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes propios del índice (los códigos de las categóricas se comparten con el frame)."""
+        return sum(order.nbytes for order in self._orders.values()) + sum(
+            codes.nbytes for codes in self._codes.values() if codes.base is None
+        )
+
+    def positions(self, key: str, value: Hashable) -> np.ndarray:
+        """Posiciones (ordenadas) de las filas con `value` en la columna del filtro `key`."""
+        _, start, stop = self._bounds[key].get(value, (-1, 0, 0))
+        return self._orders[key][start:stop]
+
+    def lookup(self, filters: dict) -> Optional[np.ndarray]:
+        """
+        Posiciones (ordenadas) que cumplen todos los filtros de igualdad indexados de
+        `filters`, o None si ninguno lo está (el resto de filtros los aplica quien llama).
+        """
+        terms = []
+        for key, value in filters.items():
+            if key not in self._orders:
+                continue
+            bound = self._bounds[key].get(value)
+            if bound is None:
+                return self._orders[key][:0]
+            terms.append((bound[2] - bound[1], key, bound))
+        if not terms:
+            return None
+
+        # Se parte del valor menos frecuente y se descartan las posiciones que no casan con el resto
+        terms.sort(key=lambda term: term[0])
+        _, key, (_, start, stop) = terms[0]
+        result = self._orders[key][start:stop]
+        for _, key, (code, _, _) in terms[1:]:
+            result = result[self._codes[key][result] == code]
+            if not len(result):
+                break
+        return result
@@ -0,0 +1,101 @@
+import glob
+import json
+import os
+import time
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+
+# ---------------------------------------------------------------------------
+# SNAPSHOTS EN DISCO DE LOS DATAFRAMES NORMALIZADOS
+# ---------------------------------------------------------------------------
+#
+# Cada snapshot es un fichero Arrow IPC (Feather v2) sin comprimir, para poder
+# abrirlo con memory-map: `{tipo}-{sello}.arrow`, donde el sello es el instante
+# de carga en milisegundos. La marca de agua viaja en los metadatos del esquema.
+
+_METADATA_KEY = b"basic_df"
+
+
+def _snapshot_path(directory: str, query_type: str, stamp: int) -> str:
+    return os.path.join(directory, f"{query_type}-{stamp}.arrow")
+
+
+def _snapshot_stamp(path: str) -> int:
+    try:
+        return int(os.path.basename(path).rsplit("-", 1)[1].split(".", 1)[0])
+    except (IndexError, ValueError):
+        return -1
+
+
+def list_snapshots(directory: str, query_type: str) -> list:
+    """Rutas de los snapshots de `query_type`, del más reciente al más antiguo."""
+    paths = glob.glob(os.path.join(directory, f"{query_type}-*.arrow"))
+    return sorted((p for p in paths if _snapshot_stamp(p) >= 0), key=_snapshot_stamp, reverse=True)
+
+
+def write_frame(path: str, df: pd.DataFrame, info: dict):
+    """
+    Escribe `df` (con su índice) como Arrow IPC sin comprimir, con `info` en los metadatos.
+    La escritura va a un temporal y se publica con `os.replace`, así un lector nunca ve un fichero a medias.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_METADATA_KEY] = json.dumps(info, default=str).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_frame(path: str) -> Tuple[pd.DataFrame, dict]:
+    """
+    Abre un fichero de `write_frame` con memory-map. Las columnas numéricas sin nulos
+    quedan apuntando al mapa (sin copia y de solo lectura); el texto se materializa.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    info = json.loads((table.schema.metadata or {}).get(_METADATA_KEY, b"{}"))
+    return table.to_pandas(split_blocks=True, date_as_object=False), info
+
+
+def save_snapshot(
+    directory: str, query_type: str, df: pd.DataFrame, watermark: Any = None, keep: int = 1, schema: int = 0
+) -> str:
+    """
+    Escribe `df` como snapshot y borra los anteriores (se conservan los `keep` más recientes).
+    `schema` es la versión del formato de `df`, para que `load_snapshot` descarte los de otra.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = int(time.time() * 1000)
+    path = _snapshot_path(directory, query_type, stamp)
+    write_frame(path, df, {"query_type": query_type, "watermark": watermark, "stamp": stamp, "schema": schema})
+
+    for old in list_snapshots(directory, query_type)[max(1, keep):]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+def load_snapshot(directory: str, query_type: str, schema: int = 0) -> Optional[Tuple[pd.DataFrame, Any, int]]:
+    """
+    Carga el snapshot más reciente de `query_type` con formato `schema` con memory-map.
+    Devuelve (df, marca de agua, sello) o None si no hay ninguno legible.
+    """
+    for path in list_snapshots(directory, query_type):
+        try:
+            df, info = read_frame(path)
+            if info.get("schema", 0) != schema:
+                print(f"Snapshot '{path}' con formato {info.get('schema', 0)} (se espera {schema}); se ignora.")
+                continue
+            return df, info.get("watermark"), _snapshot_stamp(path)
+        except (OSError, pa.ArrowInvalid, ValueError) as exc:
+            print(f"Snapshot ilegible '{path}': {exc}")
+    return None
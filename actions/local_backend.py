@@ -0,0 +1,216 @@
+import os
+import re
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# ---------------------------------------------------------------------------
+# BACKEND LOCAL (DUCKDB) PARA TRABAJAR SIN SNOWFLAKE
+# ---------------------------------------------------------------------------
+#
+# Ejecuta las mismas consultas de `BASIC_DF_QUERIES` contra una base DuckDB
+# embebida. Las ventanas de oportunidad salen de `window_opportunity.csv`; el
+# resto de tablas (DM_REF_CITY y hechos) se generan con el mismo esquema y una
+# semilla fija, de forma que dos ejecuciones producen los mismos datos.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CSV = os.path.join(ROOT, "files", "spreadsheets", "window_opportunity.csv")
+DEFAULT_LOOKUPS = os.path.join(ROOT, "data", "nlu", "lookups.yml")
+
+DESTINATIONS = {"ALC": "Alicante", "VLC": "Valencia", "CDT": "Castellon De La Plana"}
+ORIGIN_COUNTRIES = (
+    "Germany", "United Kingdom", "France", "Netherlands", "Belgium", "Italy", "Denmark",
+    "Sweden", "Norway", "Finland", "Ireland", "Portugal", "Spain", "U.S.A.", "Kenya",
+)
+PAX_PROFILES = 15
+
+FACT_TABLES = (
+    "DM_REF_CITY", "DM_REF_CITY_MLG", "FC_LUC_OPPORTUNITY_WINDOW",
+    "FC_LUC_SEARCHS_PREDICTION", "FC_LUC_CLUSTER_SEGMENTATION", "FC_LUC_TEMPERATURE_SEARCHES_PRE",
+)
+
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+def _lookup_examples(path: str, lookup: str) -> list:
+    """Ejemplos de un `lookup` del NLU (lectura línea a línea, el fichero es grande)."""
+    examples, inside = [], False
+    try:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if line.startswith("- lookup:"):
+                    if inside:
+                        break
+                    inside = line.split(":", 1)[1].strip() == lookup
+                elif inside and line.strip().startswith("- "):
+                    examples.append(line.strip()[2:].strip())
+    except OSError:
+        pass
+    return examples
+
+
+class LocalDuckDBBackend:
+    """
+    Base DuckDB sembrada con datos sintéticos con el esquema de Snowflake.
+
+    - `database`: ruta del fichero DuckDB (`:memory:` por defecto). Si el fichero
+      ya contiene las tablas no se vuelve a sembrar.
+    - `latency_ms`: retardo artificial por consulta para simular el viaje a Snowflake.
+    - `years` / `day_step`: rango de años generado y separación en días entre
+      filas de las tablas diarias (búsquedas y clima).
+    """
+
+    def __init__(
+        self,
+        csv_path: str = DEFAULT_CSV,
+        database: str = ":memory:",
+        latency_ms: float = 0.0,
+        years: tuple = (2024, 2025),
+        day_step: int = 7,
+        seed: int = 42,
+    ):
+        import duckdb
+
+        self.latency_ms = latency_ms
+        self._conn = duckdb.connect(database)
+
+        if not self._is_seeded():
+            start = time.perf_counter()
+            self._seed(csv_path, years, max(1, day_step), seed)
+            print(f"Backend DuckDB sembrado en {time.perf_counter() - start:.2f}s: {self.table_sizes()}")
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    def fetch_arrow(self, query: str, params: Optional[dict] = None) -> pa.Table:
+        """Ejecuta `query` (bind variables `%(nombre)s`, como en Snowflake) y devuelve una tabla Arrow."""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        # DuckDB usa `$nombre` para los parámetros con nombre
+        query = _PYFORMAT_PARAM.sub(r"$\1", query)
+        cur = self._conn.cursor()  # un cursor por llamada: DuckDB lo permite desde varios hilos
+        try:
+            result = cur.execute(query, params or {})
+            fetch = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+            return fetch()
+        finally:
+            cur.close()
+
+    def iter_arrow_batches(self, query: str, params: Optional[dict] = None, batch_rows: int = 100_000) -> Iterator[pa.Table]:
+        """Como `fetch_arrow`, pero entregando el resultado por lotes de `batch_rows` filas."""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        query = _PYFORMAT_PARAM.sub(r"$\1", query)
+        cur = self._conn.cursor()
+        try:
+            result = cur.execute(query, params or {})
+            reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+            for batch in reader(batch_rows):
+                yield pa.Table.from_batches([batch])
+        finally:
+            cur.close()
+
+    def table_sizes(self) -> dict:
+        return {t: self._conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in FACT_TABLES}
+
+    def close(self):
+        self._conn.close()
+
+    # -------------------------------
+    # SEMBRADO
+    # -------------------------------
+
+    def _is_seeded(self) -> bool:
+        existing = {row[0].upper() for row in self._conn.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+        return all(t in existing for t in FACT_TABLES)
+
+    def _register(self, name: str, df: pd.DataFrame):
+        self._conn.register("_seed_df", df)
+        self._conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM _seed_df")
+        self._conn.unregister("_seed_df")
+
+    def _seed(self, csv_path: str, years: tuple, day_step: int, seed: int):
+        rng = np.random.default_rng(seed)
+        window = pd.read_csv(csv_path)
+
+        # Dimensión de ciudades: destinos fijos y orígenes con nombres del lookup del NLU
+        origin_codes = sorted(set(window["SEARCH_ORIGIN_CITY"]) - set(DESTINATIONS))
+        names = _lookup_examples(DEFAULT_LOOKUPS, "origen_ciudad")
+        rng.shuffle(names)
+        cities = pd.DataFrame({
+            "CITYCODE": list(DESTINATIONS) + origin_codes,
+            "CITYNAME": list(DESTINATIONS.values()) + [
+                names[i] if i < len(names) else code.title() for i, code in enumerate(origin_codes)
+            ],
+            "COUNTRYNAME": ["Spain"] * len(DESTINATIONS) + list(rng.choice(ORIGIN_COUNTRIES, len(origin_codes))),
+        })
+        cities.insert(0, "ID", np.arange(1, len(cities) + 1, dtype="int64"))
+        self._register("DM_REF_CITY", cities)
+        self._register("DM_REF_CITY_MLG", cities.assign(LANGUAGE_KEY=1))
+
+        city_ids = dict(zip(cities["CITYCODE"], cities["ID"]))
+        window = window[window["SEARCH_ORIGIN_CITY"].isin(city_ids) & window["SEARCH_DESTINATION_CITY"].isin(city_ids)]
+        origin = window["SEARCH_ORIGIN_CITY"].map(city_ids).to_numpy("int64")
+        destination = window["SEARCH_DESTINATION_CITY"].map(city_ids).to_numpy("int64")
+        month = window["MONTH"].to_numpy("int64")
+        base_window = window["WINDOW"].to_numpy("float64")
+
+        # Ventana de oportunidad: la del CSV con una pequeña variación por año
+        self._register("FC_LUC_OPPORTUNITY_WINDOW", pd.concat([
+            pd.DataFrame({
+                "SEARCH_ORIGIN_CITY_KEY": origin,
+                "SEARCH_DESTINATION_CITY_KEY": destination,
+                "YEAR_KEY": year,
+                "MONTH_KEY": month,
+                "WINDOW_DAYS_NUM": np.round(base_window * rng.uniform(0.9, 1.1, len(window)), 2),
+            })
+            for year in years
+        ], ignore_index=True))
+
+        # Pares origen-destino únicos para las tablas diarias
+        pairs = pd.DataFrame({"o": origin, "d": destination}).drop_duplicates()
+        days = pd.date_range(f"{min(years)}-01-01", f"{max(years)}-12-31", freq=f"{day_step}D")
+        pair_o = np.repeat(pairs["o"].to_numpy(), len(days))
+        pair_d = np.repeat(pairs["d"].to_numpy(), len(days))
+        day_keys = np.tile((days.year * 10000 + days.month * 100 + days.day).to_numpy("int64"), len(pairs))
+        n = len(pair_o)
+
+        self._register("FC_LUC_SEARCHS_PREDICTION", pd.DataFrame({
+            "SEARCH_ORIGIN_CITY_KEY": pair_o,
+            "SEARCH_DESTINATION_CITY_KEY": pair_d,
+            "SEARCH_DAY_KEY": day_keys,
+            "MONTH_KEY": day_keys // 100 % 100,
+            "SEARCHS_MEAN_WINDOW_NUM": np.round(rng.gamma(2.0, 8.0, n), 3),
+        }))
+
+        self._register("FC_LUC_TEMPERATURE_SEARCHES_PRE", pd.DataFrame({
+            "SEARCH_ORIGIN_CITY_KEY": pair_o,
+            "SEARCH_DESTINATION_CITY_KEY": pair_d,
+            "SEARCH_DAY_KEY": day_keys,
+            "SEARCH_MIN_TEMPERATURE_NUM": rng.poisson(4, n),
+            "SEARCH_MEAN_TEMPERATURE_NUM": rng.poisson(8, n),
+            "SEARCH_MAX_TEMPERATURE_NUM": rng.poisson(3, n),
+            "TEMPERATURE_MIN_NUM": np.round(rng.normal(12, 5, n), 1),
+            "TEMPERATURE_MEAN_NUM": np.round(rng.normal(19, 5, n), 1),
+            "TEMPERATURE_MAX_NUM": np.round(rng.normal(26, 5, n), 1),
+        }))
+
+        # Segmentación: un perfil de pasajero por origen-destino-año-mes
+        self._register("FC_LUC_CLUSTER_SEGMENTATION", pd.concat([
+            pd.DataFrame({
+                "SEARCH_ORIGIN_CITY_KEY": origin,
+                "SEARCH_DESTINATION_CITY_KEY": destination,
+                "YEAR_KEY": year,
+                "MONTH_KEY": month,
+                "PAX_PROFILE_KEY": rng.integers(0, PAX_PROFILES, len(window)),
+                "WINDOW_DAYS_NUM": np.rint(base_window * rng.uniform(0.8, 1.2, len(window))).astype("int64"),
+            })
+            for year in years
+        ], ignore_index=True))
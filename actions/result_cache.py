@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import pandas as pd
+
+
+# ---------------------------------------------------------------------------
+# CACHÉ LRU CON PRESUPUESTO EN BYTES
+# ---------------------------------------------------------------------------
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Bytes que ocupa un DataFrame, contando el contenido real de las columnas de texto."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class LRUCache:
+    """
+    Caché LRU segura entre hilos, limitada por bytes y/o por número de entradas.
+
+    - `max_bytes`: presupuesto total (0 = sin límite); el tamaño de cada valor lo
+      calcula `sizeof` (por defecto `frame_nbytes`). Un valor que por sí solo
+      supera el presupuesto no se guarda.
+    - `max_entries`: número máximo de entradas (0 = sin límite).
+    - `ttl`: segundos de vida de cada entrada (0 = no caduca).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        max_entries: int = 0,
+        ttl: float = 0.0,
+        sizeof: Callable[[Any], int] = frame_nbytes,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sizeof = sizeof
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # clave -> (valor, bytes, instante)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[2] > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """Guarda `value` y expulsa las entradas menos usadas hasta cumplir los límites."""
+        nbytes = self._sizeof(value)
+        if self.max_bytes and nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, time.monotonic())
+            self._bytes += nbytes
+            while self._entries and (
+                (self.max_bytes and self._bytes > self.max_bytes)
+                or (self.max_entries and len(self._entries) > self.max_entries)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._remove(key)
+            return item[0] if item else None
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas cuya clave cumple `predicate` y devuelve cuántas eran."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # -------------------------------
+    # INTERNOS
+    # -------------------------------
+
+    def _remove(self, key: Hashable):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
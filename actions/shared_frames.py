@@ -0,0 +1,127 @@
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import pandas as pd
+
+from .frame_snapshots import read_frame, write_frame
+
+
+# ---------------------------------------------------------------------------
+# FRAMES COMPARTIDOS ENTRE PROCESOS (P. EJ. EN /dev/shm)
+# ---------------------------------------------------------------------------
+#
+# Por cada tipo hay:
+#   - `{tipo}-{versión}.arrow`: el frame en Arrow IPC, que cada proceso abre con memory-map.
+#   - `{tipo}.json`: manifiesto con la versión vigente, su fichero, la marca de agua y
+#     el instante de publicación. Los procesos lo consultan para enterarse de los refrescos.
+#   - `{tipo}.lock`: cerrojo (flock) para que solo un proceso cargue o refresque a la vez.
+
+
+class SharedFrameStore:
+    """Publica y adjunta frames en un directorio compartido por todos los workers."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._held = threading.local()
+        os.makedirs(directory, exist_ok=True)
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    def manifest(self, query_type: str) -> Optional[dict]:
+        """Manifiesto vigente de `query_type`, o None si todavía no se ha publicado."""
+        try:
+            with open(self._manifest_path(query_type), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, query_type: str, df: pd.DataFrame, watermark: Any = None) -> dict:
+        """
+        Escribe una nueva versión de `query_type` y la anuncia en el manifiesto.
+        Debe llamarse con `lock(query_type)` tomado para que el contador de versión no se repita.
+        """
+        previous = self.manifest(query_type)
+        version = (previous["version"] if previous else 0) + 1
+        path = os.path.join(self.directory, f"{query_type}-{version}.arrow")
+        write_frame(path, df, {"query_type": query_type, "version": version})
+
+        manifest = {"version": version, "path": path, "watermark": watermark, "published_at": time.time()}
+        self._write_manifest(query_type, manifest)
+
+        # Los procesos que aún tengan mapeada una versión anterior la conservan hasta soltarla
+        for old in glob.glob(os.path.join(self.directory, f"{query_type}-*.arrow")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return manifest
+
+    def touch(self, query_type: str, watermark: Any = None) -> Optional[dict]:
+        """Renueva el instante de publicación sin cambiar de versión (refresco sin cambios)."""
+        manifest = self.manifest(query_type)
+        if manifest is None:
+            return None
+        manifest.update(published_at=time.time(), watermark=watermark if watermark is not None else manifest["watermark"])
+        self._write_manifest(query_type, manifest)
+        return manifest
+
+    def attach(self, manifest: dict) -> pd.DataFrame:
+        """Mapea la versión indicada por `manifest` (solo lectura)."""
+        df, _ = read_frame(manifest["path"])
+        return df
+
+    @contextmanager
+    def lock(self, query_type: str, timeout: Optional[float] = None):
+        """
+        Cerrojo entre procesos para `query_type`. Devuelve True si se ha conseguido;
+        con `timeout=0` no espera, y con None espera indefinidamente. Es reentrante
+        dentro del mismo hilo (flock bloquearía al propio proceso desde otro descriptor).
+        """
+        import fcntl
+
+        held = self._held.__dict__.setdefault("types", set())
+        if query_type in held:
+            yield True
+            return
+
+        fh = open(os.path.join(self.directory, f"{query_type}.lock"), "a")
+        acquired = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    held.add(query_type)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.05)
+            yield acquired
+        finally:
+            if acquired:
+                held.discard(query_type)
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
+
+    # -------------------------------
+    # INTERNOS
+    # -------------------------------
+
+    def _manifest_path(self, query_type: str) -> str:
+        return os.path.join(self.directory, f"{query_type}.json")
+
+    def _write_manifest(self, query_type: str, manifest: dict):
+        path = self._manifest_path(query_type)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, default=str)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,61 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+# ---------------------------------------------------------------------------
+# SINGLE-FLIGHT: UNA SOLA CARGA EN CURSO POR CLAVE
+# ---------------------------------------------------------------------------
+
+class SingleFlightTimeout(Exception):
+    """La carga en curso no ha terminado dentro del tiempo de espera."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: la primera ejecuta `fn` y el
+    resto espera su resultado (o su excepción) en lugar de repetir el trabajo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(f"La carga de {key!r} sigue en curso tras {timeout}s.")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> dict:
+        """Claves con una carga en curso y cuántas llamadas esperan a cada una."""
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
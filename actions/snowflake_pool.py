@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+
+# ---------------------------------------------------------------------------
+# POOL DE CONEXIONES SNOWFLAKE
+# ---------------------------------------------------------------------------
+
+# Segundos que una conexión puede estar ociosa antes de cerrarse (SNOWFLAKE_POOL_MAX_IDLE)
+DEFAULT_MAX_IDLE = 900.0
+
+
+class PoolTimeout(Exception):
+    """No se ha podido obtener una conexión del pool a tiempo."""
+
+
+class _PooledConnection:
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.last_checked = self.created_at
+
+
+class SnowflakeConnectionPool:
+    """
+    Pool de conexiones reutilizables, compartido por todo el proceso.
+
+    - `size`: número máximo de sesiones abiertas a la vez (también limita la
+      concurrencia: quien no consigue conexión espera hasta `acquire_timeout`).
+    - `max_idle`: segundos que una conexión puede estar ociosa antes de cerrarse. La
+      limpieza es perezosa: se hace al prestar y al devolver conexiones (o llamando a
+      `evict_idle`), así que un proceso sin tráfico conserva sus sesiones hasta el
+      siguiente uso o hasta `close_all` al salir.
+    - `health_check_interval`: si una conexión lleva más de estos segundos sin
+      comprobarse, se lanza un `SELECT 1` antes de entregarla.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        size: int = 4,
+        max_idle: float = DEFAULT_MAX_IDLE,
+        health_check_interval: float = 60.0,
+        acquire_timeout: float = 30.0,
+    ):
+        self._connect = connect
+        self.size = max(1, size)
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._idle: List[_PooledConnection] = []
+
+    # -------------------------------
+    # API PÚBLICA
+    # -------------------------------
+
+    @contextmanager
+    def connection(self):
+        """Presta una conexión del pool y la devuelve al terminar el bloque."""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeout(f"Sin conexiones libres tras {self.acquire_timeout}s (máximo {self.size}).")
+
+        pooled = None
+        try:
+            pooled = self._checkout()
+            yield pooled.conn
+        except Exception:
+            # Ante cualquier error no sabemos en qué estado queda la sesión: se descarta
+            if pooled is not None:
+                self._close(pooled)
+                pooled = None
+            raise
+        finally:
+            if pooled is not None:
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(pooled)
+            self._slots.release()
+            # Al devolver también se cierran las que llevan demasiado tiempo sin usarse
+            self.evict_idle()
+
+    def evict_idle(self) -> int:
+        """Cierra las conexiones que superan `max_idle`. Devuelve cuántas se cerraron."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [p for p in self._idle if now - p.last_used > self.max_idle]
+            self._idle = [p for p in self._idle if now - p.last_used <= self.max_idle]
+        for pooled in expired:
+            self._close(pooled)
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+        return {"size": self.size, "idle": idle}
+
+    # -------------------------------
+    # INTERNOS
+    # -------------------------------
+
+    def _checkout(self) -> _PooledConnection:
+        self.evict_idle()
+
+        while True:
+            with self._lock:
+                # LIFO: la conexión usada más recientemente es la más probable de seguir viva
+                pooled: Optional[_PooledConnection] = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return _PooledConnection(self._connect())
+            if self._is_healthy(pooled):
+                return pooled
+            self._close(pooled)
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        if pooled.conn.is_closed():
+            return False
+
+        now = time.monotonic()
+        if now - pooled.last_checked < self.health_check_interval:
+            return True
+
+        try:
+            cur = pooled.conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+        except Exception as exc:
+            print(f"Conexión Snowflake descartada tras health check: {exc}")
+            return False
+
+        pooled.last_checked = now
+        return True
+
+    @staticmethod
+    def _close(pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception as exc:
+            print(f"Error cerrando conexión Snowflake: {exc}")
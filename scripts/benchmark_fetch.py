@@ -0,0 +1,91 @@
+"""
+Compara las rutas de extracción de Snowflake.
+
+- `--stage fetch` (por defecto): solo la descarga, Arrow vs pd.read_sql.
+- `--stage load`: descarga + normalización de `basic_df`, resultado completo
+  ("full") vs ingesta por lotes ("stream").
+
+Cada combinación (modo, tipo de consulta) se ejecuta en un proceso nuevo para
+que el pico de memoria (ru_maxrss) no se contamine entre mediciones. Con
+DATA_BACKEND=duckdb se mide contra la base local, sin Snowflake.
+
+Uso (desde la raíz del proyecto):
+    python scripts/benchmark_fetch.py
+    python scripts/benchmark_fetch.py --types busquedas --modes arrow pandas --repeat 3
+    DATA_BACKEND=duckdb python scripts/benchmark_fetch.py --stage load
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_TYPES = ["ventana", "busquedas", "cluster", "clima"]
+MODES = {"fetch": ["arrow", "pandas"], "load": ["full", "stream"]}
+
+
+def _rss_mb() -> float:
+    # En Linux ru_maxrss está en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(query_type: str, stage: str) -> dict:
+    sys.path.insert(0, ROOT)
+    from actions import action_query_snowflake as module
+
+    if module.DATA_BACKEND == "duckdb":
+        module.get_local_backend()  # la siembra no cuenta en la medición
+
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    if stage == "load":
+        df, _ = module._load_basic_df(query_type)
+    else:
+        df = module.fetch_snowflake_data(module.basic_df_query(query_type))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rows": len(df),
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "delta_rss_mb": round(_rss_mb() - baseline, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 1),
+    }
+
+
+def run_parent(query_types, stage, modes, repeat):
+    print(f"{'tipo':<10} {'modo':<7} {'filas':>9} {'seg':>8} {'pico MB':>9} {'Δ MB':>8} {'df MB':>8}")
+    for query_type in query_types:
+        for mode in modes:
+            if stage == "load":
+                env = dict(os.environ, BASIC_DF_STREAMING="1" if mode == "stream" else "0")
+            else:
+                env = dict(os.environ, SNOWFLAKE_FETCH_MODE=mode)
+            for _ in range(repeat):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", query_type, "--stage", stage],
+                    env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+                )
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                print(
+                    f"{query_type:<10} {mode:<7} {result['rows']:>9} {result['seconds']:>8} "
+                    f"{result['peak_rss_mb']:>9} {result['delta_rss_mb']:>8} {result['frame_mb']:>8}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", nargs="+", default=QUERY_TYPES, choices=QUERY_TYPES)
+    parser.add_argument("--stage", default="fetch", choices=list(MODES))
+    parser.add_argument("--modes", nargs="+", choices=MODES["fetch"] + MODES["load"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--child", choices=QUERY_TYPES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.stage)))
+    else:
+        run_parent(args.types, args.stage, args.modes or MODES[args.stage], args.repeat)
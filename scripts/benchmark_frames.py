@@ -0,0 +1,97 @@
+"""
+Compara memoria y latencia de filtrado de los frames de `basic_df` con las columnas
+de dimensión como texto (`object`), como categóricas y compactado del todo
+(categóricas + columnas numéricas reducidas al ancho mínimo, `compact_frame`).
+
+Para cada tipo se carga el frame una vez, se mide su tamaño con cada codificación y
+el tiempo medio de `apply_filters` sobre un conjunto de filtros típicos de los formularios.
+La última columna repite el filtrado del frame compactado usando su índice invertido
+(`FrameIndex`), como hace `filter_frame` con los frames en caché.
+Con `--columns` se imprime además el dtype y los bytes de cada columna antes y después.
+
+Uso (desde la raíz del proyecto):
+    DATA_BACKEND=duckdb python scripts/benchmark_frames.py
+    DATA_BACKEND=duckdb python scripts/benchmark_frames.py --types busquedas --repeat 50
+    DATA_BACKEND=duckdb python scripts/benchmark_frames.py --types clima --columns
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_TYPES = ["ventana", "busquedas", "cluster", "clima"]
+
+
+def sample_filters(module, query_type: str, df) -> list:
+    """Filtros representativos construidos con valores reales del frame."""
+    row = df.iloc[len(df) // 2]
+    filters = [
+        {"destino": row["DESTINATION_CITY_NAME"]},
+        {"destino": row["DESTINATION_CITY_NAME"], "origen_pais": row["ORIGIN_COUNTRY_NAME"]},
+        {"origen_pais": row["ORIGIN_COUNTRY_NAME"], "mes": row["MONTH_KEY"]},
+    ]
+    if query_type == "cluster":
+        filters.append({"destino": row["DESTINATION_CITY_NAME"], "perfil": row["PAX_PROFILE_KEY"], "ventana": (0, 100)})
+    else:
+        filters.append({
+            "destino": row["DESTINATION_CITY_NAME"], "origen_pais": row["ORIGIN_COUNTRY_NAME"],
+            "origen_ciudad": row["ORIGIN_CITY_NAME"], "mes": row["MONTH_KEY"],
+        })
+    return [{k: v for k, v in f.items() if k in module.FILTER_COLUMNS[query_type]} for f in filters]
+
+
+def time_filters(module, query_type: str, df, filters: list, repeat: int, index=None) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for f in filters:
+            module.apply_filters(query_type, df, f, index)
+    return (time.perf_counter() - start) / (repeat * len(filters)) * 1000
+
+
+def main(args):
+    sys.path.insert(0, ROOT)
+    from actions import action_query_snowflake as module
+
+    module.BASIC_DF_CATEGORICAL = False
+    module.BASIC_DF_DOWNCAST = False
+    header = f"{'tipo':<10} {'filas':>9} {'object MB':>10} {'cat MB':>8} {'compact MB':>11} {'object ms':>10} {'cat ms':>8} {'compact ms':>11} {'index ms':>9}"
+    print(header)
+    for query_type in args.types:
+        df, _ = module._load_basic_df(query_type)
+        if df.empty:
+            print(f"{query_type:<10} sin datos")
+            continue
+
+        module.BASIC_DF_CATEGORICAL = True
+        cat = module.encode_categoricals(query_type, df.copy())
+        module.BASIC_DF_DOWNCAST = True
+        compact = module.compact_frame(query_type, df.copy())
+        module.BASIC_DF_CATEGORICAL = False
+        module.BASIC_DF_DOWNCAST = False
+
+        filters = sample_filters(module, query_type, df)
+        frames = (df, cat, compact)
+        sizes = [module.frame_nbytes(frame) / 2**20 for frame in frames]
+        times = [time_filters(module, query_type, frame, filters, args.repeat) for frame in frames]
+        index = module.FrameIndex(compact, module.INDEXED_FILTERS[query_type])
+        times.append(time_filters(module, query_type, compact, filters, args.repeat, index))
+        print(
+            f"{query_type:<10} {len(df):>9} "
+            f"{sizes[0]:>10.1f} {sizes[1]:>8.1f} {sizes[2]:>11.1f} "
+            f"{times[0]:>10.2f} {times[1]:>8.2f} {times[2]:>11.2f} {times[3]:>9.2f}"
+        )
+        if args.columns:
+            for col, info in module._memory_reports[query_type].items():
+                print(
+                    f"    {col:<30} {info['dtype_before']:>14} {info['bytes_before'] / 2**20:>8.2f} MB"
+                    f" -> {info['dtype']:>14} {info['bytes'] / 2**20:>8.2f} MB"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", nargs="+", default=QUERY_TYPES, choices=QUERY_TYPES)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--columns", action="store_true", help="detalle de dtype y bytes por columna")
+    main(parser.parse_args())
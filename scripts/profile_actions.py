@@ -0,0 +1,135 @@
+"""
+Perfila los actions de consulta (filtrado -> agregación -> respuesta) sin Snowflake.
+
+Fuerza `DATA_BACKEND=duckdb`, de modo que las consultas se ejecutan contra la base
+local sembrada por `actions/local_backend.py`. La latencia de Snowflake se simula
+con `--latency-ms` (LOCAL_BACKEND_LATENCY_MS).
+
+Uso (desde la raíz del proyecto):
+    python scripts/profile_actions.py
+    python scripts/profile_actions.py --latency-ms 400 --repeat 5
+    python scripts/profile_actions.py --cprofile --actions action_query_snowflake_busquedas
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "action_query_snowflake_busquedas": [
+        dict(tipo_consulta=tipo, destino_b=destino, origen_pais_b="Alemania", origen_ciudad_b="Todas",
+             anno_b="2024", date_filter=mes, consulta=tipo)
+        for tipo in (
+            "Ventana media y búsquedas desde un mercado de origen",
+            "Ranking de mercados de origen por ventana media",
+            "Búsquedas diarias desde un mercado de origen",
+            "Ranking de ciudades de origen por ventana media diarias",
+        )
+        for destino in ("Alicante", "Todos")
+        for mes in ("Julio", "Todos los meses")
+    ],
+    "action_query_snowflake_ventana": [
+        dict(tipo_consulta_v=tipo, destino_v=destino, origen_pais_v="Francia", origen_ciudad_v="Todas",
+             date_filter_v=mes, consulta_v=tipo)
+        for tipo in (
+            "Ventana de oportunidad desde un mercado de origen",
+            "Ranking de mercados de origen por ventana de oportunidad",
+            "Ranking de ciudades de origen por ventana de oportunidad",
+        )
+        for destino in ("Valencia", "Todos")
+        for mes in ("Julio 2024", "Todos los meses")
+    ],
+    "action_query_snowflake_cluster": [
+        dict(tipo_consulta_c=tipo, destino_c=destino, anno_c="2024", date_filter_c=mes,
+             rango_ventana="0-100", perfil=perfil)
+        for tipo in ("Número y lista de ciudades", "Ranking de mercados por nº de ciudades")
+        for destino in ("Alicante", "Todos")
+        for mes in ("Julio", "Todos los meses")
+        for perfil in ("Azul", "Todos los perfiles")
+    ],
+    "action_query_snowflake_clima": [
+        dict(tipo_consulta_cl="Total de búsquedas según clima por origen", destino_cl=destino,
+             origen_pais_cl="Reino Unido", origen_ciudad_cl="Todas", date_filter_cl=mes, clima_cl=clima)
+        for destino in ("Valencia", "Todos")
+        for mes in ("Agosto", "Todos los meses")
+        for clima in ("Todos los climas", "Clima cálido")
+    ],
+}
+
+
+def load_actions():
+    sys.path.insert(0, ROOT)
+    from actions import action_query_snowflake as module
+
+    classes = (
+        module.ActionQuerySnowflakeB, module.ActionQuerySnowflakeV,
+        module.ActionQuerySnowflakeC, module.ActionQuerySnowflakeClima,
+    )
+    return module, {cls().name(): cls() for cls in classes}
+
+
+def run_scenario(action, slots: dict) -> float:
+    from rasa_sdk import Tracker
+    from rasa_sdk.executor import CollectingDispatcher
+
+    tracker = Tracker("profile", slots, {}, [], False, None, None, None)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        action.run(CollectingDispatcher(), tracker, {})
+    return time.perf_counter() - start
+
+
+def main(args):
+    os.environ["DATA_BACKEND"] = "duckdb"
+    os.environ["LOCAL_BACKEND_LATENCY_MS"] = str(args.latency_ms)
+
+    start = time.perf_counter()
+    module, actions = load_actions()
+    if not args.no_warm_up:
+        module.load_basic_dfs(list(module.BASIC_DF_QUERIES))
+        # Los cubos de agregados se calculan en segundo plano tras la carga
+        for thread in threading.enumerate():
+            if thread.name.startswith("cube-"):
+                thread.join()
+    print(f"Preparación (siembra + carga): {time.perf_counter() - start:.2f}s\n")
+
+    profiler = cProfile.Profile() if args.cprofile else None
+    print(f"{'action':<36} {'n':>4} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}")
+    for name in args.actions:
+        timings = []
+        for _ in range(args.repeat):
+            for slots in SCENARIOS[name]:
+                if profiler:
+                    profiler.enable()
+                timings.append(run_scenario(actions[name], slots) * 1000)
+                if profiler:
+                    profiler.disable()
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(
+            f"{name:<36} {len(timings):>4} {statistics.mean(timings):>9.1f} "
+            f"{statistics.median(timings):>8.1f} {p95:>8.1f} {timings[-1]:>8.1f}"
+        )
+
+    if profiler:
+        print()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--actions", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="retardo simulado por consulta")
+    parser.add_argument("--no-warm-up", action="store_true", help="no precargar los dataframes antes de medir")
+    parser.add_argument("--cprofile", action="store_true", help="muestra las funciones más costosas")
+    parser.add_argument("--top", type=int, default=25)
+    main(parser.parse_args())
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions.aggregate_cube import AggregateCube, JoinedCubes
+
+DIMS = {"destino": "DESTINATION_CITY_NAME", "origen_pais": "ORIGIN_COUNTRY_NAME", "anno": "YEAR_KEY", "mes": "MONTH_KEY"}
+
+
+@pytest.fixture
+def daily():
+    rng = np.random.default_rng(11)
+    days = pd.date_range("2024-01-01", "2025-06-30", freq="D")
+    df = pd.DataFrame({
+        "DESTINATION_CITY_NAME": rng.choice(["valencia", "alicante"], 3000),
+        "ORIGIN_COUNTRY_NAME": rng.choice(["alemania", "francia", "noruega"], 3000),
+        "SEARCH_DAY_KEY": rng.choice(days.strftime("%Y%m%d").astype(int), 3000),
+        "SEARCHS_MEAN_WINDOW_NUM": np.round(rng.uniform(0, 50, 3000), 3),
+    })
+    df.loc[::17, "SEARCHS_MEAN_WINDOW_NUM"] = np.nan
+    df["SEARCH_PERIOD"] = df["SEARCH_DAY_KEY"] // 100
+    df["MONTH_KEY"] = df["SEARCH_PERIOD"] % 100
+    df["YEAR_KEY"] = df["SEARCH_DAY_KEY"] // 10000
+    return df
+
+
+def test_total_and_breakdown(daily):
+    cube = AggregateCube(daily, DIMS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY")
+    filters = {"destino": "valencia", "mes": 3}
+    subset = daily[(daily["DESTINATION_CITY_NAME"] == "valencia") & (daily["MONTH_KEY"] == 3)]
+
+    total = cube.total(filters)
+    assert total["rows"] == len(subset)
+    assert total["days"] == subset["SEARCH_DAY_KEY"].nunique()
+    assert total["sum"] == pytest.approx(subset["SEARCHS_MEAN_WINDOW_NUM"].sum())
+
+    breakdown = cube.breakdown(filters, ("origen_pais",))
+    expected = subset.groupby("ORIGIN_COUNTRY_NAME")["SEARCHS_MEAN_WINDOW_NUM"].sum()
+    assert list(breakdown.index) == list(expected.index)
+    assert np.allclose(breakdown["sum"], expected)
+
+    assert cube.total({"destino": "madrid"})["rows"] == 0
+
+
+def test_breakdown_by_two_dims_matches_groupby_order(daily):
+    cube = AggregateCube(daily, DIMS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY", eager=False)
+    subset = daily[daily["DESTINATION_CITY_NAME"] == "alicante"]
+
+    breakdown = cube.breakdown({"destino": "alicante"}, ("mes", "origen_pais"))
+    expected = subset.groupby(["MONTH_KEY", "ORIGIN_COUNTRY_NAME"])["SEARCHS_MEAN_WINDOW_NUM"].agg(["sum", "count"])
+
+    assert list(breakdown.index) == list(expected.index)
+    assert np.allclose(breakdown["sum"], expected["sum"])
+    assert np.array_equal(breakdown["count"], expected["count"])
+
+
+def test_joined_cubes_keep_each_cube_breakdown_on_common_cells(daily):
+    rng = np.random.default_rng(7)
+    window = pd.DataFrame({
+        "DESTINATION_CITY_NAME": rng.choice(["valencia", "alicante"], 400),
+        "ORIGIN_COUNTRY_NAME": rng.choice(["alemania", "francia", "suecia"], 400),
+        "YEAR_KEY": rng.choice([2024, 2025], 400),
+        "MONTH_KEY": rng.integers(1, 13, 400),
+        "WINDOW_DAYS_NUM": rng.integers(1, 90, 400).astype(float),
+    })
+    cubes = {
+        "busquedas": AggregateCube(daily, DIMS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY"),
+        "ventana": AggregateCube(window, DIMS, "WINDOW_DAYS_NUM"),
+    }
+    filters = {"destino": "valencia", "anno": 2024}
+
+    joined = JoinedCubes(cubes, eager=False).breakdown(filters, "origen_pais")
+
+    # Solo los mercados presentes en las dos tablas
+    assert list(joined.index) == ["alemania", "francia"]
+    for name, cube in cubes.items():
+        expected = cube.breakdown(filters, ("origen_pais",)).loc[list(joined.index)]
+        assert np.allclose(joined[f"{name}_sum"], expected["sum"])
+        assert np.array_equal(joined[f"{name}_rows"], expected["rows"])
@@ -0,0 +1,96 @@
+import pytest
+
+from actions import circuit_breaker
+from actions.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open() and not breaker.allow_request()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_a_single_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker)
+
+    clock.now += 9.9
+    assert not breaker.allow_request()
+    clock.now += 0.2
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Mientras la prueba está en curso no pasa nadie más
+    assert not breaker.allow_request()
+    assert breaker.is_open()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+def test_failed_probe_backs_off_up_to_the_cap(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, max_reset_timeout=35, backoff_factor=2)
+    open_breaker(breaker)
+
+    for timeout in (20, 35, 35):
+        clock.now += 1000
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.stats()["retry_in"] == timeout
+        clock.now += timeout - 0.1
+        assert not breaker.allow_request()
+        clock.now -= timeout - 0.1
+
+    # Al cerrarse vuelve al tiempo de espera inicial
+    clock.now += 1000
+    assert breaker.allow_request()
+    breaker.record_success()
+    open_breaker(breaker)
+    assert breaker.stats()["retry_in"] == 10
+
+
+def test_released_probe_lets_another_one_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 11
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release_probe()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open() and breaker.allow_request()
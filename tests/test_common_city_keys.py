@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions import action_query_snowflake as module
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(module, "_basic_df_cache", {})
+    monkeypatch.setattr(module, "_common_keys_memo", {})
+
+
+def cached(keys) -> module.CachedFrame:
+    return module.CachedFrame(df=pd.DataFrame({"SEARCH_ORIGIN_CITY_KEY": keys}), loaded_at=0.0, version=1)
+
+
+def test_warm_and_sql_paths_return_the_same_python_ints(monkeypatch):
+    frames = {
+        "busquedas": cached(np.array([1, 2, 3], dtype=np.int32)),
+        "ventana": cached(np.array([2, 3, 4], dtype=np.int64)),
+        "cluster": cached([2.0, 3.0, np.nan]),
+    }
+    monkeypatch.setattr(module, "_basic_df_cache", frames)
+    warm = module.get_common_origin_city_keys()
+
+    monkeypatch.setattr(module, "_basic_df_cache", {})
+    monkeypatch.setattr(module, "_common_keys_memo", {})
+    monkeypatch.setattr(
+        module, "fetch_snowflake_data",
+        lambda query, params=None: pd.DataFrame({"SEARCH_ORIGIN_CITY_KEY": [3, 2], "ORIGIN_COUNTRY_NAME": ["France", "Germany"]}),
+    )
+    cold = module.get_common_origin_city_keys()
+
+    assert warm == cold == [2, 3]
+    assert all(type(key) is int for key in warm + cold)
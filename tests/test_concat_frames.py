@@ -0,0 +1,14 @@
+import pandas as pd
+
+from actions.action_query_snowflake import concat_frames
+
+
+def test_concat_keeps_categoricals_with_sorted_union_of_categories():
+    first = pd.DataFrame({"DESTINATION_CITY_NAME": pd.Categorical(["valencia", "alicante"]), "MONTH_KEY": [1, 2]})
+    second = pd.DataFrame({"DESTINATION_CITY_NAME": pd.Categorical(["castellon", "valencia"]), "MONTH_KEY": [3, 4]}, index=[2, 3])
+
+    df = concat_frames([first, second])
+    assert isinstance(df["DESTINATION_CITY_NAME"].dtype, pd.CategoricalDtype)
+    assert list(df["DESTINATION_CITY_NAME"].cat.categories) == ["alicante", "castellon", "valencia"]
+    assert list(df["DESTINATION_CITY_NAME"]) == ["valencia", "alicante", "castellon", "valencia"]
+    assert list(df.index) == [0, 1, 2, 3]
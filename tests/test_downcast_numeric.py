@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions.action_query_snowflake import downcast_numeric
+
+
+@pytest.mark.parametrize("values, kind, dtype", [
+    (["1", "2", "300"], "integer", np.int16),
+    ([1.5, None], "float", np.float32),
+    ([0.1, 2.0], "float", np.float64),
+    ([3.0, 4.0], "integer", np.int8),
+])
+def test_downcast_numeric_picks_the_narrowest_exact_dtype(values, kind, dtype):
+    series = pd.Series(values, dtype=object if isinstance(values[0], str) else None)
+    narrow = downcast_numeric(series, kind)
+
+    assert narrow.dtype == dtype
+    assert np.array_equal(narrow.to_numpy("float64"), pd.to_numeric(series).to_numpy("float64"), equal_nan=True)
+
+
+def test_downcast_numeric_leaves_non_numeric_text_alone():
+    series = pd.Series(["alicante", "2"], dtype=object)
+
+    assert downcast_numeric(series, "integer") is series
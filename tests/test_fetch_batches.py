@@ -0,0 +1,108 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from actions import action_query_snowflake as module
+from actions import circuit_breaker
+from actions.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeBackend:
+    def __init__(self, batches: list, error: Exception = None):
+        self.batches = batches
+        self.error = error
+
+    def iter_arrow_batches(self, query, params=None, batch_rows=100_000):
+        for batch in self.batches:
+            yield pa.Table.from_pandas(batch, preserve_index=False)
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.clock = clock
+    monkeypatch.setattr(module, "_data_breaker", breaker)
+    monkeypatch.setattr(module, "DATA_BACKEND", "duckdb")
+    return breaker
+
+
+def use_backend(monkeypatch, backend: FakeBackend):
+    monkeypatch.setattr(module, "get_local_backend", lambda: backend)
+
+
+def half_open(breaker: CircuitBreaker):
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    breaker.clock.now += 11
+
+
+BATCHES = [pd.DataFrame({"SEARCH_DAY_KEY": [20240101, 20240102]}), pd.DataFrame({"SEARCH_DAY_KEY": [20240103]})]
+
+
+def test_abandoned_half_open_probe_lets_the_next_call_through(monkeypatch, breaker):
+    use_backend(monkeypatch, FakeBackend(BATCHES))
+    half_open(breaker)
+
+    batches = module.fetch_snowflake_batches("SELECT 1")
+    next(batches)
+    batches.close()
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+
+
+def test_complete_stream_closes_the_breaker(monkeypatch, breaker):
+    use_backend(monkeypatch, FakeBackend(BATCHES))
+    half_open(breaker)
+
+    assert sum(len(batch) for batch in module.fetch_snowflake_batches("SELECT 1")) == 3
+    assert breaker.state == CLOSED
+
+
+def test_failed_stream_reopens_the_breaker(monkeypatch, breaker):
+    use_backend(monkeypatch, FakeBackend(BATCHES[:1], ConnectionError("cortado")))
+    half_open(breaker)
+
+    with pytest.raises(ConnectionError):
+        list(module.fetch_snowflake_batches("SELECT 1"))
+    assert breaker.state == OPEN and not breaker.allow_request()
+
+
+def raw_searches(days: list, cities: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        "SEARCH_ORIGIN_CITY_KEY": [100] * len(days),
+        "SEARCH_DAY_KEY": days,
+        "MONTH_KEY": [day // 100 % 100 for day in days],
+        "SEARCHS_MEAN_WINDOW_NUM": [1.5] * len(days),
+        "ORIGIN_COUNTRY_NAME": ["Germany"] * len(days),
+        "ORIGIN_CITY_NAME": cities,
+        "DESTINATION_CITY_NAME": ["Valencia"] * len(days),
+    })
+
+
+def test_streamed_memory_report_measures_the_normalized_batches(monkeypatch, breaker):
+    monkeypatch.setattr(module, "BASIC_DF_ROLLUP", True)
+    batches = [raw_searches([20240101, 20240102], ["Berlin", "Berlin"]), raw_searches([20240103], ["Berlin"])]
+    use_backend(monkeypatch, FakeBackend(batches))
+    expected = sum(
+        int(module.normalize_frame("busquedas", batch.copy())["ORIGIN_CITY_NAME"].memory_usage(deep=True, index=False)) for batch in batches
+    )
+
+    df, watermark = module._fetch_normalized_batches("busquedas", "SELECT 1")
+
+    # Una sola fila de resumen, pero el "antes" son las tres filas diarias que llegaron
+    assert len(df) == 1 and watermark == 20240103
+    report = module._memory_reports["busquedas"]["ORIGIN_CITY_NAME"]
+    assert report["dtype_before"] == "object"
+    assert report["bytes_before"] == expected
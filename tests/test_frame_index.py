@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions.frame_index import FrameIndex
+
+COLUMNS = {"destino": "DESTINATION_CITY_NAME", "origen_pais": "ORIGIN_COUNTRY_NAME", "mes": "MONTH_KEY"}
+
+
+@pytest.fixture(params=["object", "category"])
+def frame(request):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        "DESTINATION_CITY_NAME": rng.choice(["valencia", "alicante", "castellon de la plana"], 500),
+        "ORIGIN_COUNTRY_NAME": rng.choice(["alemania", "francia", "noruega", None], 500),
+        "MONTH_KEY": rng.integers(1, 13, 500),
+        "WINDOW_DAYS_NUM": rng.uniform(0, 100, 500),
+    })
+    if request.param == "category":
+        df = df.astype({"DESTINATION_CITY_NAME": "category", "ORIGIN_COUNTRY_NAME": "category"})
+    return df
+
+
+def expected(df: pd.DataFrame, filters: dict) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    for key, value in filters.items():
+        mask &= (df[COLUMNS[key]] == value).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_lookup_matches_boolean_masks(frame):
+    index = FrameIndex(frame, COLUMNS)
+    values = {
+        "destino": ["valencia", "alicante"], "origen_pais": ["alemania", "noruega"], "mes": [1, 7],
+    }
+    for size in (1, 2, 3):
+        for keys in itertools.combinations(values, size):
+            for combination in itertools.product(*(values[key] for key in keys)):
+                filters = dict(zip(keys, combination))
+                assert np.array_equal(index.lookup(filters), expected(frame, filters)), filters
+
+
+def test_unknown_value_gives_no_rows(frame):
+    index = FrameIndex(frame, COLUMNS)
+    assert len(index.lookup({"destino": "madrid", "mes": 7})) == 0
+    assert len(index.positions("origen_pais", "japon")) == 0
+
+
+def test_unindexed_filters_are_left_to_the_caller(frame):
+    index = FrameIndex(frame, {**COLUMNS, "perfil": "PAX_PROFILE_KEY"})
+    assert index.keys == set(COLUMNS)
+    assert index.lookup({"ventana": (0, 10)}) is None
+    assert np.array_equal(index.lookup({"destino": "valencia", "ventana": (0, 10)}), expected(frame, {"destino": "valencia"}))
+
+
+def test_null_values_are_not_indexed(frame):
+    index = FrameIndex(frame, COLUMNS)
+    total = sum(len(index.positions("origen_pais", value)) for value in ("alemania", "francia", "noruega"))
+    assert total == frame["ORIGIN_COUNTRY_NAME"].notna().sum()
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions import action_query_snowflake as module
+from actions import frame_snapshots
+from actions.frame_snapshots import list_snapshots, load_snapshot, save_snapshot
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    monkeypatch.setattr(frame_snapshots, "time", FakeClock())
+
+
+def sample_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "DESTINATION_CITY_NAME": pd.Categorical(["alicante", "valencia", "alicante"]),
+            "ORIGIN_CITY_NAME": ["berlin", "paris", None],
+            "SEARCH_DAY_KEY": np.array([20240101, 20240102, 20240103], dtype=np.int32),
+            "SEARCHS_MEAN_WINDOW_NUM": np.array([1.5, np.nan, 3.0], dtype=np.float32),
+        },
+        index=pd.Index([10, 11, 12]),
+    )
+
+
+def test_snapshot_round_trip_keeps_dtypes_index_and_watermark(tmp_path):
+    df = sample_frame()
+    save_snapshot(str(tmp_path), "busquedas", df, watermark=20240103, schema=2)
+
+    loaded, watermark, stamp = load_snapshot(str(tmp_path), "busquedas", schema=2)
+
+    pd.testing.assert_frame_equal(loaded, df)
+    assert watermark == 20240103
+    assert stamp > 0
+
+
+def test_snapshot_with_another_schema_is_ignored(tmp_path):
+    save_snapshot(str(tmp_path), "busquedas", sample_frame(), schema=1)
+
+    assert load_snapshot(str(tmp_path), "busquedas", schema=2) is None
+
+
+def test_save_keeps_only_the_latest_snapshot(tmp_path):
+    for watermark in (20240101, 20240102, 20240103):
+        save_snapshot(str(tmp_path), "busquedas", sample_frame(), watermark=watermark)
+
+    assert len(list_snapshots(str(tmp_path), "busquedas")) == 1
+    assert load_snapshot(str(tmp_path), "busquedas")[1] == 20240103
+
+
+def test_unreadable_snapshot_falls_back_to_an_older_one(tmp_path):
+    save_snapshot(str(tmp_path), "busquedas", sample_frame(), watermark=20240101, keep=2)
+    latest = save_snapshot(str(tmp_path), "busquedas", sample_frame(), watermark=20240102, keep=2)
+    with open(latest, "wb") as corrupt:
+        corrupt.write(b"not arrow")
+
+    assert load_snapshot(str(tmp_path), "busquedas")[1] == 20240101
+    assert os.path.exists(latest)
+
+
+def test_snapshot_missing_cached_columns_is_not_served(tmp_path, monkeypatch):
+    monkeypatch.setattr(module, "BASIC_DF_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(module, "_basic_df_cache", {})
+    df = pd.DataFrame({"DESTINATION_CITY_NAME": ["alicante"]})
+    save_snapshot(str(tmp_path), "cluster", df, schema=module.BASIC_DF_SCHEMA)
+
+    assert module._load_basic_df_snapshot("cluster") is None
+    assert module._basic_df_cache == {}
@@ -0,0 +1,53 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from actions import action_query_snowflake as module
+from actions.aggregate_cube import ROLLUP_ROWS
+
+
+@pytest.mark.parametrize("watermark, expected", [
+    (20240215, 20240201),
+    ("20240215", "20240201"),
+    (datetime.date(2024, 2, 15), datetime.date(2024, 2, 1)),
+    (pd.Timestamp("2024-02-15 13:30"), pd.Timestamp("2024-02-01")),
+])
+def test_month_start_keeps_the_type_of_the_raw_column(watermark, expected):
+    start = module.month_start(watermark)
+    assert start == expected and type(start) is type(expected)
+
+
+def daily_rows(days: list) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "DESTINATION_CITY_NAME": "valencia",
+        "ORIGIN_COUNTRY_NAME": "alemania",
+        "ORIGIN_CITY_NAME": "berlin",
+        "SEARCH_ORIGIN_CITY_KEY": 100,
+        "SEARCH_DAY_KEY": days,
+        "SEARCHS_MEAN_WINDOW_NUM": 1.5,
+    })
+    df["SEARCH_PERIOD"] = df["SEARCH_DAY_KEY"] // 100
+    df["MONTH_KEY"] = df["SEARCH_PERIOD"] % 100
+    return df
+
+
+def test_rollup_delta_refetches_the_whole_watermark_month(monkeypatch):
+    monkeypatch.setattr(module, "BASIC_DF_ROLLUP", True)
+    source = daily_rows([20240110, 20240120, 20240205, 20240215, 20240216, 20240301])
+    cached = module.cached_frame("busquedas", source[source["SEARCH_DAY_KEY"] <= 20240215].copy())
+    entry = module.CachedFrame(df=cached, loaded_at=0.0, version=1, watermark="20240215", index=None)
+
+    requests = []
+
+    def fetch(query_type, query, params):
+        requests.append(params["watermark"])
+        rows = source[source["SEARCH_DAY_KEY"] >= int(params["watermark"])].copy()
+        return module.cached_frame(query_type, rows), "20240301"
+
+    monkeypatch.setattr(module, "_fetch_normalized", fetch)
+    df, watermark = module._load_basic_df_delta("busquedas", entry)
+
+    assert requests == ["20240201"]
+    assert watermark == "20240301"
+    assert df.groupby("SEARCH_PERIOD")[ROLLUP_ROWS].sum().to_dict() == {202401: 2, 202402: 3, 202403: 1}
@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions.aggregate_cube import ROLLUP_COLUMNS, ROLLUP_DAY_MASK, ROLLUP_ROWS, ROLLUP_SUM, AggregateCube, merge_rollups, monthly_rollup
+
+DIMS = {"destino": "DESTINATION_CITY_NAME", "origen_pais": "ORIGIN_COUNTRY_NAME", "anno": "YEAR_KEY", "mes": "MONTH_KEY"}
+KEYS = ["DESTINATION_CITY_NAME", "ORIGIN_COUNTRY_NAME", "MONTH_KEY"]
+
+
+@pytest.fixture
+def daily():
+    rng = np.random.default_rng(11)
+    days = pd.date_range("2024-01-01", "2025-06-30", freq="D")
+    df = pd.DataFrame({
+        "DESTINATION_CITY_NAME": rng.choice(["valencia", "alicante"], 3000),
+        "ORIGIN_COUNTRY_NAME": rng.choice(["alemania", "francia", "noruega"], 3000),
+        "SEARCH_DAY_KEY": rng.choice(days.strftime("%Y%m%d").astype(int), 3000),
+        "SEARCHS_MEAN_WINDOW_NUM": np.round(rng.uniform(0, 50, 3000), 3),
+    })
+    df.loc[::17, "SEARCHS_MEAN_WINDOW_NUM"] = np.nan
+    df["SEARCH_PERIOD"] = df["SEARCH_DAY_KEY"] // 100
+    df["MONTH_KEY"] = df["SEARCH_PERIOD"] % 100
+    df["YEAR_KEY"] = df["SEARCH_DAY_KEY"] // 10000
+    return df
+
+
+def rollup_of(daily: pd.DataFrame) -> pd.DataFrame:
+    rollup = monthly_rollup(daily, KEYS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY", "SEARCH_PERIOD")
+    rollup["YEAR_KEY"] = rollup["SEARCH_PERIOD"] // 100
+    return rollup
+
+
+def test_monthly_rollup_keeps_row_counts_and_day_masks(daily):
+    rollup = rollup_of(daily)
+    assert set(ROLLUP_COLUMNS) <= set(rollup.columns)
+    assert rollup[ROLLUP_ROWS].sum() == len(daily)
+
+    row = rollup.iloc[0]
+    days = daily[
+        (daily["DESTINATION_CITY_NAME"] == row["DESTINATION_CITY_NAME"])
+        & (daily["ORIGIN_COUNTRY_NAME"] == row["ORIGIN_COUNTRY_NAME"])
+        & (daily["SEARCH_PERIOD"] == row["SEARCH_PERIOD"])
+    ]["SEARCH_DAY_KEY"] % 100
+    assert row[ROLLUP_DAY_MASK] == sum(1 << (day - 1) for day in set(days))
+
+
+def test_rollup_with_null_keys_keeps_every_row(daily):
+    daily.loc[::5, "ORIGIN_COUNTRY_NAME"] = None
+    assert rollup_of(daily)[ROLLUP_ROWS].sum() == len(daily)
+
+
+def test_merged_batch_rollups_match_the_whole_rollup(daily):
+    whole = monthly_rollup(daily, KEYS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY", "SEARCH_PERIOD")
+    batches = [
+        monthly_rollup(daily.iloc[start:start + 700], KEYS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY", "SEARCH_PERIOD")
+        for start in range(0, len(daily), 700)
+    ]
+    merged = merge_rollups(pd.concat(batches, ignore_index=True), KEYS, "SEARCH_PERIOD")
+
+    assert list(merged.columns) == list(whole.columns)
+    for column in merged.columns:
+        if column == ROLLUP_SUM:
+            assert np.allclose(merged[column], whole[column], rtol=1e-12)
+        else:
+            assert merged[column].equals(whole[column]), column
+
+
+def test_cube_over_rollup_matches_cube_over_daily_rows(daily):
+    rows = AggregateCube(daily, DIMS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_DAY_KEY", eager=False)
+    months = AggregateCube(rollup_of(daily), DIMS, "SEARCHS_MEAN_WINDOW_NUM", "SEARCH_PERIOD", eager=False)
+    assert months.rollup and not rows.rollup
+
+    for size in range(len(DIMS) + 1):
+        for keys in itertools.combinations(DIMS, size):
+            expected, got = rows._aggregate([DIMS[k] for k in keys]), months._aggregate([DIMS[k] for k in keys])
+            assert got.index.equals(expected.index), keys
+            for column in ("count", "min", "max", "rows", "days"):
+                assert np.array_equal(got[column], expected[column], equal_nan=True), (keys, column)
+            assert np.allclose(got["sum"], expected["sum"], rtol=1e-12), keys
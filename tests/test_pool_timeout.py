@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+
+import pytest
+
+from actions import action_query_snowflake as module
+from actions import circuit_breaker
+from actions.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from actions.snowflake_pool import PoolTimeout
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class ExhaustedPool:
+    @contextmanager
+    def connection(self):
+        raise PoolTimeout("sin conexiones libres")
+        yield
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.clock = clock
+    monkeypatch.setattr(module, "_data_breaker", breaker)
+    monkeypatch.setattr(module, "DATA_BACKEND", "snowflake")
+    monkeypatch.setattr(module, "_snowflake_pool", ExhaustedPool())
+    return breaker
+
+
+def test_pool_timeout_returns_empty_without_opening_the_circuit(breaker):
+    df = module._fetch_uncached("SELECT 1")
+
+    assert df.empty
+    assert breaker.state == CLOSED
+
+
+def test_pool_timeout_releases_the_half_open_probe(breaker):
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    breaker.clock.now += 11
+
+    assert module._fetch_uncached("SELECT 1").empty
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_pool_timeout_in_batches_propagates_without_opening_the_circuit(breaker):
+    with pytest.raises(PoolTimeout):
+        list(module.fetch_snowflake_batches("SELECT 1"))
+
+    assert breaker.state == CLOSED
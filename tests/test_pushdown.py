@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from actions import action_query_snowflake as module
+from actions.result_cache import LRUCache
+from actions.single_flight import SingleFlight
+
+FILTERS = {"destino": "alicante", "anno": 2025, "mes": "julio"}
+
+
+class FakeFetch:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.calls = 0
+
+    def __call__(self, query, params=None, cache=True):
+        self.calls += 1
+        return self.df.copy()
+
+
+def use_fetch(monkeypatch, df: pd.DataFrame) -> FakeFetch:
+    monkeypatch.setattr(module, "SNOWFLAKE_PUSHDOWN", True)
+    monkeypatch.setattr(module, "_pushdown_cache", LRUCache(max_entries=8))
+    monkeypatch.setattr(module, "_pushdown_loads", SingleFlight())
+    fetch = FakeFetch(df)
+    monkeypatch.setattr(module, "fetch_snowflake_data", fetch)
+    return fetch
+
+
+def test_pushdown_query_keeps_the_order_of_basic_df():
+    query, params = module.build_pushdown_query("cluster", FILTERS)
+    assert query.rstrip().endswith(f"ORDER BY {module.FACT_ORDER['cluster']}")
+    assert params == {"destino": "alicante", "anno": 2025, "mes": 7}
+
+
+def test_empty_pushdown_result_is_an_empty_frame_and_is_cached(monkeypatch):
+    fetch = use_fetch(monkeypatch, pd.DataFrame(columns=module.basic_df_columns("cluster")))
+
+    for _ in range(2):
+        df = module.filter_frame("cluster", FILTERS)
+        assert df is not None and df.empty
+
+    assert fetch.calls == 1
+
+
+def test_failed_pushdown_fetch_returns_none_and_is_not_cached(monkeypatch):
+    fetch = use_fetch(monkeypatch, pd.DataFrame())
+
+    assert module.filter_frame("cluster", FILTERS) is None
+    assert module.daily_rows("busquedas", FILTERS).empty
+    assert module.filter_frame("cluster", FILTERS) is None
+    assert fetch.calls == 3
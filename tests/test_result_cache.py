@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from actions import result_cache
+from actions.result_cache import LRUCache, frame_nbytes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def test_evicts_least_recently_used_to_stay_within_byte_budget():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    assert cache.get("a") == "xxxx"  # "b" pasa a ser la menos usada
+
+    cache.put("c", "xxxx")
+    assert "b" not in cache
+    assert cache.get("a") == "xxxx" and cache.get("c") == "xxxx"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_replacing_a_key_updates_its_bytes():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxxxxxx")
+    cache.put("a", "xx")
+    cache.put("b", "xxxxxxxx")
+    assert len(cache) == 2 and cache.stats()["bytes"] == 10
+
+
+def test_value_larger_than_the_budget_is_not_stored():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    assert not cache.put("big", "x" * 11)
+    assert "big" not in cache and "a" in cache
+
+
+def test_entry_limit():
+    cache = LRUCache(max_entries=2, sizeof=len)
+    for key in "abc":
+        cache.put(key, key)
+    assert "a" not in cache and len(cache) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache, "time", clock)
+    cache = LRUCache(ttl=60, sizeof=len)
+    cache.put("a", "x")
+
+    clock.now += 59
+    assert cache.get("a") == "x"
+    clock.now += 2
+    assert cache.get("a", "caducado") == "caducado"
+    assert "a" not in cache
+    assert cache.stats()["expirations"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_discard_removes_matching_keys():
+    cache = LRUCache(sizeof=len)
+    for version in (1, 2, 3):
+        cache.put(("busquedas", version), "x")
+    cache.put(("ventana", 1), "x")
+
+    assert cache.discard(lambda key: key[0] == "busquedas" and key[1] != 3) == 2
+    assert set(cache._entries) == {("busquedas", 3), ("ventana", 1)}
+    assert cache.stats()["bytes"] == 2
+
+
+@pytest.mark.parametrize("values", [["valencia", "alicante"], [1.5, 2.5]])
+def test_frame_nbytes_counts_string_contents(values):
+    df = pd.DataFrame({"col": values * 100})
+    assert frame_nbytes(df) == df.memory_usage(deep=True).sum()
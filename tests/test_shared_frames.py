@@ -0,0 +1,89 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from actions import shared_frames
+from actions.shared_frames import SharedFrameStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(shared_frames, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return SharedFrameStore(str(tmp_path))
+
+
+def frame(value: int) -> pd.DataFrame:
+    return pd.DataFrame({"DESTINATION_CITY_NAME": pd.Categorical(["alicante", "valencia"]), "WINDOW_DAYS_NUM": [value, value]})
+
+
+def test_manifest_is_none_before_the_first_publish(store):
+    assert store.manifest("ventana") is None
+    assert store.touch("ventana") is None
+
+
+def test_publish_bumps_the_version_and_replaces_the_old_file(store, clock):
+    first = store.publish("ventana", frame(1), watermark=20240101)
+    clock.now += 10
+    second = store.publish("ventana", frame(2), watermark=20240102)
+
+    assert (first["version"], second["version"]) == (1, 2)
+    assert store.manifest("ventana") == second
+    assert second["published_at"] == first["published_at"] + 10
+    assert not os.path.exists(first["path"]) and os.path.exists(second["path"])
+    pd.testing.assert_frame_equal(store.attach(second), frame(2))
+
+
+def test_touch_renews_the_manifest_without_a_new_version(store, clock):
+    published = store.publish("ventana", frame(1), watermark=20240101)
+    clock.now += 60
+
+    touched = store.touch("ventana")
+
+    assert touched["version"] == published["version"] and touched["path"] == published["path"]
+    assert touched["published_at"] == published["published_at"] + 60
+    assert touched["watermark"] == 20240101
+    assert store.touch("ventana", watermark=20240105)["watermark"] == 20240105
+    assert store.manifest("ventana")["watermark"] == 20240105
+
+
+def test_lock_is_reentrant_in_a_thread_and_exclusive_across_stores(store, tmp_path):
+    other = SharedFrameStore(str(tmp_path))
+    results = []
+
+    def try_other():
+        with other.lock("ventana", timeout=0) as acquired:
+            results.append(acquired)
+
+    with store.lock("ventana", timeout=0) as acquired:
+        with store.lock("ventana", timeout=0) as reentered:
+            results.append((acquired, reentered))
+        thread = threading.Thread(target=try_other)
+        thread.start()
+        thread.join()
+
+    with other.lock("ventana", timeout=0) as after_release:
+        results.append(after_release)
+
+    assert results == [(True, True), False, True]
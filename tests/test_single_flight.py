@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from actions.single_flight import SingleFlight, SingleFlightTimeout
+
+
+def start(target) -> threading.Thread:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_waiters(flight: SingleFlight, key, waiters: int):
+    for _ in range(1000):
+        if flight.in_flight().get(key) == waiters:
+            return
+        threading.Event().wait(0.005)
+    raise AssertionError(f"{waiters} llamadas no llegaron a esperar a {key!r}")
+
+
+def test_concurrent_calls_share_one_execution():
+    flight, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "frame"
+
+    leader = start(lambda: results.append(flight.do("busquedas", load)))
+    wait_for_waiters(flight, "busquedas", 0)
+    followers = [start(lambda: results.append(flight.do("busquedas", load, timeout=5))) for _ in range(3)]
+    wait_for_waiters(flight, "busquedas", 3)
+
+    release.set()
+    for thread in (leader, *followers):
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["frame"] * 4
+    assert flight.in_flight() == {}
+
+
+def test_follower_times_out_while_the_leader_keeps_loading():
+    flight, release = SingleFlight(), threading.Event()
+    leader = start(lambda: flight.do("clima", lambda: release.wait(5)))
+    wait_for_waiters(flight, "clima", 0)
+
+    with pytest.raises(SingleFlightTimeout):
+        flight.do("clima", lambda: "no debería ejecutarse", timeout=0.05)
+
+    release.set()
+    leader.join(5)
+    # Terminada la carga, la clave queda libre para la siguiente
+    assert flight.do("clima", lambda: "nueva") == "nueva"
+
+
+def test_errors_reach_leader_and_followers_and_are_not_cached():
+    flight, release, errors = SingleFlight(), threading.Event(), []
+
+    def fail():
+        release.wait(5)
+        raise ConnectionError("sin conexión")
+
+    def call(**kwargs):
+        try:
+            flight.do("ventana", fail, **kwargs)
+        except ConnectionError as exc:
+            errors.append(exc)
+
+    leader = start(call)
+    wait_for_waiters(flight, "ventana", 0)
+    follower = start(lambda: call(timeout=5))
+    wait_for_waiters(flight, "ventana", 1)
+
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.do("ventana", lambda: "reintento") == "reintento"
@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from actions import snowflake_pool
+from actions.snowflake_pool import PoolTimeout, SnowflakeConnectionPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        self.conn.checks += 1
+        if not self.conn.alive:
+            raise ConnectionError("sesión caducada")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.checks = 0
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(snowflake_pool, "time", clock)
+    return clock
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    return SnowflakeConnectionPool(connect, **kwargs), opened
+
+
+def test_connections_are_reused(clock):
+    pool, opened = make_pool(size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second and len(opened) == 1
+    assert pool.stats() == {"size": 2, "idle": 1}
+
+
+def test_failed_block_discards_its_connection(clock):
+    pool, opened = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("consulta rota")
+    assert opened[0].closed and pool.stats()["idle"] == 0
+
+
+def test_idle_connections_expire_on_checkin_and_on_checkout(clock):
+    pool, opened = make_pool(size=2, max_idle=60)
+    with pool.connection() as busy:
+        with pool.connection():
+            pass
+        clock.now += 61
+    # Al devolver `busy` se cierra la otra, que llevaba más de `max_idle` ociosa
+    assert opened[1].closed and not busy.closed
+    assert pool.stats()["idle"] == 1
+
+    clock.now += 61
+    with pool.connection() as conn:
+        assert conn is opened[2]
+    assert opened[0].closed
+
+
+def test_health_check_runs_only_after_the_interval(clock):
+    pool, opened = make_pool(health_check_interval=30)
+    with pool.connection():
+        pass
+    clock.now += 10
+    with pool.connection():
+        pass
+    assert opened[0].checks == 0
+
+    clock.now += 31
+    with pool.connection() as conn:
+        assert conn is opened[0]
+    assert opened[0].checks == 1
+
+
+def test_unhealthy_connection_is_replaced(clock):
+    pool, opened = make_pool(health_check_interval=30)
+    with pool.connection():
+        pass
+    opened[0].alive = False
+
+    clock.now += 31
+    with pool.connection() as conn:
+        assert conn is opened[1]
+    assert opened[0].closed
+
+
+def test_waits_for_a_free_slot_until_the_timeout(clock):
+    pool, _ = make_pool(size=1, acquire_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+
+    released = threading.Event()
+
+    def hold():
+        with pool.connection():
+            released.wait(5)
+
+    thread = threading.Thread(target=hold, daemon=True)
+    thread.start()
+    while pool._slots._value:
+        threading.Event().wait(0.001)
+    released.set()
+    pool.acquire_timeout = 5
+    with pool.connection():
+        pass
+    thread.join(5)
@@ -0,0 +1,120 @@
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from actions import action_query_snowflake as module
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeThread:
+    """Registra los hilos en vez de arrancarlos; `run_all` los ejecuta en orden."""
+
+    started = []
+
+    def __init__(self, target, args=(), name=None, daemon=None):
+        self.target, self.args, self.name = target, args, name
+
+    def start(self):
+        FakeThread.started.append(self)
+
+    @classmethod
+    def run_all(cls):
+        threads, cls.started = cls.started, []
+        for thread in threads:
+            thread.target(*thread.args)
+
+
+class FakeLoader:
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.frames = []
+
+    def append(self, df: pd.DataFrame):
+        self.frames.append(df)
+
+    def __call__(self, query_type: str):
+        return self.frames.pop(0), None
+
+
+def frame(value: int) -> pd.DataFrame:
+    return pd.DataFrame({"DESTINATION_CITY_NAME": ["alicante"], "WINDOW_DAYS_NUM": [value]})
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(module, "time", clock)
+    monkeypatch.setattr(module, "threading", SimpleNamespace(Thread=FakeThread, Lock=threading.Lock))
+    monkeypatch.setattr(module, "BASIC_DF_TTL", 60.0)
+    monkeypatch.delenv("BASIC_DF_TTL_CLUSTER", raising=False)
+    monkeypatch.setattr(module, "BASIC_DF_SNAPSHOT_DIR", "")
+    monkeypatch.setattr(module, "BASIC_DF_INCREMENTAL", False)
+    monkeypatch.setattr(module, "_shared_frames", None)
+    monkeypatch.setattr(module, "_basic_df_cache", {})
+    monkeypatch.setattr(module, "_basic_df_failures", {})
+    monkeypatch.setattr(module, "_refreshing", set())
+    monkeypatch.setattr(module, "data_source_available", lambda: True)
+    FakeThread.started = []
+
+    loader = FakeLoader(clock)
+    monkeypatch.setattr(module, "_load_basic_df", loader)
+    return loader
+
+
+def test_fresh_entry_is_served_without_refresh(loads):
+    loads.append(frame(1))
+    first = module.basic_df("cluster")
+
+    loads.clock.now += 30
+    assert module.basic_df("cluster") is first
+    assert FakeThread.started == []
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(loads):
+    loads.append(frame(1))
+    first = module.basic_df("cluster")
+    version = module.basic_df_version("cluster")
+
+    loads.clock.now += 61
+    assert module.basic_df("cluster") is first
+    assert module.basic_df("cluster") is first
+    assert [thread.name for thread in FakeThread.started] == ["refresh-cluster"]
+
+    loads.append(frame(2))
+    FakeThread.run_all()
+    refreshed = module.basic_df("cluster")
+    assert refreshed["WINDOW_DAYS_NUM"].tolist() == [2]
+    assert module.basic_df_version("cluster") > version
+    # El frame anterior no se toca: quien lo estuviera leyendo sigue viéndolo entero
+    assert first["WINDOW_DAYS_NUM"].tolist() == [1]
+    assert FakeThread.started == []
+
+
+def test_empty_refresh_keeps_the_cached_version(loads):
+    loads.append(frame(1))
+    first = module.basic_df("cluster")
+    version = module.basic_df_version("cluster")
+
+    loads.clock.now += 61
+    module.basic_df("cluster")
+    loads.append(pd.DataFrame())
+    FakeThread.run_all()
+
+    assert module._refreshing == set()
+    assert module.basic_df("cluster") is first
+    assert module.basic_df_version("cluster") == version
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import action_query_snowflake as module
+
+WINDOWS = pd.DataFrame({
+    "DESTINATION_CITY_NAME": ["alicante", "alicante", "alicante", "valencia"],
+    "ORIGIN_COUNTRY_NAME": ["alemania", "alemania", "francia", "alemania"],
+    "ORIGIN_CITY_NAME": ["berlin", "munich", "paris", "berlin"],
+    "YEAR_KEY": [2024, 2024, 2024, 2024],
+    "MONTH_KEY": [7, 7, 7, 7],
+    "WINDOW_DAYS_NUM": [30.0, 50.0, 10.0, 99.0],
+})
+
+
+class FakeTracker:
+    def __init__(self, slots: dict):
+        self.slots = slots
+
+    def get_slot(self, name: str):
+        return self.slots.get(name)
+
+
+@pytest.fixture(autouse=True)
+def windows(monkeypatch):
+    monkeypatch.setattr(module, "filter_frame", lambda query_type, filters: module.apply_filters(query_type, WINDOWS, filters))
+    monkeypatch.setattr(module, "BASIC_DF_ANSWER_CACHE_MB", 0)
+
+
+def run_ventana(tipo_consulta: str, origen_pais: str = "Alemania") -> list:
+    tracker = FakeTracker({
+        "tipo_consulta_v": tipo_consulta, "destino_v": "Alicante", "origen_pais_v": origen_pais,
+        "origen_ciudad_v": "Todas", "date_filter_v": "Julio 2024", "consulta_v": "consulta",
+    })
+    dispatcher = CollectingDispatcher()
+    module.ActionQuerySnowflakeV().run(dispatcher, tracker, {})
+    return [message["text"] for message in dispatcher.messages]
+
+
+def test_ventana_from_a_market_is_answered():
+    texts = run_ventana("Ventana de oportunidad desde un mercado de origen")
+
+    assert texts == ["La ventana de oportunidad promedio desde Alemania a Alicante en julio es 40."]
+
+
+@pytest.mark.parametrize("tipo_consulta, origen_pais", [
+    ("Ventana de oportunidad desde una ciudad de origen", "Alemania"),
+    ("Ranking de mercados de origen por ventana de oportunidad", "Todos"),
+    ("Ranking de ciudades de origen por ventana de oportunidad", "Alemania"),
+])
+def test_every_ventana_cube_query_is_dispatched(tipo_consulta, origen_pais):
+    texts = run_ventana(tipo_consulta, origen_pais)
+
+    assert len(texts) == 1 and not texts[0].startswith("Error"), texts